@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+Folium memory benchmarks
+------------------------
+
+Measures, with `tracemalloc`, the memory retained per element type and
+the peak memory while building and rendering maps, next to the estimate
+of `folium.profiling.estimate_retained_size`.  The retained memory is
+what is still allocated once the build returned and `gc.collect()` ran.
+
+Usage::
+
+    python benchmarks/memory_benchmarks.py --quick --output memory.json
+    python benchmarks/memory_benchmarks.py --compare memory.json
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from run_benchmarks import _points, _read_json, _rendered_map, environment
+
+import folium  # noqa
+from folium import plugins  # noqa
+from folium.profiling import estimate_retained_size  # noqa
+
+
+# Elements whose memory cost is measured one by one, as functions of a
+# location returning the element to add to the map.
+ELEMENTS = [
+    ('Marker', lambda location: folium.Marker(location)),
+    ('Marker+Popup', lambda location: folium.Marker(location, popup='Popup')),
+    ('Marker+Tooltip', lambda location: folium.Marker(location, tooltip='Tooltip')),
+    ('CircleMarker', lambda location: folium.CircleMarker(location, radius=5)),
+    ('Circle', lambda location: folium.Circle(location, radius=100)),
+    ('PolyLine', lambda location: folium.PolyLine([location, [location[0] + 1, location[1] + 1]])),
+    ('GeoJson', lambda location: folium.GeoJson(
+        {'type': 'Point', 'coordinates': [location[1], location[0]]})),
+]
+
+
+def _traced(func):
+    """
+    Runs `func` while tracing allocations and returns its output, the
+    memory still allocated after the call and a garbage collection, which
+    is held by the output, and the peak memory during the call, in bytes.
+
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+    except AttributeError:
+        pass
+    start, _ = tracemalloc.get_traced_memory()
+    out = func()
+    _, peak = tracemalloc.get_traced_memory()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, retained - start, peak - start
+
+
+def element_memory(name, make, n):
+    """Memory per element when adding `n` of them to a map."""
+    points = _points(n).tolist()
+    m = folium.Map([37, -95], zoom_start=4)
+
+    def build():
+        for point in points:
+            make(point).add_to(m)
+        return m
+
+    _, retained, peak = _traced(build)
+    sizes = estimate_retained_size(m, by_class=True)
+    estimated = sum(entry['bytes'] for cls, entry in sizes.items()
+                    if cls not in ('Map', 'TileLayer'))
+    return {
+        'name': name,
+        'param': n,
+        'retained_per_element': retained / n,
+        'estimated_per_element': estimated / n,
+        'peak': peak,
+        'classes': sizes,
+    }
+
+
+def _large_map(n):
+    m = folium.Map([37, -95], zoom_start=4)
+    folium.GeoJson(_read_json('us-counties.json')).add_to(m)
+    points = _points(n).tolist()
+    plugins.HeatMap(points).add_to(m)
+    for point in points:
+        folium.Marker(point, popup='Popup').add_to(m)
+    return m
+
+
+def map_memory(n):
+    """Peak memory while building and while rendering a large map."""
+    m, retained, build_peak = _traced(lambda: _large_map(n))
+    html, _, render_peak = _traced(lambda: _rendered_map(m))
+    return {
+        'name': 'map',
+        'param': n,
+        'retained': retained,
+        'estimated': estimate_retained_size(m),
+        'build_peak': build_peak,
+        'render_peak': render_peak,
+        'bytes': len(html),
+    }
+
+
+def run_memory_benchmarks(quick=False, pattern=None, verbose=True):
+    """Runs the memory benchmarks whose name contains `pattern`."""
+    n = 1000 if quick else 10000
+    results = []
+    for name, make in ELEMENTS:
+        if pattern is not None and pattern not in name:
+            continue
+        result = element_memory(name, make, n)
+        results.append(result)
+        if verbose:
+            print('{:<20} {:>8} {:>12.0f} B/element retained {:>12.0f} B/element estimated'.format(
+                name, n, result['retained_per_element'], result['estimated_per_element']))
+    if pattern is None or pattern in 'map':
+        for param in ([1000] if quick else [1000, 10000, 100000]):
+            result = map_memory(param)
+            results.append(result)
+            if verbose:
+                print('{:<20} {:>8} {:>14,} B build peak {:>14,} B render peak {:>14,} B retained'.format(
+                    'map', param, result['build_peak'], result['render_peak'], result['retained']))
+    return results
+
+
+def compare(results, reference):
+    """Prints the ratio of the memory use to a previous run."""
+    previous = {(r['name'], r['param']): r for r in reference['results']}
+    for result in results:
+        old = previous.get((result['name'], result['param']))
+        if old is None:
+            continue
+        key = 'retained_per_element' if 'retained_per_element' in result else 'retained'
+        ratio = result[key] / old[key] if old.get(key) else float('nan')
+        print('{:<20} {:>8} {:>9.2f}x'.format(result['name'], result['param'], ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--quick', action='store_true',
+                        help='Only run the smallest parameters.')
+    parser.add_argument('--filter', default=None,
+                        help='Only run benchmarks whose name contains this.')
+    parser.add_argument('--output', default=None,
+                        help='Write the results to this JSON file.')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of a previous run to compare with.')
+    args = parser.parse_args(argv)
+
+    results = run_memory_benchmarks(quick=args.quick, pattern=args.filter)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f,
+                      indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+Folium benchmarks
+-----------------
+
+Times folium's hot paths and measures the size of what they output,
+using the fixtures bundled with the tests.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --quick --output results.json
+    python benchmarks/run_benchmarks.py --filter heat_map --compare results.json
+
+Results are written as JSON, with one entry per benchmark and parameter,
+so that runs can be compared over time with ``--compare``.
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+from timeit import default_timer
+
+import numpy as np
+
+import pandas as pd
+
+
+rootpath = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(rootpath))
+
+import folium  # noqa
+from folium import plugins  # noqa
+from folium.utilities import mercator_transform, write_png  # noqa
+
+testpath = os.path.join(os.path.dirname(rootpath), 'tests')
+
+
+def _read_json(name):
+    with io.open(os.path.join(testpath, name), encoding='utf8') as f:
+        return json.load(f)
+
+
+def _county_data():
+    df = pd.read_csv(os.path.join(testpath, 'us_county_data.csv'),
+                     na_values=[' '])
+    df['FIPS_Code'] = df['FIPS_Code'].astype(str)
+    return df.dropna(subset=['Unemployment_rate_2011'])
+
+
+def _points(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.column_stack([rng.uniform(25, 50, n), rng.uniform(-125, -65, n)])
+
+
+def _rendered_map(m):
+    out = io.BytesIO()
+    m.save(out, close_file=False)
+    return out.getvalue()
+
+
+# Each benchmark takes a parameter, does its setup and returns the function
+# to time.  When that function returns a str or bytes, its size is recorded.
+
+def marker_creation(n):
+    points = _points(n).tolist()
+
+    def run():
+        m = folium.Map([37, -95], zoom_start=4)
+        for point in points:
+            folium.Marker(point).add_to(m)
+        return m
+    return run
+
+
+def circle_marker_creation(n):
+    points = _points(n).tolist()
+
+    def run():
+        m = folium.Map([37, -95], zoom_start=4)
+        for point in points:
+            folium.CircleMarker(point, radius=5).add_to(m)
+        return m
+    return run
+
+
+def marker_render(n):
+    m = marker_creation(n)()
+    return lambda: _rendered_map(m)
+
+
+def choropleth(_):
+    geo_data = _read_json('us-counties.json')
+    data = _county_data()
+
+    def run():
+        m = folium.Map([37, -95], zoom_start=4)
+        m.choropleth(geo_data, data=data,
+                     columns=['FIPS_Code', 'Unemployment_rate_2011'],
+                     key_on='feature.id', fill_color='YlGn')
+        return _rendered_map(m)
+    return run
+
+
+def geojson_style_data(_):
+    geo_data = _read_json('us-counties.json')
+    geo_json = folium.GeoJson(
+        geo_data,
+        style_function=lambda feature: {'fillColor': 'blue', 'weight': 1},
+        highlight_function=lambda feature: {'weight': 3})
+    return geo_json.style_data
+
+
+def topojson_get_bounds(_):
+    topo_json = folium.TopoJson(_read_json('or_counties_topo.json'),
+                                'objects.or_counties_geo')
+    return topo_json.get_bounds
+
+
+def png_write(size):
+    data = np.random.RandomState(0).uniform(size=(size, size, 3))
+    return lambda: write_png(data)
+
+
+def png_write_mono(size):
+    data = np.random.RandomState(0).uniform(size=(size, size))
+    return lambda: write_png(data)
+
+
+def mercator(size):
+    data = np.random.RandomState(0).uniform(size=(size, size, 4))
+    return lambda: mercator_transform(data, (-60, 60))
+
+
+def heat_map(n):
+    data = _points(n).tolist()
+
+    def run():
+        m = folium.Map([37, -95], zoom_start=4)
+        plugins.HeatMap(data).add_to(m)
+        return _rendered_map(m)
+    return run
+
+
+def heat_map_with_time(n):
+    data = [_points(n, seed=i).tolist() for i in range(24)]
+
+    def run():
+        m = folium.Map([37, -95], zoom_start=4)
+        plugins.HeatMapWithTime(data).add_to(m)
+        return _rendered_map(m)
+    return run
+
+
+def map_save(n):
+    geo_data = _read_json('us-counties.json')
+    points = _points(n).tolist()
+    image = np.random.RandomState(0).uniform(size=(256, 256))
+
+    def run():
+        m = folium.Map([37, -95], zoom_start=4)
+        folium.GeoJson(geo_data).add_to(m)
+        plugins.HeatMap(points).add_to(m)
+        folium.raster_layers.ImageOverlay(image, [[25, -125], [50, -65]]).add_to(m)
+        for point in points[:100]:
+            folium.Marker(point, popup='popup').add_to(m)
+        folium.LayerControl().add_to(m)
+        return _rendered_map(m)
+    return run
+
+
+# name: (function, full parameters, quick parameters)
+BENCHMARKS = [
+    ('marker_creation', marker_creation, [10**3, 10**4, 10**5, 10**6], [10**3]),
+    ('circle_marker_creation', circle_marker_creation, [10**3, 10**4, 10**5, 10**6], [10**3]),
+    ('marker_render', marker_render, [10**3, 10**4, 10**5], [10**3]),
+    ('choropleth', choropleth, [None], [None]),
+    ('geojson_style_data', geojson_style_data, [None], [None]),
+    ('topojson_get_bounds', topojson_get_bounds, [None], [None]),
+    ('write_png', png_write, [64, 256, 1024, 2048], [64, 256]),
+    ('write_png_mono', png_write_mono, [64, 256, 1024], [64]),
+    ('mercator_transform', mercator, [64, 256, 1024, 2048], [64, 256]),
+    ('heat_map', heat_map, [10**3, 10**4, 10**5, 10**6], [10**3]),
+    ('heat_map_with_time', heat_map_with_time, [10**2, 10**3, 10**4], [10**2]),
+    ('map_save', map_save, [10**3, 10**5], [10**3]),
+]
+
+
+def _size(out):
+    if isinstance(out, bytes):
+        return len(out)
+    if isinstance(out, type(u'')):
+        return len(out.encode('utf8'))
+    return None
+
+
+def run_benchmark(func, repeat=3, min_time=0.2):
+    """
+    Times `func`, at least `repeat` times and until `min_time` seconds
+    have been spent, and returns a dict of the timings in seconds and
+    the size of its output in bytes.
+
+    """
+    times = []
+    out = None
+    while len(times) < repeat or sum(times) < min_time:
+        start = default_timer()
+        out = func()
+        times.append(default_timer() - start)
+        if len(times) >= 100:
+            break
+    times.sort()
+    return {
+        'times': times,
+        'min': times[0],
+        'median': times[len(times) // 2],
+        'bytes': _size(out),
+    }
+
+
+def run_benchmarks(quick=False, pattern=None, repeat=3, verbose=True):
+    """Runs all the benchmarks whose name contains `pattern`."""
+    results = []
+    for name, setup, params, quick_params in BENCHMARKS:
+        if pattern is not None and pattern not in name:
+            continue
+        for param in (quick_params if quick else params):
+            func = setup(param)
+            result = run_benchmark(func, repeat=repeat)
+            result.update({'name': name, 'param': param})
+            results.append(result)
+            if verbose:
+                print('{:<28} {:>10} {:>12.6f}s {:>14}'.format(
+                    name, '' if param is None else param, result['min'],
+                    '' if result['bytes'] is None else result['bytes']))
+    return results
+
+
+def environment():
+    """Describes the machine and versions the benchmarks ran on."""
+    return {
+        'date': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'folium': folium.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def compare(results, reference):
+    """Prints the ratio of the timings and sizes to a previous run."""
+    previous = {(r['name'], r['param']): r for r in reference['results']}
+    print('{:<28} {:>10} {:>10} {:>10}'.format('benchmark', 'param', 'time',
+                                               'size'))
+    for result in results:
+        old = previous.get((result['name'], result['param']))
+        if old is None:
+            continue
+        size = ('{:>9.2f}x'.format(result['bytes'] / old['bytes'])
+                if result['bytes'] and old['bytes'] else '')
+        print('{:<28} {:>10} {:>9.2f}x {:>10}'.format(
+            result['name'], '' if result['param'] is None else result['param'],
+            result['min'] / old['min'], size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--quick', action='store_true',
+                        help='Only run the smallest parameters.')
+    parser.add_argument('--filter', default=None,
+                        help='Only run benchmarks whose name contains this.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Minimum number of timings per benchmark.')
+    parser.add_argument('--output', default=None,
+                        help='Write the results to this JSON file.')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of a previous run to compare with.')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(quick=args.quick, pattern=args.filter,
+                             repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f,
+                      indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
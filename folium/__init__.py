@@ -1,70 +1,101 @@
 # -*- coding: utf-8 -*-
 
+"""
+The public names are imported lazily, on first access, to keep
+`import folium` fast.
+
+"""
+
 from __future__ import (absolute_import, division, print_function)
 
-from branca.colormap import (ColorMap, LinearColormap, StepColormap)
-from branca.element import (CssLink, Div, Element, Figure, Html, IFrame,
-                            JavascriptLink, Link, MacroElement)
+import importlib
+import sys
 
 from folium._version import get_versions
 
-from folium.features import (
-    ClickForMarker, ColorLine, CustomIcon, DivIcon, GeoJson,
-    LatLngPopup, RegularPolygonMarker, TopoJson, Vega, VegaLite,
+__version__ = get_versions()['version']
+del get_versions
+
+# Public name: module it is imported from.
+_LAZY_ATTRIBUTES = {
+    'ColorMap': 'branca.colormap',
+    'LinearColormap': 'branca.colormap',
+    'StepColormap': 'branca.colormap',
+    'CssLink': 'branca.element',
+    'Div': 'branca.element',
+    'Element': 'branca.element',
+    'Figure': 'branca.element',
+    'Html': 'branca.element',
+    'IFrame': 'branca.element',
+    'JavascriptLink': 'branca.element',
+    'Link': 'branca.element',
+    'MacroElement': 'branca.element',
+    'ClickForMarker': 'folium.features',
+    'ColorLine': 'folium.features',
+    'CustomIcon': 'folium.features',
+    'DivIcon': 'folium.features',
+    'GeoJson': 'folium.features',
+    'GeoJsonChoropleth': 'folium.features',
+    'LatLngPopup': 'folium.features',
+    'RegularPolygonMarker': 'folium.features',
+    'TopoJson': 'folium.features',
+    'Vega': 'folium.features',
+    'VegaLite': 'folium.features',
+    'Map': 'folium.folium',
+    'FeatureGroup': 'folium.map',
+    'FitBounds': 'folium.map',
+    'Icon': 'folium.map',
+    'LayerControl': 'folium.map',
+    'Marker': 'folium.map',
+    'Popup': 'folium.map',
+    'TileLayer': 'folium.raster_layers',
+    'WmsTileLayer': 'folium.raster_layers',
+    'Circle': 'folium.vector_layers',
+    'CircleMarker': 'folium.vector_layers',
+    'PolyLine': 'folium.vector_layers',
+    'Polygon': 'folium.vector_layers',
+    'Rectangle': 'folium.vector_layers',
+}
+
+_SUBMODULES = (
+    'features',
+    'folium',
+    'map',
+    'plugins',
+    'profiling',
+    'raster_layers',
+    'utilities',
+    'vector_layers',
 )
 
-# from folium.raster_layers imoort TileLayer, WmsTileLayer
 
-from folium.folium import Map
+def _import_lazy(namespace, name, attributes, submodules):
+    """
+    Imports the lazy attribute or submodule `name` of the package
+    `namespace` and caches it in the package globals.
 
-from folium.map import (
-    FeatureGroup, FitBounds, Icon, LayerControl, Marker, Popup
-)
+    """
+    if name in attributes:
+        value = getattr(importlib.import_module(attributes[name]), name)
+    elif name in submodules:
+        value = importlib.import_module('{}.{}'.format(namespace['__name__'], name))
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            namespace['__name__'], name))
+    namespace[name] = value
+    return value
 
-from folium.vector_layers import Circle, CircleMarker, PolyLine, Polygon, Rectangle  # noqa
 
-__version__ = get_versions()['version']
-del get_versions
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        return _import_lazy(globals(), name, _LAZY_ATTRIBUTES, _SUBMODULES)
+
+    def __dir__():
+        return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_SUBMODULES))
+else:
+    # Module level __getattr__ is not supported, import everything.
+    for _name in _LAZY_ATTRIBUTES:
+        _import_lazy(globals(), _name, _LAZY_ATTRIBUTES, ())
+    del _name
 
-__all__ = [
-    'CssLink',
-    'Div',
-    'Element',
-    'Figure',
-    'Html',
-    'IFrame',
-    'JavascriptLink',
-    'Link',
-    'MacroElement',
-    'ColorMap',
-    'ColorLine',
-    'LinearColormap',
-    'StepColormap',
-    'Map',
-    'FeatureGroup',
-    'FitBounds',
-    'Icon',
-    'LayerControl',
-    'Marker',
-    'Popup',
-    'TileLayer',
-    'ClickForMarker',
-    'CustomIcon',
-    'DivIcon',
-    'GeoJson',
-    'GeoJsonStyle',
-    'LatLngPopup',
-    'MarkerCluster',
-    'Vega',
-    'VegaLite',
-    'RegularPolygonMarker',
-    'TopoJson',
-    'WmsTileLayer',
-    # vector_layers
-    'Circle',
-    'CircleMarker',
-    'PolyLine',
-    'Polygon',
-    'Polyline',
-    'Rectangle',
-]
+__all__ = sorted(_LAZY_ATTRIBUTES)
@@ -7,21 +7,21 @@ Leaflet GeoJson and miscellaneous features.
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
+import hashlib
+from collections import OrderedDict
 
-from branca.colormap import LinearColormap
+from branca.colormap import LinearColormap, StepColormap
 from branca.element import (CssLink, Element, Figure, JavascriptLink, MacroElement)  # noqa
-from branca.utilities import (_locations_tolist, _parse_size, image_to_url, iter_points, none_max, none_min)  # noqa
+from branca.utilities import (_locations_tolist, _parse_size, color_brewer, image_to_url, iter_points, none_max, none_min)  # noqa
 
-from folium.map import FeatureGroup, Icon, Layer, Marker
-from folium.utilities import get_bounds
+from folium.map import (FeatureGroup, Icon, Layer, Marker, add_inflate_decoder,
+                        add_typed_array_decoder, get_shared_definitions)
+from folium.utilities import (Template, _LRUCache, compress_payload,
+                              encode_typed_array, get_bounds, json_dumps,
+                              json_loads, np, parallel_map)
 from folium.vector_layers import PolyLine
 
-from jinja2 import Template
-
-import requests
-
-from six import binary_type, text_type
+from six import binary_type, integer_types, text_type
 
 
 class RegularPolygonMarker(Marker):
@@ -142,7 +142,7 @@ class Vega(Element):
         self._name = 'Vega'
         self.data = data.to_json() if hasattr(data, 'to_json') else data
         if isinstance(self.data, text_type) or isinstance(data, binary_type):
-            self.data = json.loads(self.data)
+            self.data = json_loads(self.data)
 
         # Size Parameters.
         self.width = _parse_size(self.data.get('width', '100%') if
@@ -156,7 +156,7 @@ class Vega(Element):
 
     def render(self, **kwargs):
         """Renders the HTML representation of the element."""
-        self.json = json.dumps(self.data)
+        self.json = json_dumps(self.data)
 
         self._parent.html.add_child(Element(Template("""
             <div id="{{this.get_name()}}"></div>
@@ -233,7 +233,7 @@ class VegaLite(Element):
         self._name = 'VegaLite'
         self.data = data.to_json() if hasattr(data, 'to_json') else data
         if isinstance(self.data, text_type) or isinstance(data, binary_type):
-            self.data = json.loads(self.data)
+            self.data = json_loads(self.data)
 
         # Size Parameters.
         self.width = _parse_size(self.data.get('width', '100%') if
@@ -247,7 +247,7 @@ class VegaLite(Element):
 
     def render(self, **kwargs):
         """Renders the HTML representation of the element."""
-        self.json = json.dumps(self.data)
+        self.json = json_dumps(self.data)
 
         self._parent.html.add_child(Element(Template("""
             <div id="{{this.get_name()}}"></div>
@@ -294,6 +294,130 @@ class VegaLite(Element):
             name='vega-embed')
 
 
+def _as_column(values):
+    """
+    Turns a list of values into a NumPy array: of floats for numbers with
+    None, of the common type for scalars, and of objects otherwise, like
+    for lists or for strings with None.
+
+    """
+    types = set(map(type, values))
+    numbers = set([type(None), bool, float] + list(integer_types))
+    if type(None) in types and types <= numbers:
+        return np.array(values, dtype=float)
+    if (types <= numbers or types <= set([text_type]) or
+            types <= set([binary_type])):
+        return np.asarray(values)
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+class _PropertyColumns(dict):
+    """
+    Dict of the columns of a list of GeoJSON properties, as NumPy arrays
+    built when first accessed, with NaNs for the missing numbers and None
+    for the other missing values.
+
+    """
+    def __init__(self, properties):
+        super(_PropertyColumns, self).__init__()
+        self.properties = properties
+
+    def __missing__(self, name):
+        values = [value.get(name) for value in self.properties]
+        if all(value is None for value in values) and not any(
+                name in value for value in self.properties):
+            raise KeyError(name)
+        column = self[name] = _as_column(values)
+        return column
+
+
+def _codes(column):
+    """Returns the index of each value of `column` among its distinct values."""
+    if column.dtype.kind in 'biufUS':
+        return np.unique(column, return_inverse=True)[1].ravel()
+    index = {}
+    unhashable = {}
+    codes = []
+    for value in column.tolist():
+        try:
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(index) + len(unhashable)
+        except TypeError:
+            # Unhashable values, like lists, are compared by their JSON.
+            text = json_dumps(value, sort_keys=True)
+            code = unhashable.get(text)
+            if code is None:
+                code = unhashable[text] = len(index) + len(unhashable)
+        codes.append(code)
+    return np.array(codes, dtype=np.int64)
+
+
+def _style_rows(styles, n):
+    """
+    Splits a dict of style values, arrays of length `n` or single values,
+    into the list of distinct styles and the index of the style of each
+    feature.
+
+    """
+    codes = np.zeros(n, dtype=np.int64)
+    constants = {}
+    values = []
+    for key, value in styles.items():
+        if isinstance(value, np.generic):
+            constants[key] = value.item()
+            continue
+        if not isinstance(value, (list, tuple)) and not hasattr(value, '__array__'):  # noqa
+            constants[key] = value
+            continue
+        if not isinstance(value, np.ndarray) or value.ndim != 1:
+            value = _as_column(list(value))
+        if len(value) != n:
+            raise ValueError('Expected {} values for {!r}, got {}.'.format(
+                n, key, len(value)))
+        inverse = _codes(value)
+        _, codes = np.unique(codes * (inverse.max() + 1) + inverse,
+                             return_inverse=True)
+        codes = codes.ravel()
+        values.append((key, value))
+    if not n:
+        return [], []
+    _, first, codes = np.unique(codes, return_index=True, return_inverse=True)
+    rows = []
+    for i in first.tolist():
+        row = dict(constants)
+        row.update((key, value[i].item() if hasattr(value[i], 'item') else value[i])
+                   for key, value in values)
+        rows.append(row)
+    return rows, codes.ravel().tolist()
+
+
+def _prune_properties(features, names):
+    """
+    Returns shallow copies of GeoJSON features keeping only the properties
+    in `names`, and their style and highlight.
+
+    """
+    names = set(names) | set(['style', 'highlight'])
+    pruned = []
+    for feature in features:
+        properties = feature.get('properties')
+        if properties:
+            feature = dict(feature, properties=dict(
+                (name, value) for name, value in properties.items()
+                if name in names))
+        pruned.append(feature)
+    return pruned
+
+
+_PARALLEL_CHUNK_SIZE = 1000
+
+_FEATURES_PLACEHOLDER = '__folium_features__'
+
+
 class GeoJson(Layer):
     """
     Creates a GeoJson object for plotting into a Map.
@@ -321,6 +445,30 @@ class GeoJson(Layer):
         How much to simplify the polyline on each zoom level. More means
         better performance and smoother look, and less means more accurate
         representation. Leaflet defaults to 1.0.
+    compress: bool or int, default False
+        Whether to embed the data deflated and base64 encoded, to be
+        inflated by the browser.  This makes the file several times
+        smaller, but needs a browser supporting `DecompressionStream`.
+        If True, only data of more than 10 kB is compressed; if an
+        integer, the minimum size in bytes of the data to compress.
+        See `utilities.compress_payload`.
+    properties: list of str, default None
+        Names of the feature properties to embed in the map.  If set, the
+        other properties are dropped from the output, after the styles are
+        computed, which can make it much smaller.  The styles are always
+        kept.  By default, all the properties are embedded.
+    vectorized: bool, default False
+        If True, `style_function` and `highlight_function` are called once
+        for all the features, with a dict mapping each property name to a
+        NumPy array of its values, and return a dict mapping each style
+        option to an array of values, or to a single value for all the
+        features.  This is much faster than one call per feature.
+        Requires NumPy.
+    workers: int, default None
+        If set, the features are styled and serialized by chunks in that
+        many forked processes, which is faster for large layers.  The style
+        functions then only apply to the copies of the features in the
+        processes, not to `data`.  See `utilities.parallel_map`.
 
     Examples
     --------
@@ -339,34 +487,50 @@ class GeoJson(Layer):
     ...                             '#00ff00'}
     >>> GeoJson(geojson, style_function=style_function)
 
+    >>> # The same style, computed for all the features at once.
+    >>> style_function = lambda x: {'fillColor': np.where(
+    ...                             x['name'] == 'Alabama', '#0000ff', '#00ff00')}
+    >>> GeoJson(geojson, style_function=style_function, vectorized=True)
+
     """
     def __init__(self, data, style_function=None, name=None,
                  overlay=True, control=True, smooth_factor=None,
-                 highlight_function=None, tooltip=None):
+                 highlight_function=None, tooltip=None, compress=False,
+                 properties=None, vectorized=False, workers=None):
         super(GeoJson, self).__init__(name=name, overlay=overlay,
                                       control=control)
         self._name = 'GeoJson'
         self.tooltip = tooltip
+        self.compress = compress
+        self.properties = properties
+        self.vectorized = vectorized
+        self.workers = workers
+        if vectorized and np is None:
+            raise ImportError('The NumPy package is required '
+                              ' for this functionality')
+        self._styled = None
+        self._compressed = None
         if isinstance(data, dict):
             self.embed = True
             self.data = data
         elif isinstance(data, text_type) or isinstance(data, binary_type):
             self.embed = True
             if data.lower().startswith(('http:', 'ftp:', 'https:')):
+                import requests
                 self.data = requests.get(data).json()
             elif data.lstrip()[0] in '[{':  # This is a GeoJSON inline string
-                self.data = json.loads(data)
+                self.data = json_loads(data)
             else:  # This is a filename
                 with open(data) as f:
-                    self.data = json.loads(f.read())
+                    self.data = json_loads(f.read())
         elif data.__class__.__name__ in ['GeoDataFrame', 'GeoSeries']:
             self.embed = True
             if hasattr(data, '__geo_interface__'):
                 # We have a GeoPandas 0.2 object.
-                self.data = json.loads(json.dumps(data.to_crs(epsg='4326').__geo_interface__))  # noqa
+                self.data = data.to_crs(epsg='4326').__geo_interface__
             elif hasattr(data, 'columns'):
                 # We have a GeoDataFrame 0.1
-                self.data = json.loads(data.to_crs(epsg='4326').to_json())
+                self.data = json_loads(data.to_crs(epsg='4326').to_json())
             else:
                 msg = 'Unable to transform this object to a GeoJSON.'
                 raise ValueError(msg)
@@ -406,7 +570,7 @@ class GeoJson(Layer):
             {% endif %}
 
                 var {{this.get_name()}} = L.geoJson(
-                    {% if this.embed %}{{this.style_data()}}{% else %}"{{this.data}}"{% endif %}
+                    {% if this._compressed %}null{% elif this.embed %}{{this._styled|json_literal}}{% else %}"{{this.data}}"{% endif %}
                     {% if this.smooth_factor is not none or this.highlight %}
                         , {
                         {% if this.smooth_factor is not none  %}
@@ -424,28 +588,99 @@ class GeoJson(Layer):
                     )
                     {% if this.tooltip %}.bindTooltip("{{this.tooltip.__str__()}}"){% endif %}
                     .addTo({{this._parent.get_name()}});
+            {% if this._compressed %}
+                foliumInflate("{{this._compressed}}").then(function(data) {
+                    {{this.get_name()}}.addData(data);
+                    {{this.get_name()}}.setStyle(function(feature) {return feature.properties.style;});
+                });
+            {% else %}
                 {{this.get_name()}}.setStyle(function(feature) {return feature.properties.style;});
+            {% endif %}
 
             {% endmacro %}
             """)  # noqa
 
+    def _prerender(self):
+        styled = self.style_data() if self.embed else None
+        compressed = (compress_payload(styled, self.compress)
+                      if styled is not None and self.compress else None)
+        return {'_styled': styled, '_compressed': compressed}
+
+    def render(self, **kwargs):
+        if self._styled is None:
+            self.__dict__.update(self._prerender())
+        super(GeoJson, self).render(**kwargs)
+        self._styled = None
+        if self._compressed is not None:
+            figure = self.get_root()
+            assert isinstance(figure, Figure), ('You cannot render this Element '
+                                                'if it is not in a Figure.')
+            add_inflate_decoder(figure)
+
     def style_data(self):
         """
         Applies `self.style_function` to each feature of `self.data` and
         returns a corresponding JSON output.
 
         """
+        features = self._get_features()
+        if not self.workers or len(features) < 2 * _PARALLEL_CHUNK_SIZE:
+            self._style_features(features)
+            if self.properties is not None:
+                return json_dumps(dict(self.data, features=_prune_properties(
+                    features, self.properties)), sort_keys=True)
+            return json_dumps(self.data, sort_keys=True)
+
+        chunk_size = max(_PARALLEL_CHUNK_SIZE,
+                         -(-len(features) // (4 * self.workers)))
+        chunks = [(start, start + chunk_size)
+                  for start in range(0, len(features), chunk_size)]
+        fragments = parallel_map(self._style_chunk, chunks,
+                                 workers=self.workers)
+        # Serialize the collection with a placeholder, in the same format.
+        data = dict(self.data, features=[_FEATURES_PLACEHOLDER])
+        separator = json_dumps([0, 0])[2:-2]
+        return json_dumps(data, sort_keys=True).replace(
+            json_dumps([_FEATURES_PLACEHOLDER]),
+            '[{}]'.format(separator.join(fragments)), 1)
+
+    def _get_features(self):
+        """Turns `self.data` into a FeatureCollection and returns its features."""
         if 'features' not in self.data.keys():
             # Catch case when GeoJSON is just a single Feature or a geometry.
             if not (isinstance(self.data, dict) and 'geometry' in self.data.keys()):  # noqa
                 # Catch case when GeoJSON is just a geometry.
                 self.data = {'type': 'Feature', 'geometry': self.data}
             self.data = {'type': 'FeatureCollection', 'features': [self.data]}
-
-        for feature in self.data['features']:
+        return self.data['features']
+
+    def _style_features(self, features):
+        """Applies the style and highlight functions to the features."""
+        if self.vectorized:
+            properties = [feature.setdefault('properties', {})
+                          for feature in features]
+            columns = _PropertyColumns(properties)
+            for key, function in (('style', self.style_function),
+                                  ('highlight', self.highlight_function)):
+                rows, codes = _style_rows(function(columns), len(features))
+                if rows == [{}]:
+                    for values in properties:
+                        values.setdefault(key, {})
+                    continue
+                for values, code in zip(properties, codes):
+                    values.setdefault(key, {}).update(rows[code])
+            return
+        for feature in features:
             feature.setdefault('properties', {}).setdefault('style', {}).update(self.style_function(feature))  # noqa
             feature.setdefault('properties', {}).setdefault('highlight', {}).update(self.highlight_function(feature))  # noqa
-        return json.dumps(self.data, sort_keys=True)
+
+    def _style_chunk(self, chunk):
+        """Styles a slice of the features and returns their JSON."""
+        features = self.data['features'][chunk[0]:chunk[1]]
+        self._style_features(features)
+        if self.properties is not None:
+            features = _prune_properties(features, self.properties)
+        return json_dumps(features, sort_keys=True)[1:-1]
 
     def _get_self_bounds(self):
         """
@@ -456,6 +691,227 @@ class GeoJson(Layer):
         return get_bounds(self.data, lonlat=True)
 
 
+def _get_by_key(obj, key):
+    """Returns the value of a dotted `key`, like 'properties.name', in `obj`."""
+    return (obj.get(key, None) if len(key.split('.')) <= 1 else
+            _get_by_key(obj.get(key.split('.')[0], None),
+                        '.'.join(key.split('.')[1:])))
+
+
+def _color_domain(values, nb_class=6):
+    """
+    Returns `nb_class` classes of equal width covering `values`, with a
+    margin of 1%, as the `nb_class + 1` bounds of the classes.
+
+    """
+    data_min = min(values)
+    data_max = max(values)
+    if data_min == data_max:
+        data_min = (data_min if data_min < 0 else 0
+                    if data_min > 0 else -1)
+        data_max = (data_max if data_max > 0 else 0
+                    if data_max < 0 else 1)
+    data_min, data_max = (1.01*data_min-0.01*data_max,
+                          1.01*data_max-0.01*data_min)
+    return [data_min+i*(data_max-data_min)*1./nb_class
+            for i in range(1+nb_class)]
+
+
+class GeoJsonChoropleth(GeoJson):
+    """
+    Creates a choropleth of one or several variables, colored in the browser.
+
+    The geometries are embedded once, without their properties, with one
+    compact array of values per variable.  The map colors the features
+    from the values of the selected variable, and shows a control to
+    switch between the variables when there are several.
+
+    Parameters
+    ----------
+    data: file, dict or str.
+        The GeoJSON data you want to plot, see `GeoJson`.
+    values: pandas.DataFrame or dict
+        The values of each variable, as the columns of a DataFrame or a dict
+        mapping the names of the variables to their values.  Without
+        `key_on`, the values are in the order of the features that have a
+        geometry.  With `key_on`, they are indexed by the key of the
+        features, as the index of the DataFrame or dicts.  Missing and NaN
+        values have the first color of the scale.
+    key_on: string, default None
+        Variable in the GeoJSON file to bind the values to, like
+        'feature.id' or 'feature.properties.statename'.
+    thresholds: list or dict of lists, default None
+        Bounds of the color classes of all the variables, or dict mapping
+        the name of variables to theirs.  By default, 6 classes of equal
+        width between the minimum and maximum of each variable.
+    fill_color: string, default 'YlGn'
+        Color brewer palette of the classes, like 'BuGn' or 'YlOrRd'.
+    fill_opacity: float, default 0.6
+        Area fill opacity, range 0-1.
+    line_color: string, default 'black'
+        GeoJSON geopath line color.
+    line_weight: int, default 1
+        GeoJSON geopath line weight.
+    line_opacity: float, default 1
+        GeoJSON geopath line opacity, range 0-1.
+    highlight: bool, default False
+        Whether to highlight the features under the mouse.
+    name : string, default None
+        The name of the Layer, as it will appear in LayerControls
+    overlay : bool, default True
+        Adds the layer as an optional overlay (True) or the base layer (False).
+    control : bool, default True
+        Whether the Layer will be included in LayerControls
+    smooth_factor: float, default None
+        How much to simplify the polyline on each zoom level.
+    compress: bool or int, default False
+        Whether to embed the geometries deflated, see `GeoJson`.
+
+    Examples
+    --------
+    >>> GeoJsonChoropleth('us-states.json',
+    ...                   df.set_index('State')[['Unemployment', 'Income']],
+    ...                   key_on='feature.id', fill_color='YlGn')
+
+    """
+    def __init__(self, data, values, key_on=None, thresholds=None,
+                 fill_color='YlGn', fill_opacity=0.6, line_color='black',
+                 line_weight=1, line_opacity=1, highlight=False, name=None,
+                 overlay=True, control=True, smooth_factor=None,
+                 compress=False):
+        if np is None:
+            raise ImportError('The NumPy package is required '
+                              ' for this functionality')
+        super(GeoJsonChoropleth, self).__init__(
+            data, name=name, overlay=overlay, control=control,
+            smooth_factor=smooth_factor, compress=compress, properties=[])
+        self._name = 'GeoJsonChoropleth'
+        self.highlight = highlight
+        self.style = {'weight': line_weight, 'opacity': line_opacity,
+                      'color': line_color, 'fillOpacity': fill_opacity}
+        self.highlight_style = {'weight': line_weight + 2,
+                                'fillOpacity': fill_opacity + .2}
+
+        # Leaflet makes no layer of the features without geometry.
+        features = [feature for feature in self._get_features()
+                    if feature.get('geometry')]
+        if key_on is not None:
+            key_on = key_on[8:] if key_on.startswith('feature.') else key_on
+            keys = [_get_by_key(feature, key_on) for feature in features]
+        columns = OrderedDict()
+        for variable in values:
+            column = values[variable]
+            if key_on is not None:
+                column = [column.get(key) for key in keys]
+            elif isinstance(column, dict):
+                raise ValueError('The values of {!r} are a mapping, which needs '
+                                 'key_on to be bound to the features.'.format(variable))
+            column = np.array([np.nan if value is None else value
+                               for value in column], dtype=float)
+            if len(column) != len(features):
+                raise ValueError('Expected {} values for {!r}, got {}.'.format(
+                    len(features), variable, len(column)))
+            columns[variable] = column
+        if not columns:
+            raise ValueError('values must have at least one variable.')
+
+        self.scales = []
+        for variable, column in columns.items():
+            domain = (thresholds.get(variable) if isinstance(thresholds, dict)
+                      else thresholds)
+            if not domain:
+                finite = column[np.isfinite(column)]
+                domain = _color_domain(finite.tolist() if len(finite) else [0])
+            colors = color_brewer(fill_color, n=len(domain))
+            if not colors:
+                raise ValueError('Please pass a valid color brewer code to '
+                                 'fill_color, got {!r}.'.format(fill_color))
+            self.scales.append({'name': text_type(variable),
+                                'thresholds': list(domain),
+                                'colors': colors})
+        self._values = json_dumps(encode_typed_array(
+            np.column_stack(list(columns.values())).reshape(
+                len(features), len(columns))))
+
+        self._geojson_template = self._template
+        self._template = Template(u"""
+            {% macro script(this, kwargs) %}
+            {{ this._geojson_template.module.script(this, kwargs) }}
+                var {{this.get_name()}}_values = foliumDecodeTypedArray({{ this._values }});
+                var {{this.get_name()}}_scales = {{ this.scales|tojson }};
+                var {{this.get_name()}}_variable = 0;
+                function {{this.get_name()}}_show(variable) {
+                    // Colors the features by the values of a variable,
+                    // given by index or name.
+                    var scales = {{this.get_name()}}_scales;
+                    if (typeof variable === 'string') {
+                        variable = scales.map(function(scale) {
+                            return scale.name; }).indexOf(variable);
+                    }
+                    {{this.get_name()}}_variable = variable;
+                    var scale = scales[variable];
+                    var i = 0;
+                    {{this.get_name()}}.eachLayer(function(layer) {
+                        var row = {{this.get_name()}}_values[i++];
+                        var value = row ? row[variable] : NaN;
+                        var k = 0;
+                        while (!isNaN(value) && k < scale.thresholds.length &&
+                               scale.thresholds[k] <= value) { k++; }
+                        var style = Object.assign({}, {{ this.style|tojson }}, {
+                            fillColor: scale.colors[Math.min(k, scale.colors.length - 1)]});
+                        layer.feature.properties.style = style;
+                        layer.feature.properties.highlight = Object.assign(
+                            {}, style, {{ this.highlight_style|tojson }});
+                        layer.setStyle(style);
+                    });
+                }
+                {{this.get_name()}}_show(0);
+                // Compressed features are added later.
+                var {{this.get_name()}}_pending = null;
+                {{this.get_name()}}.on('layeradd', function() {
+                    clearTimeout({{this.get_name()}}_pending);
+                    {{this.get_name()}}_pending = setTimeout(function() {
+                        {{this.get_name()}}_show({{this.get_name()}}_variable);
+                    }, 0);
+                });
+            {% if this.scales|length > 1 %}
+                var {{this.get_name()}}_control = L.control({position: 'topright'});
+                {{this.get_name()}}_control.onAdd = function() {
+                    var select = L.DomUtil.create('select', 'folium-choropleth-variable');
+                    {{this.get_name()}}_scales.forEach(function(scale, i) {
+                        var option = L.DomUtil.create('option', '', select);
+                        option.value = i;
+                        option.text = scale.name;
+                    });
+                    L.DomEvent.disableClickPropagation(select);
+                    L.DomEvent.on(select, 'change', function() {
+                        {{this.get_name()}}_show(Number(select.value));
+                    });
+                    return select;
+                };
+                {{this.get_name()}}_control.addTo({{this._parent.get_name()}});
+            {% endif %}
+            {% endmacro %}
+            """)  # noqa
+
+    def style_data(self):
+        """
+        Returns the JSON of the features with empty properties, as they are
+        styled in the browser.
+
+        """
+        features = [dict(feature, properties={})
+                    for feature in self._get_features()]
+        return json_dumps(dict(self.data, features=features), sort_keys=True)
+
+    def render(self, **kwargs):
+        super(GeoJsonChoropleth, self).render(**kwargs)
+        figure = self.get_root()
+        assert isinstance(figure, Figure), ('You cannot render this Element '
+                                            'if it is not in a Figure.')
+        add_typed_array_decoder(figure)
+
+
 class TopoJson(Layer):
     """
     Creates a TopoJson object for plotting into a Map.
@@ -512,7 +968,7 @@ class TopoJson(Layer):
         self.tooltip = tooltip
         if 'read' in dir(data):
             self.embed = True
-            self.data = json.load(data)
+            self.data = json_loads(data.read())
         elif type(data) is dict:
             self.embed = True
             self.data = data
@@ -531,7 +987,7 @@ class TopoJson(Layer):
 
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
-                var {{this.get_name()}}_data = {{this.style_data()}};
+                var {{this.get_name()}}_data = {{this.style_data()|json_literal}};
                 var {{this.get_name()}} = L.geoJson(topojson.feature(
                     {{this.get_name()}}_data,
                     {{this.get_name()}}_data.{{this.object_path}})
@@ -560,7 +1016,7 @@ class TopoJson(Layer):
         geometries = recursive_get(self.data, self.object_path.split('.'))['geometries']  # noqa
         for feature in geometries:
             feature.setdefault('properties', {}).setdefault('style', {}).update(self.style_function(feature))  # noqa
-        return json.dumps(self.data, sort_keys=True)
+        return json_dumps(self.data, sort_keys=True)
 
     def render(self, **kwargs):
         """Renders the HTML representation of the element."""
@@ -721,6 +1177,27 @@ class ClickForMarker(MacroElement):
             """)  # noqa
 
 
+_ICON_URLS = _LRUCache(128)
+
+
+def _icon_url(image):
+    """
+    Returns the URL of `image`, as `image_to_url`, encoding arrays with the
+    same content only once.
+
+    """
+    if (np is None or hasattr(image, 'read') or
+            isinstance(image, (text_type, binary_type))):
+        return image_to_url(image)
+    array = np.ascontiguousarray(image)
+    if array.dtype.kind not in 'biuf':
+        return image_to_url(image)
+    key = (array.shape, array.dtype.str, hashlib.sha1(array).hexdigest())
+    if key not in _ICON_URLS:
+        _ICON_URLS[key] = image_to_url(image)
+    return _ICON_URLS[key]
+
+
 class CustomIcon(Icon):
     """
     Create a custom icon, based on an image.
@@ -754,16 +1231,30 @@ class CustomIcon(Icon):
         relative to the icon anchor.
 
     """
+    _definition = u"""
+        L.icon({
+            iconUrl: {{this._icon_url_name}},
+            {% if this.icon_size %}iconSize: [{{this.icon_size[0]}},{{this.icon_size[1]}}],{% endif %}
+            {% if this.icon_anchor %}iconAnchor: [{{this.icon_anchor[0]}},{{this.icon_anchor[1]}}],{% endif %}
+
+            {% if this.shadow_url %}shadowUrl: {{this._shadow_url_name}},{% endif %}
+            {% if this.shadow_size %}shadowSize: [{{this.shadow_size[0]}},{{this.shadow_size[1]}}],{% endif %}
+            {% if this.shadow_anchor %}shadowAnchor: [{{this.shadow_anchor[0]}},{{this.shadow_anchor[1]}}],{% endif %}
+
+            {% if this.popup_anchor %}popupAnchor: [{{this.popup_anchor[0]}},{{this.popup_anchor[1]}}],{% endif %}
+            })
+        """  # noqa
+
     def __init__(self, icon_image, icon_size=None, icon_anchor=None,
                  shadow_image=None, shadow_size=None, shadow_anchor=None,
                  popup_anchor=None):
         super(Icon, self).__init__()
         self._name = 'CustomIcon'
-        self.icon_url = image_to_url(icon_image)
+        self.icon_url = _icon_url(icon_image)
         self.icon_size = icon_size
         self.icon_anchor = icon_anchor
 
-        self.shadow_url = (image_to_url(shadow_image)
+        self.shadow_url = (_icon_url(shadow_image)
                            if shadow_image is not None else None)
         self.shadow_size = shadow_size
         self.shadow_anchor = shadow_anchor
@@ -771,21 +1262,67 @@ class CustomIcon(Icon):
 
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
+                var {{this.get_name()}} = {{this._shared_name}};
+                {{this._parent.get_name()}}.setIcon({{this.get_name()}});
+            {% endmacro %}
+            """)
 
-                var {{this.get_name()}} = L.icon({
-                    iconUrl: '{{this.icon_url}}',
-                    {% if this.icon_size %}iconSize: [{{this.icon_size[0]}},{{this.icon_size[1]}}],{% endif %}
-                    {% if this.icon_anchor %}iconAnchor: [{{this.icon_anchor[0]}},{{this.icon_anchor[1]}}],{% endif %}
+    def render(self, **kwargs):
+        """Renders the HTML representation of the element."""
+        figure = self.get_root()
+        assert isinstance(figure, Figure), ('You cannot render this Element '
+                                            'if it is not in a Figure.')
 
-                    {% if this.shadow_url %}shadowUrl: '{{this.shadow_url}}',{% endif %}
-                    {% if this.shadow_size %}shadowSize: [{{this.shadow_size[0]}},{{this.shadow_size[1]}}],{% endif %}
-                    {% if this.shadow_anchor %}shadowAnchor: [{{this.shadow_anchor[0]}},{{this.shadow_anchor[1]}}],{% endif %}
+        # Embedded images are shared by all the icons using them.
+        definitions = get_shared_definitions(figure)
+        self._icon_url_name = definitions.add(
+            'image', json_dumps(self.icon_url))
+        if self.shadow_url:
+            self._shadow_url_name = definitions.add(
+                'image', json_dumps(self.shadow_url))
+        super(CustomIcon, self).render(**kwargs)
 
-                    {% if this.popup_anchor %}popupAnchor: [{{this.popup_anchor[0]}},{{this.popup_anchor[1]}}],{% endif %}
-                    });
-                {{this._parent.get_name()}}.setIcon({{this.get_name()}});
-            {% endmacro %}
-            """)  # noqa
+
+def _color_runs(colors, cm):
+    """
+    Groups consecutive segments of the same color.  Yields the color and
+    the indices of the first and last segments of each run.
+
+    """
+    if np is None:
+        names = {}
+        start = 0
+        for i, value in enumerate(colors):
+            if value not in names:
+                names[value] = cm(value)
+            if i and names[value] != names[colors[start]]:
+                yield names[colors[start]], start, i
+                start = i
+        if len(colors):
+            yield names[colors[start]], start, len(colors)
+        return
+
+    if not len(colors):
+        return
+    if isinstance(cm, StepColormap):
+        # Same binning as StepColormap.rgba_floats_tuple, in one pass.
+        codes = np.clip(np.searchsorted(cm.index, colors) - 1,
+                        0, len(cm.colors) - 1)
+    else:
+        _, codes = np.unique(colors, return_inverse=True)
+        codes = codes.ravel()
+    # One colormap call per distinct code, then merge codes of same color.
+    used, first = np.unique(codes, return_index=True)
+    names, labels = np.unique([cm(colors[i]) for i in first],
+                              return_inverse=True)
+    lookup = np.zeros(used.max() + 1, dtype=int)
+    lookup[used] = labels.ravel()
+    labels = lookup[codes]
+
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(labels)) + 1])
+    ends = np.append(starts[1:], len(labels))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        yield str(names[labels[start]]), start, end
 
 
 class ColorLine(FeatureGroup):
@@ -794,11 +1331,12 @@ class ColorLine(FeatureGroup):
 
     Parameters
     ----------
-    positions: tuple or list
+    positions: tuple, list or numpy.array of shape (n, 2)
         The list of points latitude and longitude
-    colors: tuple or list
+    colors: tuple, list or numpy.array
         The list of segments colors.
         It must have length equal to `len(positions)-1`.
+        Consecutive segments of the same color are drawn as one line.
     colormap: branca.colormap.Colormap or list or tuple
         The colormap to use. If a list or tuple of colors is provided,
         a LinearColormap will be created from it.
@@ -809,6 +1347,10 @@ class ColorLine(FeatureGroup):
         Line opacity, scale 0-1
     weight: int, default 2
         Stroke weight in pixels
+    encoding: {None, 'polyline'}, default None
+        Encoding of the lines' locations, see `PolyLine`.
+    precision: int, default 5
+        Number of decimals kept with the 'polyline' encoding.
     **kwargs
         Further parameters available. See folium.map.FeatureGroup
 
@@ -818,26 +1360,38 @@ class ColorLine(FeatureGroup):
 
     """
     def __init__(self, positions, colors, colormap=None, nb_steps=12,
-                 weight=None, opacity=None, **kwargs):
+                 weight=None, opacity=None, encoding=None, precision=5,
+                 **kwargs):
         super(ColorLine, self).__init__(**kwargs)
         self._name = 'ColorLine'
 
+        if np is not None:
+            positions = np.asarray(positions, dtype=float)
+            colors = np.asarray(colors, dtype=float)
+            vmin, vmax = (colors.min(), colors.max()) if len(colors) else (0, 1)
+        else:
+            vmin, vmax = min(colors), max(colors)
+
         if colormap is None:
             cm = LinearColormap(['green', 'yellow', 'red'],
-                                vmin=min(colors),
-                                vmax=max(colors),
+                                vmin=vmin,
+                                vmax=vmax,
                                 ).to_step(nb_steps)
         elif isinstance(colormap, LinearColormap):
             cm = colormap.to_step(nb_steps)
         elif isinstance(colormap, list) or isinstance(colormap, tuple):
             cm = LinearColormap(colormap,
-                                vmin=min(colors),
-                                vmax=max(colors),
+                                vmin=vmin,
+                                vmax=vmax,
                                 ).to_step(nb_steps)
         else:
             cm = colormap
-        out = {}
-        for (lat1, lng1), (lat2, lng2), color in zip(positions[:-1], positions[1:], colors):  # noqa
-            out.setdefault(cm(color), []).append([[lat1, lng1], [lat2, lng2]])
+
+        out = OrderedDict()
+        for color, start, end in _color_runs(colors[:len(positions) - 1], cm):
+            line = positions[start:end + 1]
+            out.setdefault(color, []).append(
+                line if np is not None else [[lat, lng] for lat, lng in line])
         for key, val in out.items():
-            self.add_child(PolyLine(val, color=key, weight=weight, opacity=opacity))  # noqa
+            self.add_child(PolyLine(val, color=key, weight=weight, opacity=opacity,
+                                    encoding=encoding, precision=precision))
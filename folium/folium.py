@@ -15,14 +15,10 @@ from branca.colormap import StepColormap
 from branca.element import CssLink, Element, Figure, JavascriptLink, MacroElement
 from branca.utilities import _parse_size, color_brewer
 
-from folium.features import GeoJson, TopoJson
+from folium.features import GeoJson, GeoJsonChoropleth, TopoJson, _color_domain, _get_by_key  # noqa
 from folium.map import FitBounds
 from folium.raster_layers import TileLayer
-from folium.utilities import _validate_location
-
-from jinja2 import Environment, PackageLoader, Template
-
-ENV = Environment(loader=PackageLoader('folium', 'templates'))
+from folium.utilities import Template, _validate_location, get_templates_env, prerender
 
 
 _default_js = [
@@ -169,10 +165,10 @@ class Map(MacroElement):
                  min_lon=-180, max_lon=180, max_bounds=False,
                  detect_retina=False, crs='EPSG3857', control_scale=False,
                  prefer_canvas=False, no_touch=False, disable_3d=False,
-                 subdomains='abc', png_enabled=False):
+                 subdomains=None, png_enabled=False):
         super(Map, self).__init__()
         self._name = 'Map'
-        self._env = ENV
+        self._env = get_templates_env()
         # Undocumented for now b/c this will be subject to a re-factor soon.
         self._png_image = None
         self.png_enabled = png_enabled
@@ -301,7 +297,7 @@ class Map(MacroElement):
     def add_tile_layer(self, tiles='OpenStreetMap', name=None,
                        API_key=None, max_zoom=18, min_zoom=1,
                        attr=None, active=False,
-                       detect_retina=False, no_wrap=False, subdomains='abc',
+                       detect_retina=False, no_wrap=False, subdomains=None,
                        **kwargs):
         """
         Add a tile layer to the map. See TileLayer for options.
@@ -316,7 +312,19 @@ class Map(MacroElement):
         self.add_child(tile_layer, name=tile_layer.tile_name)
 
     def render(self, **kwargs):
-        """Renders the HTML representation of the element."""
+        """
+        Renders the HTML representation of the element.
+
+        With `workers=n`, for instance `m.save('map.html', workers=8)`, the
+        expensive work of the layers, like styling GeoJson data or encoding
+        images, is first done in `n` parallel processes, with the same
+        output.  See `utilities.prerender`.
+
+        """
+        workers = kwargs.pop('workers', None)
+        if workers:
+            prerender(self, workers=workers)
+
         figure = self.get_root()
         assert isinstance(figure, Figure), ('You cannot render this Element '
                                             'if it is not in a Figure.')
@@ -391,7 +399,7 @@ class Map(MacroElement):
                    threshold_scale=None, fill_color='blue', fill_opacity=0.6,
                    line_color='black', line_weight=1, line_opacity=1, name=None,
                    legend_name='', topojson=None, reset=False, smooth_factor=None,
-                   highlight=None):
+                   highlight=None, client_side=False):
         """
         Apply a GeoJSON overlay to the map.
 
@@ -461,6 +469,12 @@ class Map(MacroElement):
             representation. Leaflet defaults to 1.0.
         highlight: boolean, default False
             Enable highlight functionality when hovering over a GeoJSON area.
+        client_side: boolean, default False
+            Color the areas in the browser, from the geometries and one
+            array of values per variable, see `GeoJsonChoropleth`.  The
+            'columns' of a DataFrame can then list several value columns
+            after the key, which the map can switch between.  Requires
+            `key_on`.
 
         Returns
         -------
@@ -483,6 +497,10 @@ class Map(MacroElement):
         ...              fill_color='PuBu',
         ...              threshold_scale=[0, 20, 30, 40, 50, 60],
         ...              highlight=True)
+        >>> m.choropleth(geo_data='geo.json', data=df,
+        ...              columns=['Key', 'Data 1', 'Data 2'],
+        ...              key_on='feature.properties.myvalue',
+        ...              fill_color='PuBu', client_side=True)
 
         """
         if threshold_scale and len(threshold_scale) > 6:
@@ -491,6 +509,38 @@ class Map(MacroElement):
             raise ValueError('Please pass a valid color brewer code to '
                              'fill_local. See docstring for valid codes.')
 
+        if client_side:
+            if data is None or topojson:
+                raise ValueError('client_side needs data, and is not '
+                                 'available with topojson.')
+            if key_on is None:
+                raise ValueError('client_side needs key_on to bind the '
+                                 'data to the features.')
+            if hasattr(data, 'set_index'):
+                # This is a pd.DataFrame
+                values = data.set_index(columns[0])[list(columns[1:])]
+            elif hasattr(data, 'to_dict'):
+                # This is a pd.Series
+                values = {data.name if data.name is not None else '': data}
+            else:
+                values = {'': dict(data)}
+            geo_json = GeoJsonChoropleth(
+                geo_data, values, key_on=key_on, thresholds=threshold_scale,
+                fill_color=fill_color, fill_opacity=fill_opacity,
+                line_color=line_color, line_weight=line_weight,
+                line_opacity=line_opacity, highlight=bool(highlight),
+                name=name, smooth_factor=smooth_factor)
+            self.add_child(geo_json)
+            if len(geo_json.scales) == 1:
+                scale = geo_json.scales[0]
+                self.add_child(StepColormap(
+                    scale['colors'][1:],
+                    index=scale['thresholds'],
+                    vmin=scale['thresholds'][0],
+                    vmax=scale['thresholds'][-1],
+                    caption=legend_name))
+            return
+
         # Create color_data dict
         if hasattr(data, 'set_index'):
             # This is a pd.DataFrame
@@ -508,35 +558,24 @@ class Map(MacroElement):
             color_domain = list(threshold_scale)
         elif color_data:
             # To avoid explicit pandas dependency ; changed default behavior.
-            data_min = min(color_data.values())
-            data_max = max(color_data.values())
-            if data_min == data_max:
-                data_min = (data_min if data_min < 0 else 0
-                            if data_min > 0 else -1)
-                data_max = (data_max if data_max > 0 else 0
-                            if data_max < 0 else 1)
-            data_min, data_max = (1.01*data_min-0.01*data_max,
-                                  1.01*data_max-0.01*data_min)
-            nb_class = 6
-            color_domain = [data_min+i*(data_max-data_min)*1./nb_class
-                            for i in range(1+nb_class)]
+            color_domain = _color_domain(list(color_data.values()))
         else:
             color_domain = None
 
+        # Only the joined property is embedded, the styles being computed here.
+        properties = None
+        if key_on and key_on.startswith('feature.properties.'):
+            properties = [key_on.split('.')[2]]
+
         if color_domain and key_on:
             key_on = key_on[8:] if key_on.startswith('feature.') else key_on
             color_range = color_brewer(fill_color, n=len(color_domain))
 
-            def get_by_key(obj, key):
-                return (obj.get(key, None) if len(key.split('.')) <= 1 else
-                        get_by_key(obj.get(key.split('.')[0], None),
-                                   '.'.join(key.split('.')[1:])))
-
             def color_scale_fun(x):
                 return color_range[len(
                     [u for u in color_domain if
-                     get_by_key(x, key_on) in color_data and
-                     u <= color_data[get_by_key(x, key_on)]])]
+                     _get_by_key(x, key_on) in color_data and
+                     u <= color_data[_get_by_key(x, key_on)]])]
         else:
             def color_scale_fun(x):
                 return fill_color
@@ -569,7 +608,8 @@ class Map(MacroElement):
                 name=name,
                 style_function=style_function,
                 smooth_factor=smooth_factor,
-                highlight_function=highlight_function if highlight else None)
+                highlight_function=highlight_function if highlight else None,
+                properties=properties)
 
         self.add_child(geo_json)
 
@@ -7,15 +7,17 @@ Classes for drawing maps.
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
-
+import hashlib
 from collections import OrderedDict
+from string import Formatter
 
 from branca.element import CssLink, Element, Figure, Html, JavascriptLink, MacroElement  # noqa
 
-from folium.utilities import _validate_coordinates, get_bounds
+from folium.utilities import (Template, _locations_tolist,
+                              _validate_coordinates, get_bounds, json_dumps,
+                              json_literal)
 
-from jinja2 import Template
+from markupsafe import escape as _escape
 
 from six import binary_type, text_type
 
@@ -165,6 +167,17 @@ class Icon(MacroElement):
     https://github.com/lvoogdt/Leaflet.awesome-markers
 
     """
+    # Template sources are compiled on first render, not on import.
+    _definition = u"""
+        L.AwesomeMarkers.icon({
+            icon: '{{this.icon}}',
+            iconColor: '{{this.icon_color}}',
+            markerColor: '{{this.color}}',
+            prefix: '{{this.prefix}}',
+            extraClasses: 'fa-rotate-{{this.angle}}'
+            })
+        """
+
     def __init__(self, color='blue', icon_color='white', icon='info-sign',
                  angle=0, prefix='glyphicon'):
         super(Icon, self).__init__()
@@ -177,18 +190,22 @@ class Icon(MacroElement):
 
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
-
-                var {{this.get_name()}} = L.AwesomeMarkers.icon({
-                    icon: '{{this.icon}}',
-                    iconColor: '{{this.icon_color}}',
-                    markerColor: '{{this.color}}',
-                    prefix: '{{this.prefix}}',
-                    extraClasses: 'fa-rotate-{{this.angle}}'
-                    });
+                var {{this.get_name()}} = {{this._shared_name}};
                 {{this._parent.get_name()}}.setIcon({{this.get_name()}});
             {% endmacro %}
             """)
 
+    def render(self, **kwargs):
+        """Renders the HTML representation of the element."""
+        figure = self.get_root()
+        assert isinstance(figure, Figure), ('You cannot render this Element '
+                                            'if it is not in a Figure.')
+
+        # Identical icons share a single definition.
+        self._shared_name = get_shared_definitions(figure).add(
+            'icon', Template(self._definition).render(this=self).strip())
+        super(Icon, self).render(**kwargs)
+
 
 class Marker(MacroElement):
     """
@@ -260,26 +277,42 @@ class Popup(Element):
         True if the popup is a template that needs to the rendered first.
     max_width: int, default 300
         The maximal width of the popup.
+    lazy: bool, default False
+        If True, the popup content is stored once in a figure-wide
+        `PopupStore` and only turned into DOM when the popup opens.
+        Popups with the same content share a single entry.
+    fields: dict, default None
+        With `lazy=True`, makes `html` a template shared by popups, like
+        '<b>{name}</b>: {value}', filled with the values of `fields`.
+        The template is stored once, and each popup only its values.
+    """
+    _lazy_template = u"""
+        {{this._parent.get_name()}}.bindPopup(function() {
+            return {{store.get_name()}}.get({{index}});
+            }, {maxWidth: '{{this.max_width}}'});
     """
-    def __init__(self, html=None, parse_html=False, max_width=300):
+
+    def __init__(self, html=None, parse_html=False, max_width=300,
+                 lazy=False, fields=None):
         super(Popup, self).__init__()
         self._name = 'Popup'
-        self.header = Element()
-        self.html = Element()
-        self.script = Element()
-
-        self.header._parent = self
-        self.html._parent = self
-        self.script._parent = self
-
-        script = not parse_html
-
-        if isinstance(html, Element):
-            self.html.add_child(html)
-        elif isinstance(html, text_type) or isinstance(html, binary_type):
-            self.html.add_child(Html(text_type(html), script=script))
-
         self.max_width = max_width
+        self.lazy = lazy
+        self.parse_html = parse_html
+        self.fields = fields
+        if fields is not None and not lazy:
+            raise ValueError('Popup fields require lazy=True.')
+
+        if lazy and not isinstance(html, Element):
+            # The content is kept as text, without the sub-elements
+            # which are only created if something is added to them.
+            self._content = u'' if html is None else text_type(html)
+        else:
+            self._content = None
+            if isinstance(html, Element):
+                self.html.add_child(html)
+            elif isinstance(html, text_type) or isinstance(html, binary_type):
+                self.html.add_child(Html(text_type(html), script=not parse_html))
 
         self._template = Template(u"""
             var {{this.get_name()}} = L.popup({maxWidth: '{{this.max_width}}'});
@@ -296,6 +329,15 @@ class Popup(Element):
             {% endfor %}
         """)  # noqa
 
+    def __getattr__(self, name):
+        if name in ('header', 'html', 'script'):
+            for key in ('header', 'html', 'script'):
+                element = Element()
+                element._parent = self
+                self.__dict__[key] = element
+            return self.__dict__[name]
+        raise AttributeError(name)
+
     def render(self, **kwargs):
         """Renders the HTML representation of the element."""
         for name, child in self._children.items():
@@ -305,11 +347,148 @@ class Popup(Element):
         assert isinstance(figure, Figure), ('You cannot render this Element '
                                             'if it is not in a Figure.')
 
+        if self.lazy and not ('script' in self.__dict__ and self.script._children):
+            store = figure.script._children.get('popup_store')
+            if store is None:
+                store = PopupStore()
+                figure.script.add_child(store, name='popup_store')
+            html = self._content or u''
+            if self.parse_html and self.fields is None:
+                html = text_type(_escape(html))
+            if 'html' in self.__dict__:
+                html += u''.join(element.render(**kwargs) for element in
+                                 self.html._children.values())
+            if self.fields is not None:
+                index = store.add_fields(html, self.fields, escape=self.parse_html)
+            else:
+                index = store.add(html)
+            figure.script.add_child(Element(
+                Template(self._lazy_template).render(
+                    this=self, store=store, index=index)),
+                name=self.get_name())
+            return
+
+        if self._content is not None:
+            # A lazy popup that has script children is rendered eagerly.
+            content = self._content
+            if self.fields is not None:
+                content = content.format(**self.fields)
+            self.html.add_child(Html(content, script=not self.parse_html))
+            self._content = None
         figure.script.add_child(Element(
             self._template.render(this=self, kwargs=kwargs)),
             name=self.get_name())
 
 
+class PopupStore(Element):
+    """
+    Figure-wide table of popup contents, used by lazy `Popup`s.
+
+    Each distinct content is serialized once in a JavaScript array
+    and popups only hold its index, so that no DOM is built until
+    a popup is opened.  Templated contents are stored as the index of
+    their template, split in literal parts, and the values of their
+    fields.
+
+    """
+    def __init__(self):
+        super(PopupStore, self).__init__()
+        self._name = 'PopupStore'
+        self.contents = []
+        self.templates = []
+        self._index = {}
+        self._template_index = {}
+
+        self._template = Template(u"""
+            var {{this.get_name()}} = {{this.to_json()}};
+            {{this.get_name()}}.get = function(i) {
+                var content = this.contents[i];
+                if (typeof content === 'string') {
+                    return content;
+                }
+                var parts = this.templates[content[0]], html = parts[0];
+                for (var k = 1; k < parts.length; k++) {
+                    html += content[1][k - 1] + parts[k];
+                }
+                return html;
+            };
+        """)
+
+    def _store(self, key, content):
+        if key not in self._index:
+            self._index[key] = len(self.contents)
+            self.contents.append(content)
+        return self._index[key]
+
+    def add(self, html):
+        """Stores `html` if needed and returns its index in the table."""
+        html = text_type(html)
+        return self._store(html, html)
+
+    def add_fields(self, template, fields, escape=False):
+        """
+        Stores the `template` formatted with `fields`, like
+        `template.format(**fields)`, as the index of the template and the
+        values of its fields, and returns its index in the table.
+        With `escape`, the values are escaped as HTML.
+
+        """
+        if template not in self._template_index:
+            parts, names = [], []
+            for literal, name, spec, conversion in Formatter().parse(template):
+                parts.append(literal)
+                if name is not None:
+                    names.append((name, spec, conversion))
+            if len(parts) == len(names):
+                parts.append(u'')
+            self._template_index[template] = len(self.templates), names
+            self.templates.append(parts)
+        index, names = self._template_index[template]
+        formatter = Formatter()
+        values = []
+        for name, spec, conversion in names:
+            try:
+                value = formatter.get_field(name, (), fields)[0]
+            except (KeyError, IndexError, AttributeError):
+                raise ValueError('Missing popup field {!r}.'.format(name))
+            value = formatter.format_field(
+                formatter.convert_field(value, conversion), spec)
+            values.append(text_type(_escape(value)) if escape else value)
+        return self._store((index, tuple(values)), [index, values])
+
+    def to_json(self):
+        """Returns the table as a JSON object safe to embed in a script."""
+        return json_literal(json_dumps({'templates': self.templates,
+                                        'contents': self.contents}).replace('</', '<\\/'))
+
+
+class JsonScript(Element):
+    """
+    JSON data embedded in the body of a Figure, in a
+    `<script type="application/json">` block that the browser does not
+    evaluate.  Scripts parse it only when they need it, with
+    `JSON.parse(document.getElementById(id).textContent)`.
+
+    Parameters
+    ----------
+    data: JSON-serializable object or str
+        The data to embed.
+    serialized: bool, default False
+        Whether `data` is already JSON text, embedded as-is.
+
+    """
+    def __init__(self, data, serialized=False):
+        super(JsonScript, self).__init__()
+        self._name = 'JsonScript'
+        if not serialized:
+            data = json_dumps(data)
+        self.data = data.replace('</', '<\\/')
+
+        self._template = Template(
+            u'<script type="application/json" id="{{this.get_name()}}">'
+            u'{{this.data}}</script>')
+
+
 class FitBounds(MacroElement):
     """Fit the map to contain a bounding box with the
     maximum zoom level possible.
@@ -334,16 +513,15 @@ class FitBounds(MacroElement):
                  padding_bottom_right=None, padding=None, max_zoom=None):
         super(FitBounds, self).__init__()
         self._name = 'FitBounds'
-        self.bounds = json.loads(json.dumps(bounds))
+        self.bounds = _locations_tolist(bounds) if bounds is not None else None
         options = {
             'maxZoom': max_zoom,
             'paddingTopLeft': padding_top_left,
             'paddingBottomRight': padding_bottom_right,
             'padding': padding,
         }
-        self.fit_bounds_options = json.dumps({key: val for key, val in
-                                              options.items() if val},
-                                             sort_keys=True)
+        self.fit_bounds_options = {key: val for key, val in
+                                   options.items() if val}
 
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
@@ -352,8 +530,162 @@ class FitBounds(MacroElement):
                 {% endif %}
 
                 {{this._parent.get_name()}}.fitBounds(
-                    {% if this.bounds %}{{ this.bounds }}{% else %}"autobounds"{% endif %},
-                    {{ this.fit_bounds_options }}
+                    {% if this.bounds %}{{ this.bounds|tojson }}{% else %}"autobounds"{% endif %},
+                    {{ this.fit_bounds_options|tojson }}
                     );
             {% endmacro %}
             """)  # noqa
+
+
+class SharedDefinitions(Element):
+    """
+    Figure-wide registry of JavaScript values shared by several elements,
+    such as icons or embedded images.
+
+    Values are keyed by a hash of their code, so that identical
+    definitions are only emitted once, as a variable that all the
+    elements using it refer to.
+
+    """
+    def __init__(self):
+        super(SharedDefinitions, self).__init__()
+        self._name = 'SharedDefinitions'
+        self.definitions = OrderedDict()
+
+        self._template = Template(u"""
+            {% for name, code in this.definitions.items() %}
+            var {{name}} = {{code}};
+            {% endfor %}
+        """)
+
+    def add(self, prefix, code):
+        """Registers the JavaScript `code` and returns the variable name
+        under which it will be available.
+        """
+        digest = hashlib.sha1(code.encode('utf8')).hexdigest()[:16]
+        name = '{}_{}'.format(prefix, digest)
+        self.definitions.setdefault(name, code)
+        return name
+
+
+def get_shared_definitions(figure):
+    """
+    Returns the `SharedDefinitions` of a Figure, creating it if needed
+    at the beginning of the figure's script.
+
+    """
+    definitions = figure.script._children.get('shared_definitions')
+    if definitions is None:
+        definitions = SharedDefinitions()
+        figure.script.add_child(definitions, name='shared_definitions',
+                                index=0)
+    return definitions
+
+
+_typed_array_decoder = u"""
+<script>
+    function foliumDecodeTypedArray(encoded) {
+        // Decodes arrays encoded by folium.utilities.encode_typed_array
+        // into an array of rows.
+        var binary = atob(encoded.data);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        var values = encoded.dtype === 'int32' ?
+            new Int32Array(bytes.buffer) : new Float32Array(bytes.buffer);
+        var columns = encoded.columns;
+        var rows = new Array(values.length / columns);
+        for (var i = 0; i < rows.length; i++) {
+            var row = new Array(columns);
+            for (var j = 0; j < columns; j++) {
+                row[j] = values[i * columns + j] / encoded.scale;
+            }
+            rows[i] = row;
+        }
+        return rows;
+    }
+</script>
+"""
+
+
+def add_typed_array_decoder(figure):
+    """
+    Adds to the header of a Figure, once, the `foliumDecodeTypedArray`
+    function decoding the arrays of `utilities.encode_typed_array`.
+
+    """
+    figure.header.add_child(Element(_typed_array_decoder),
+                            name='typed_array_decoder')
+
+
+_polyline_decoder = u"""
+<script>
+    function foliumDecodePolyline(encoded, precision) {
+        // Decodes lines encoded by folium.utilities.encode_polyline,
+        // or nested arrays of them.
+        if (typeof encoded !== 'string') {
+            return encoded.map(function(line) {
+                return foliumDecodePolyline(line, precision);
+            });
+        }
+        var factor = Math.pow(10, precision);
+        var points = [];
+        var index = 0, lat = 0, lng = 0;
+        while (index < encoded.length) {
+            var deltas = [0, 0];
+            for (var k = 0; k < 2; k++) {
+                var shift = 0, result = 0, chunk;
+                do {
+                    chunk = encoded.charCodeAt(index++) - 63;
+                    result += (chunk & 0x1f) * Math.pow(2, shift);
+                    shift += 5;
+                } while (chunk >= 0x20);
+                deltas[k] = result % 2 ? -(result + 1) / 2 : result / 2;
+            }
+            lat += deltas[0];
+            lng += deltas[1];
+            points.push([lat / factor, lng / factor]);
+        }
+        return points;
+    }
+</script>
+"""
+
+
+def add_polyline_decoder(figure):
+    """
+    Adds to the header of a Figure, once, the `foliumDecodePolyline`
+    function decoding the lines of `utilities.encode_polyline`.
+
+    """
+    figure.header.add_child(Element(_polyline_decoder),
+                            name='polyline_decoder')
+
+
+_inflate_decoder = u"""
+<script>
+    function foliumInflate(encoded) {
+        // Inflates the payloads of folium.utilities.compress_payload
+        // into a Promise of the parsed JSON.
+        var binary = atob(encoded);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        var stream = new Blob([bytes]).stream().pipeThrough(
+            new DecompressionStream('deflate'));
+        return new Response(stream).json();
+    }
+</script>
+"""
+
+
+def add_inflate_decoder(figure):
+    """
+    Adds to the header of a Figure, once, the `foliumInflate` function
+    inflating the payloads of `utilities.compress_payload`.
+
+    """
+    figure.header.add_child(Element(_inflate_decoder),
+                            name='inflate_decoder')
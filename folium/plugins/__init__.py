@@ -10,20 +10,42 @@ Wrap some of the most populat leaflet external plugins.
 
 from __future__ import (absolute_import, division, print_function)
 
-from folium.plugins.boat_marker import BoatMarker
-from folium.plugins.draw import Draw
-from folium.plugins.fast_marker_cluster import FastMarkerCluster
-from folium.plugins.float_image import FloatImage
-from folium.plugins.fullscreen import Fullscreen
-from folium.plugins.heat_map import HeatMap
-from folium.plugins.heat_map_withtime import HeatMapWithTime
-from folium.plugins.marker_cluster import MarkerCluster
-from folium.plugins.measure_control import MeasureControl
-from folium.plugins.polyline_text_path import PolyLineTextPath
-from folium.plugins.scroll_zoom_toggler import ScrollZoomToggler
-from folium.plugins.terminator import Terminator
-from folium.plugins.timestamped_geo_json import TimestampedGeoJson
-from folium.plugins.timestamped_wmstilelayer import TimestampedWmsTileLayers
+import sys
+
+from folium import _import_lazy
+
+# Plugin name: module it is imported from, imported on first access.
+_LAZY_ATTRIBUTES = {
+    'BoatMarker': 'folium.plugins.boat_marker',
+    'Draw': 'folium.plugins.draw',
+    'FastMarkerCluster': 'folium.plugins.fast_marker_cluster',
+    'FloatImage': 'folium.plugins.float_image',
+    'Fullscreen': 'folium.plugins.fullscreen',
+    'HeatMap': 'folium.plugins.heat_map',
+    'HeatMapWithTime': 'folium.plugins.heat_map_withtime',
+    'MarkerCluster': 'folium.plugins.marker_cluster',
+    'MeasureControl': 'folium.plugins.measure_control',
+    'PolyLineTextPath': 'folium.plugins.polyline_text_path',
+    'PrecomputedMarkerCluster': 'folium.plugins.precomputed_marker_cluster',
+    'ScrollZoomToggler': 'folium.plugins.scroll_zoom_toggler',
+    'Terminator': 'folium.plugins.terminator',
+    'TimestampedGeoJson': 'folium.plugins.timestamped_geo_json',
+    'TimestampedWmsTileLayers': 'folium.plugins.timestamped_wmstilelayer',
+}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        return _import_lazy(globals(), name, _LAZY_ATTRIBUTES,
+                            [module.rsplit('.', 1)[1]
+                             for module in _LAZY_ATTRIBUTES.values()])
+
+    def __dir__():
+        return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+else:
+    # Module level __getattr__ is not supported, import everything.
+    for _name in _LAZY_ATTRIBUTES:
+        _import_lazy(globals(), _name, _LAZY_ATTRIBUTES, ())
+    del _name
 
 __all__ = [
     'BoatMarker',
@@ -36,6 +58,7 @@ __all__ = [
     'MarkerCluster',
     'MeasureControl',
     'PolyLineTextPath',
+    'PrecomputedMarkerCluster',
     'ScrollZoomToggler',
     'Terminator',
     'TimestampedGeoJson',
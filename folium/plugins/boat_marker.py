@@ -2,14 +2,10 @@
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
-
 from branca.element import Figure, JavascriptLink
 
 from folium.map import Marker
-from folium.utilities import _validate_location
-
-from jinja2 import Template
+from folium.utilities import Template, _validate_location, json_dumps
 
 
 class BoatMarker(Marker):
@@ -45,7 +41,7 @@ class BoatMarker(Marker):
         self.heading = heading
         self.wind_heading = wind_heading
         self.wind_speed = wind_speed
-        self.kwargs = json.dumps(kwargs)
+        self.kwargs = json_dumps(kwargs)
 
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
@@ -2,10 +2,21 @@
 
 from __future__ import (absolute_import, division, print_function)
 
+from folium.map import add_typed_array_decoder
 from folium.plugins.marker_cluster import MarkerCluster
-from folium.utilities import _validate_coordinates
+from folium.utilities import Template, _validate_coordinates, encode_typed_array, json_dumps
 
-from jinja2 import Template
+
+_default_callback = ('var callback;\n' +
+                     'callback = function (row) {\n' +
+                     '\tvar icon, marker;\n' +
+                     '\t// Returns a L.marker object\n' +
+                     '\ticon = L.AwesomeMarkers.icon();\n' +
+                     '\tmarker = L.marker(new L.LatLng(row[0], ' +
+                     'row[1]));\n' +
+                     '\tmarker.setIcon(icon);\n' +
+                     '\treturn marker;\n' +
+                     '};')
 
 
 class FastMarkerCluster(MarkerCluster):
@@ -30,24 +41,33 @@ class FastMarkerCluster(MarkerCluster):
         A string representation of a valid Javascript function
         that will be passed a lat, lon coordinate pair. See the
         FasterMarkerCluster for an example of a custom callback.
+    encoding: {None, 'float32', 'int32'}, default None
+        By default the points are embedded as JSON.  With 'float32' or
+        'int32' they are embedded as binary typed arrays, several times
+        smaller and faster to load, see `utilities.encode_typed_array`.
+        Requires NumPy.
+    precision: int, default 6
+        Number of decimals kept with the 'int32' encoding.
+    name : string, default None
+        The name of the Layer, as it will appear in LayerControls
+    overlay : bool, default True
+        Adds the layer as an optional overlay (True) or the base layer (False).
+    control : bool, default True
+        Whether the Layer will be included in LayerControls
 
     """
-    def __init__(self, data, callback=None):
-        super(FastMarkerCluster, self).__init__([])
+    def __init__(self, data, callback=None, encoding=None, precision=6,
+                 name=None, overlay=True, control=True):
+        super(FastMarkerCluster, self).__init__([], name=name, overlay=overlay,
+                                                control=control)
         self._name = 'FastMarkerCluster'
         self._data = _validate_coordinates(data)
+        self._encoded = (json_dumps(encode_typed_array(
+            self._data, dtype=encoding, precision=precision))
+            if encoding is not None else None)
 
         if callback is None:
-            self._callback = ('var callback;\n' +
-                              'callback = function (row) {\n' +
-                              '\tvar icon, marker;\n' +
-                              '\t// Returns a L.marker object\n' +
-                              '\ticon = L.AwesomeMarkers.icon();\n' +
-                              '\tmarker = L.marker(new L.LatLng(row[0], ' +
-                              'row[1]));\n' +
-                              '\tmarker.setIcon(icon);\n' +
-                              '\treturn marker;\n' +
-                              '};')
+            self._callback = _default_callback
         else:
             self._callback = 'var callback = {};'.format(callback)
 
@@ -56,7 +76,7 @@ class FastMarkerCluster(MarkerCluster):
             {{this._callback}}
 
             (function(){
-                var data = {{this._data}};
+                var data = {% if this._encoded %}foliumDecodeTypedArray({{ this._encoded }}){% else %}{{ this._data|tojson|json_literal }}{% endif %};
                 var map = {{this._parent.get_name()}};
                 var cluster = L.markerClusterGroup();
 
@@ -68,4 +88,9 @@ class FastMarkerCluster(MarkerCluster):
 
                 cluster.addTo(map);
             })();
-            {% endmacro %}""")
+            {% endmacro %}""")  # noqa
+
+    def render(self, **kwargs):
+        super(FastMarkerCluster, self).render(**kwargs)
+        if self._encoded is not None:
+            add_typed_array_decoder(self.get_root())
@@ -2,15 +2,62 @@
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
+import math
 
 from branca.element import Figure, JavascriptLink
 from branca.utilities import none_max, none_min
 
+from folium.map import add_inflate_decoder, add_typed_array_decoder
 from folium.raster_layers import TileLayer
-from folium.utilities import _isnan
+from folium.utilities import Template, _isnan, compress_payload, encode_typed_array, json_dumps, np  # noqa
 
-from jinja2 import Template
+
+def _aggregate_points(data, zoom, cell_size):
+    """
+    Snaps [lat, lng, weight] points to a grid of `cell_size` pixels of the
+    Web Mercator projection at `zoom`, like Leaflet.heat does when drawing.
+    Returns an array with one [lat, lng, weight] point per occupied cell,
+    at the weighted centroid of its points and with the sum of weights.
+
+    """
+    if np is None:
+        raise ImportError('The NumPy package is required '
+                          ' for this functionality')
+    data = np.asarray(data, dtype=float).reshape(len(data), -1)
+    lat, lng = data[:, 0], data[:, 1]
+    weights = data[:, 2] if data.shape[1] > 2 else np.ones(len(data))
+    size = 256. * 2 ** zoom / cell_size
+    x = (lng + 180.) / 360. * size
+    sin = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = (0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)) * size
+    cells = (np.floor(y).astype(np.int64) * (int(size) + 1) +
+             np.floor(x).astype(np.int64))
+    cells, inverse = np.unique(cells, return_inverse=True)
+    inverse = inverse.ravel()
+
+    total = np.bincount(inverse, weights=weights, minlength=len(cells))
+    count = np.bincount(inverse, minlength=len(cells))
+    # Cells of null weights are placed at the mean of their points.
+    positive = total > 0
+    divisor = np.where(positive, total, count)
+    factors = np.where(positive[inverse], weights, 1.)
+    out = np.empty((len(cells), 3))
+    out[:, 0] = np.bincount(inverse, weights=lat * factors) / divisor
+    out[:, 1] = np.bincount(inverse, weights=lng * factors) / divisor
+    out[:, 2] = total
+    return out
+
+
+def _level_zooms(zooms):
+    """
+    Returns, for each map zoom from 0 to the last of the sorted `zooms`,
+    the zoom of the level to show: the smallest one at least as large, as
+    a level is only faithful at its zoom and coarser.  Finer map zooms
+    show the last level.
+
+    """
+    return [next(level for level in zooms if level >= zoom)
+            for zoom in range(zooms[-1] + 1)]
 
 
 class HeatMap(TileLayer):
@@ -37,30 +84,80 @@ class HeatMap(TileLayer):
         Amount of blur
     gradient : dict, default None
         Color gradient config. e.g. {0.4: 'blue', 0.65: 'lime', 1: 'red'}
+    encoding : {None, 'float32', 'int32'}, default None
+        By default the points are embedded as JSON.  With 'float32' or
+        'int32' they are embedded as binary typed arrays, several times
+        smaller and faster to load, see `utilities.encode_typed_array`.
+        Requires NumPy.
+    precision : int, default 6
+        Number of decimals kept with the 'int32' encoding.
+    compress : bool or int, default False
+        Whether to embed the points deflated and base64 encoded, to be
+        inflated by the browser, see `utilities.compress_payload`.
+        If True, only data of more than 10 kB is compressed.
+    aggregate : int or list of int, default None
+        Zoom level, or list of zoom levels, at which to aggregate the
+        points before embedding them.  The points are snapped to a grid
+        of `radius / 4` pixels, and only the occupied cells are embedded,
+        with the sum of their weights.  This looks the same as the raw
+        heatmap at the given zooms and coarser, for a fraction of the size.
+        With several levels, the map shows the coarsest level not coarser
+        than its zoom, or the finest level beyond.  Requires NumPy.
 
     """
     def __init__(self, data, name=None, min_opacity=0.5, max_zoom=18,
-                 max_val=1.0, radius=25, blur=15, gradient=None, overlay=True):
+                 max_val=1.0, radius=25, blur=15, gradient=None, overlay=True,
+                 encoding=None, precision=6, compress=False, aggregate=None):
         super(TileLayer, self).__init__(name=name)
         if _isnan(data):
             raise ValueError('data cannot contain NaNs, '
                              'got:\n{!r}'.format(data))
         self._name = 'HeatMap'
         self.tile_name = name if name is not None else self.get_name()
-        self.data = [[x for x in line] for line in data]
+        if np is not None and isinstance(data, np.ndarray):
+            self.data = data
+        else:
+            self.data = [[x for x in line] for line in data]
         self.min_opacity = min_opacity
         self.max_zoom = max_zoom
         self.max_val = max_val
         self.radius = radius
         self.blur = blur
-        self.gradient = (json.dumps(gradient, sort_keys=True) if
+        self.gradient = (json_dumps(gradient, sort_keys=True) if
                          gradient is not None else 'null')
         self.overlay = overlay
+        self.encoding = encoding
+
+        self._levels = None
+        if aggregate is not None:
+            zooms = sorted(set([aggregate] if isinstance(aggregate, int)
+                               else aggregate))
+            levels = [_aggregate_points(self.data, zoom, radius / 4.)
+                      for zoom in zooms]
+            self.data = levels[-1]
+            if len(levels) > 1:
+                self._level_zooms = json_dumps(_level_zooms(zooms))
+                self._levels = json_dumps(dict(
+                    (str(zoom), encode_typed_array(level, dtype=encoding,
+                                                   precision=precision)
+                     if encoding is not None else level)
+                    for zoom, level in zip(zooms, levels)))
+
+        self._encoded = None
+        if encoding is not None and self._levels is None:
+            self._encoded = json_dumps(encode_typed_array(
+                self.data, dtype=encoding, precision=precision))
+        self._json = None
+        self._compressed = None
+        if compress:
+            self._compressed = compress_payload(
+                self._levels or self._encoded or json_dumps(self.data),
+                compress)
 
         self._template = Template(u"""
         {% macro script(this, kwargs) %}
             var {{this.get_name()}} = L.heatLayer(
-                {{this.data}},
+                {% if this._compressed or this._levels %}[]{% elif this._encoded %}foliumDecodeTypedArray({{ this._encoded }}){% elif this._json %}{{ this._json|json_literal }}{% else %}{{ this.data|tojson|json_literal }}{% endif %},
                 {
                     minOpacity: {{this.min_opacity}},
                     maxZoom: {{this.max_zoom}},
@@ -70,11 +167,55 @@ class HeatMap(TileLayer):
                     gradient: {{this.gradient}}
                     })
                 .addTo({{this._parent.get_name()}});
+        {% if this._levels %}
+            var {{this.get_name()}}_levels = null;
+            function {{this.get_name()}}_update() {
+                // Shows the coarsest level not coarser than the map's zoom.
+                var map = {{this.get_name()}}._map;
+                if (!map || {{this.get_name()}}_levels === null) { return; }
+                var zooms = {{ this._level_zooms }};
+                var best = zooms[Math.max(0, Math.min(Math.ceil(map.getZoom()), zooms.length - 1))];
+                var level = {{this.get_name()}}_levels[best];
+                if (!Array.isArray(level)) {
+                    level = {{this.get_name()}}_levels[best] = foliumDecodeTypedArray(level);
+                }
+                {{this.get_name()}}.setLatLngs(level);
+            }
+            {{this.get_name()}}.on('add', function(e) {
+                e.target._map.on('zoomend', {{this.get_name()}}_update);
+                {{this.get_name()}}_update();
+            });
+            {{this.get_name()}}.on('remove', function(e) {
+                e.target._map.off('zoomend', {{this.get_name()}}_update);
+            });
+            if ({{this.get_name()}}._map) {
+                {{this.get_name()}}._map.on('zoomend', {{this.get_name()}}_update);
+            }
+            {% if this._compressed %}
+            foliumInflate("{{ this._compressed }}").then(function(levels) {
+                {{this.get_name()}}_levels = levels;
+                {{this.get_name()}}_update();
+            });
+            {% else %}
+            {{this.get_name()}}_levels = {{ this._levels|json_literal }};
+            {{this.get_name()}}_update();
+            {% endif %}
+        {% elif this._compressed %}
+            foliumInflate("{{ this._compressed }}").then(function(data) {
+                {{this.get_name()}}.setLatLngs({% if this._encoded %}foliumDecodeTypedArray(data){% else %}data{% endif %});
+            });
+        {% endif %}
         {% endmacro %}
-        """)
+        """)  # noqa
+
+    def _prerender(self):
+        if self._compressed or self._levels or self._encoded:
+            return {}
+        return {'_json': json_dumps(self.data, sort_keys=True)}
 
     def render(self, **kwargs):
         super(TileLayer, self).render()
+        self._json = None
 
         figure = self.get_root()
         assert isinstance(figure, Figure), ('You cannot render this Element '
@@ -83,6 +224,10 @@ class HeatMap(TileLayer):
         figure.header.add_child(
             JavascriptLink('https://leaflet.github.io/Leaflet.heat/dist/leaflet-heat.js'),  # noqa
             name='leaflet-heat.js')
+        if self.encoding is not None:
+            add_typed_array_decoder(figure)
+        if self._compressed is not None:
+            add_inflate_decoder(figure)
 
     def _get_self_bounds(self):
         """
@@ -90,6 +235,9 @@ class HeatMap(TileLayer):
         in the form [[lat_min, lon_min], [lat_max, lon_max]].
 
         """
+        if np is not None and isinstance(self.data, np.ndarray):
+            points = self.data[:, :2]
+            return [points.min(axis=0).tolist(), points.max(axis=0).tolist()]
         bounds = [[None, None], [None, None]]
         for point in self.data:
             bounds = [
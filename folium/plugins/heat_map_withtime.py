@@ -3,9 +3,46 @@
 from branca.element import CssLink, Element, Figure, JavascriptLink
 from branca.utilities import none_max, none_min
 
+from folium.map import JsonScript
 from folium.raster_layers import TileLayer
+from folium.utilities import Template, json_dumps, np
 
-from jinja2 import Template
+
+def _index_frames(data):
+    """
+    Encodes the frames of a HeatMapWithTime as a table of the distinct
+    locations and, for each frame, the sorted indices of its locations in
+    the table and their weights.  Indices or weights identical to the
+    previous frame's are replaced by None.  Frames of points without
+    weights have an empty list of weights, and the default weight of the
+    layer in the browser.
+
+    """
+    if np is None:
+        raise ImportError('The NumPy package is required '
+                          ' for this functionality')
+    frames = []
+    for frame in data:
+        frame = np.asarray(frame, dtype=float)
+        frames.append(frame.reshape(0, 2) if frame.size == 0 else frame)
+    points = np.concatenate([frame[:, :2] for frame in frames] or
+                            [np.empty((0, 2))])
+    locations, inverse = np.unique(points, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    out = []
+    previous = (None, None)
+    start = 0
+    for frame in frames:
+        indices = inverse[start:start + len(frame)]
+        start += len(frame)
+        order = np.argsort(indices, kind='stable')
+        weights = frame[order, 2].tolist() if frame.shape[1] > 2 else []
+        indices = indices[order].tolist()
+        out.append([None if indices == previous[0] else indices,
+                    None if weights == previous[1] else weights])
+        previous = (indices, weights)
+    return {'locations': locations, 'frames': out}
 
 
 class HeatMapWithTime(TileLayer):
@@ -46,12 +83,22 @@ class HeatMapWithTime(TileLayer):
         Step between different fps speeds on the speed slider.
     position: default 'bottomleft'
         Position string for the time slider. Format: 'bottom/top'+'left/right'.
+    encoding: {None, 'indexed'}, default None
+        With 'indexed', the distinct locations are embedded once, and each frame
+        only as the indices of its locations and their weights, skipping those
+        identical to the previous frame.  This is much smaller when the same
+        locations repeat across frames.  Requires NumPy.
+    chunk_size: int, default None
+        If set, the frames are embedded by shards of `chunk_size` frames in JSON blocks
+        that are only parsed when the animation reaches them, the next shard being
+        prefetched and the shards away from the current time released.  This lets
+        long animations start without parsing all their frames.
 
     """
     def __init__(self, data, index=None, name=None, radius=15, min_opacity=0, max_opacity=0.6,
                  scale_radius=False, use_local_extrema=False, auto_play=False, display_index=True,
-                 index_steps=1, min_speed=0.1, max_speed=10, speed_step=0.1, position='bottomleft'
-                 ):
+                 index_steps=1, min_speed=0.1, max_speed=10, speed_step=0.1, position='bottomleft',
+                 encoding=None, chunk_size=None):
         super(TileLayer, self).__init__(name=name)
         self._name = 'HeatMap'
         self._control_name = self.get_name() + 'Control'
@@ -63,6 +110,29 @@ class HeatMapWithTime(TileLayer):
         if len(self.data) != len(self.index):
             raise ValueError('Input data and index are not of compatible lengths.')
         self.times = list(range(1, len(data)+1))
+        if encoding not in (None, 'indexed'):
+            raise ValueError("encoding must be None or 'indexed', got {!r}".format(encoding))
+        indexed = _index_frames(data) if encoding == 'indexed' else None
+        self._shards = None
+        if chunk_size is not None:
+            frames = self.data
+            if indexed is not None:
+                # Each shard starts with a complete frame.
+                frames = []
+                previous = [None, None]
+                for i, frame in enumerate(indexed['frames']):
+                    full = [value if value is not None else previous[j]
+                            for j, value in enumerate(frame)]
+                    frames.append(full if i % chunk_size == 0 else frame)
+                    previous = full
+            self._shards = [JsonScript(frames[i:i + chunk_size])
+                            for i in range(0, len(frames), chunk_size)]
+            payload = {'shards': [shard.get_name() for shard in self._shards],
+                       'shardSize': chunk_size}
+            if indexed is not None:
+                payload['locations'] = indexed['locations']
+            indexed = payload
+        self._indexed = json_dumps(indexed) if indexed is not None else None
 
         # Heatmap settings.
         self.radius = radius
@@ -124,7 +194,12 @@ class HeatMapWithTime(TileLayer):
                 })
                 .addTo({{this._parent.get_name()}});
 
-                var {{this.get_name()}} = new TDHeatmap({{this.data}},
+                var {{this.get_name()}} = new TDHeatmap(
+                {% if this._indexed %}
+                    {{ this._indexed|json_literal }},
+                {% else %}
+                    {{ this.data|tojson|json_literal }},
+                {% endif %}
                 {heatmapOptions: {
                         radius: {{this.radius}},
                         minOpacity: {{this.min_opacity}},
@@ -188,6 +263,10 @@ class HeatMapWithTime(TileLayer):
                     data: []
                     };
                 this.data= data;
+                this._shardCache = {};
+                if (data.frames) {
+                    this.frames = this._resolveFrames(data.frames);
+                }
                 this.defaultWeight = heatmapCfg.defaultWeight || 1;
             },
             onAdd: function(map) {
@@ -208,10 +287,67 @@ class HeatMapWithTime(TileLayer):
                 this._baseLayer.setData(this._currentTimeData);
                 return true;
             },
+            _resolveFrames: function(frames) {
+                // Indexed frames, null when identical to the previous frame.
+                var indices = null, weights = null;
+                return frames.map(function(frame) {
+                    indices = frame[0] || indices;
+                    weights = frame[1] || weights;
+                    return [indices, weights];
+                });
+            },
+            _getFrames: function(i) {
+                // Returns the frames holding frame i and the index of the first one.
+                var data = this.data;
+                if (!data.shards) {
+                    return [this.frames || data, 0];
+                }
+                var self = this, cache = this._shardCache;
+                var load = function(k) {
+                    if (!cache[k]) {
+                        var frames = JSON.parse(document.getElementById(data.shards[k]).textContent);
+                        cache[k] = data.locations ? self._resolveFrames(frames) : frames;
+                    }
+                    return cache[k];
+                };
+                var k = Math.floor(i / data.shardSize);
+                var frames = load(k);
+                this._currentShard = k;
+                // Keep the shards around the current one, and prefetch the next one.
+                for (var key in cache) {
+                    if (key < k - 1 || key > k + 1) {
+                        delete cache[key];
+                    }
+                }
+                if (k + 1 < data.shards.length) {
+                    setTimeout(function() {
+                        if (self._currentShard === k) {
+                            load(k + 1);
+                        }
+                    }, 0);
+                }
+                return [frames, k * data.shardSize];
+            },
+            _getFrame: function(i) {
+                var frames = this._getFrames(i);
+                var frame = frames[0][i - frames[1]];
+                if (!this.data.locations) {
+                    return frame;
+                }
+                var locations = this.data.locations;
+                var indices = frame[0], weights = frame[1];
+                var points = new Array(indices.length);
+                for (var j = 0; j < indices.length; j++) {
+                    var location = locations[indices[j]];
+                    points[j] = weights.length ? [location[0], location[1], weights[j]]
+                                               : [location[0], location[1]];
+                }
+                return points;
+            },
             _getDataForTime: function(time) {
                     delete this._currentTimeData.data;
                     this._currentTimeData.data = [];
-                    var data = this.data[time-1];
+                    var data = this._getFrame(time-1);
                     for (var i = 0; i < data.length; i++) {
                         this._currentTimeData.data.push({
                                 lat: data[i][0],
@@ -249,6 +385,10 @@ class HeatMapWithTime(TileLayer):
             )
         )
 
+        if self._shards is not None:
+            for shard in self._shards:
+                figure.html.add_child(shard, name=shard.get_name())
+
     def _get_self_bounds(self):
         """
         Computes the bounds of the object itself (not including it's children)
@@ -256,7 +396,7 @@ class HeatMapWithTime(TileLayer):
 
         """
         bounds = [[None, None], [None, None]]
-        for point in self.data:
+        for point in (point for frame in self.data for point in frame):
             bounds = [
                 [
                     none_min(bounds[0][0], point[0]),
@@ -5,8 +5,7 @@ from __future__ import (absolute_import, division, print_function)
 from branca.element import CssLink, Figure, JavascriptLink
 
 from folium.map import Icon, Layer, Marker, Popup
-
-from jinja2 import Template
+from folium.utilities import Template
 
 
 class MarkerCluster(Layer):
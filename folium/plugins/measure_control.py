@@ -2,11 +2,9 @@
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
-
 from branca.element import CssLink, Figure, JavascriptLink, MacroElement
 
-from jinja2 import Template
+from folium.utilities import Template, json_dumps
 
 
 class MeasureControl(MacroElement):
@@ -41,7 +39,7 @@ class MeasureControl(MacroElement):
             'primaryAreaUnit': primary_area_unit,
             'secondaryAreaUnit': secondary_area_unit,
         }
-        self.options = json.dumps(options)
+        self.options = json_dumps(options)
 
         self._template = Template("""
         {% macro script(this, kwargs) %}
@@ -5,8 +5,7 @@ from __future__ import (absolute_import, division, print_function)
 from branca.element import Figure, JavascriptLink
 
 from folium.features import MacroElement
-
-from jinja2 import Template
+from folium.utilities import Template
 
 
 class PolyLineTextPath(MacroElement):
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+
+from branca.element import Figure
+
+from folium.map import JsonScript
+from folium.plugins.fast_marker_cluster import FastMarkerCluster
+from folium.utilities import Template, json_dumps, np
+
+
+_SHARD_SIZE = 10000
+_LEAF_RATIO = 0.8
+
+
+def _lnglat_to_mercator(lat, lng):
+    """Projects latitudes and longitudes to Web Mercator in [0, 1]."""
+    x = (lng + 180.) / 360.
+    sin = np.sin(np.radians(lat))
+    with np.errstate(divide='ignore'):
+        y = 0.5 - 0.25 * np.log((1. + sin) / (1. - sin)) / np.pi
+    return x, np.clip(y, 0., 1.)
+
+
+def _mercator_to_lnglat(x, y):
+    """Inverse of `_lnglat_to_mercator`."""
+    lng = x * 360. - 180.
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1. - 2. * y))))
+    return lat, lng
+
+
+def _cluster_levels(locations, min_zoom=0, max_zoom=16, radius=60,
+                    extent=256):
+    """
+    Computes the clusters of `cluster_hierarchy`, with two extra columns:
+    the zoom at which each cluster splits into several clusters, or
+    `max_zoom + 1` if only its points do, and the index in `locations`
+    of one of its points, which is its only point for single points.
+
+    Returns a dict mapping each zoom level to a tuple of the Web Mercator
+    x and y of the clusters and of their array of shape (m, 5).
+
+    """
+    if np is None:
+        raise ImportError('The NumPy package is required '
+                          ' for this functionality')
+
+    locations = np.asarray(locations, dtype=float)
+    x, y = _lnglat_to_mercator(locations[:, 0], locations[:, 1])
+    counts = np.ones(len(x))
+    points = np.arange(len(x))
+    split = None
+
+    levels = {}
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        cell = radius / (extent * 2. ** zoom)
+        ncells = int(np.ceil(1. / cell)) + 1
+        keys = (np.floor(x / cell).astype(np.int64) * ncells +
+                np.floor(y / cell).astype(np.int64))
+        _, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        size = inverse.max() + 1 if len(inverse) else 0
+
+        weights = np.bincount(inverse, weights=counts, minlength=size)
+        x = np.bincount(inverse, weights=x * counts, minlength=size) / weights
+        y = np.bincount(inverse, weights=y * counts, minlength=size) / weights
+        counts = weights
+
+        # A cluster splits at the next zoom if it has several children
+        # there, otherwise where its only child splits.
+        children = np.bincount(inverse, minlength=size)
+        child = np.zeros(size, dtype=np.int64)
+        child[inverse] = np.arange(len(inverse))
+        points = points[child]
+        if split is None:
+            split = np.full(size, max_zoom + 1.)
+        else:
+            split = np.where(children > 1, zoom + 1., split[child])
+
+        lat, lng = _mercator_to_lnglat(x, y)
+        levels[zoom] = (x, y, np.column_stack([lat, lng, counts, split,
+                                               points]))
+    return levels
+
+
+def _tile_keys(x, y, zoom):
+    """Returns the index of the tiles of `zoom` containing `x`, `y`."""
+    size = 2 ** zoom
+    return (np.clip(np.floor(x * size), 0, size - 1).astype(np.int64) * size +
+            np.clip(np.floor(y * size), 0, size - 1).astype(np.int64))
+
+
+def _tile_groups(x, y, bucket_zoom, last=None):
+    """
+    Sorts the items of Web Mercator positions `x`, `y` by shard of about
+    `_SHARD_SIZE` items, of the tiles of a zoom not greater than
+    `bucket_zoom`, then by tile of `bucket_zoom`, with the items of
+    boolean array `last` last in their tile.
+
+    Returns the zoom of the shards, the sorting order, and for each tile,
+    in that order, its 'x:y' name, the one of its shard and the bounds
+    of its items in the sorted order.
+
+    """
+    for shard_zoom in range(bucket_zoom, -1, -1):
+        if (len(np.unique(_tile_keys(x, y, shard_zoom))) <=
+                max(1, len(x) // _SHARD_SIZE)):
+            break
+    size = 2 ** bucket_zoom
+    shift = 2 ** (bucket_zoom - shard_zoom)
+    buckets = _tile_keys(x, y, bucket_zoom)
+    bx, by = buckets // size, buckets % size
+    shard_keys = (bx // shift) * 2 ** shard_zoom + by // shift
+
+    if last is None:
+        last = np.zeros(len(x), dtype=bool)
+    order = np.lexsort((last, buckets, shard_keys))
+    buckets = buckets[order]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    starts = starts[:len(buckets)]
+    ends = np.r_[starts[1:], len(buckets)]
+    firsts = order[starts]
+
+    tiles = []
+    for start, end, tile_x, tile_y, shard_x, shard_y in zip(
+            starts.tolist(), ends.tolist(),
+            bx[firsts].tolist(), by[firsts].tolist(),
+            (bx[firsts] // shift).tolist(), (by[firsts] // shift).tolist()):
+        tiles.append(('{}:{}'.format(tile_x, tile_y),
+                      '{}:{}'.format(shard_x, shard_y), start, end))
+    return shard_zoom, order, tiles
+
+
+def cluster_hierarchy(locations, min_zoom=0, max_zoom=16, radius=60,
+                      extent=256):
+    """
+    Computes a hierarchy of point clusters, one level per zoom.
+
+    At each zoom level the points are snapped to a grid of `radius` pixels
+    in Web Mercator and each occupied cell becomes a cluster located at the
+    centroid of its points.  Levels are computed from `max_zoom` down to
+    `min_zoom`, each one from the clusters of the level below, so that
+    every cluster is the union of clusters of the next zoom level.
+
+    Parameters
+    ----------
+    locations: array-like of shape (n, 2)
+        Points of the form [lat, lng].
+    min_zoom: int, default 0
+        Lowest zoom level for which clusters are computed.
+    max_zoom: int, default 16
+        Highest zoom level for which clusters are computed.
+    radius: int, default 60
+        Cluster radius, in pixels.
+    extent: int, default 256
+        Size of a tile, in pixels.
+
+    Returns
+    -------
+    A dict mapping each zoom level to an array of shape (m, 3) whose rows
+    are of the form [lat, lng, count].
+
+    """
+    levels = _cluster_levels(locations, min_zoom=min_zoom,
+                             max_zoom=max_zoom, radius=radius, extent=extent)
+    return {zoom: level[:, :3] for zoom, (_, _, level) in levels.items()}
+
+
+class PrecomputedMarkerCluster(FastMarkerCluster):
+    """
+    Add marker clusters to a map, with the clustering hierarchy
+    computed in Python instead of in the browser.
+
+    The clusters of each zoom level from `min_zoom` are precomputed with
+    `cluster_hierarchy`, and the page only draws the clusters of the
+    current zoom level in view.  Past `max_zoom`, or past the first level
+    with about as many clusters as points, the individual markers in view
+    are drawn instead, and the clusters refer to their single points by
+    index into these markers, so that each point is embedded once.  The
+    clusters and markers are stored by groups of map tiles in JSON blocks
+    of the page, only parsed when a tile they cover is first shown, which
+    keeps page load fast with millions of points.  Clicking a cluster
+    zooms in to the level where it splits.
+
+    Parameters
+    ----------
+    data: list or array of shape (n, 2)
+        Data points of the form [[lat, lng]].
+    callback: string, default None
+        A string representation of a valid Javascript function
+        that will be passed a lat, lon coordinate pair and shall return
+        the marker of a single point. See FastMarkerCluster.
+    min_zoom: int, default 0
+        Clusters of this zoom level are shown when zoomed out further.
+    max_zoom: int, default 16
+        Individual markers are shown when zoomed in past this level.
+    radius: int, default 60
+        Cluster radius, in pixels.
+    name : string, default None
+        The name of the Layer, as it will appear in LayerControls
+    overlay : bool, default True
+        Adds the layer as an optional overlay (True) or the base layer (False).
+    control : bool, default True
+        Whether the Layer will be included in LayerControls
+
+    """
+    def __init__(self, data, callback=None, min_zoom=0, max_zoom=16,
+                 radius=60, name=None, overlay=True, control=True):
+        super(PrecomputedMarkerCluster, self).__init__(
+            [], callback=callback, name=name, overlay=overlay,
+            control=control)
+        self._name = 'PrecomputedMarkerCluster'
+
+        if np is None:
+            raise ImportError('The NumPy package is required '
+                              ' for this functionality')
+        locations = np.asarray(data, dtype=float)[:, :2]
+        if np.isnan(locations).any():
+            raise ValueError('Location values cannot contain NaNs.')
+        self._data = locations
+
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.radius = radius
+
+        # Past the first level with about as many clusters as points,
+        # the individual markers are shown.
+        levels = _cluster_levels(locations, min_zoom=min_zoom,
+                                 max_zoom=max_zoom, radius=radius)
+        leaf_zoom = next((zoom for zoom in range(min_zoom, max_zoom + 1)
+                          if len(levels[zoom][2]) >=
+                          _LEAF_RATIO * len(locations)), max_zoom + 1)
+
+        # The clusters are grouped by tiles 8 times as large as those of
+        # their zoom, so that a few groups cover the map.
+        self._shards = []
+        x, y = _lnglat_to_mercator(locations[:, 0], locations[:, 1])
+        bucket_zoom = max(leaf_zoom - 3, 0)
+        shard_zoom, order, tiles = _tile_groups(x, y, bucket_zoom)
+        # The individual markers, by shard in the sorted order, to which
+        # the single points of the clusters refer by index.
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        leaves = np.round(locations[order], 6).tolist()
+        names, points = {}, []
+        for i, (tile, shard, start, end) in enumerate(tiles):
+            if i == 0 or tiles[i - 1][1] != shard:
+                offset = start
+                groups = {'points': None, 'tiles': {}}
+            groups['tiles'][tile] = [start - offset, end - offset]
+            if i + 1 == len(tiles) or tiles[i + 1][1] != shard:
+                groups['points'] = leaves[offset:end]
+                names[shard] = self._add_shard(groups)
+                points.append([offset, names[shard]])
+        index = {str(leaf_zoom): {'bucketZoom': bucket_zoom,
+                                  'shardZoom': shard_zoom, 'shards': names}}
+
+        for zoom in range(min_zoom, leaf_zoom):
+            x, y, rows = levels[zoom]
+            bucket_zoom = max(zoom - 3, 0)
+            single = rows[:, 2] == 1
+            shard_zoom, order, tiles = _tile_groups(x, y, bucket_zoom,
+                                                    last=single)
+            single = single[order]
+            clusters = [[lat, lng, count, split] for (lat, lng), count, split
+                        in zip(np.round(rows[order, :2], 6).tolist(),
+                               rows[order, 2].astype(int).tolist(),
+                               np.minimum(rows[order, 3], leaf_zoom)
+                               .astype(int).tolist())]
+            indices = rank[rows[order, 4].astype(np.int64)].tolist()
+            # Clusters come before single points in each tile.
+            mids = np.r_[0, np.cumsum(~single)]
+            names, groups = {}, {}
+            for i, (tile, shard, start, end) in enumerate(tiles):
+                mid = start + mids[end] - mids[start]
+                groups[tile] = [clusters[start:mid], indices[mid:end]]
+                if i + 1 == len(tiles) or tiles[i + 1][1] != shard:
+                    names[shard] = self._add_shard(groups)
+                    groups = {}
+            index[str(zoom)] = {'bucketZoom': bucket_zoom,
+                                'shardZoom': shard_zoom, 'shards': names}
+        self._index = json_dumps({'leafZoom': leaf_zoom, 'levels': index,
+                                  'points': points}, sort_keys=True)
+
+        self._template = Template(u"""
+            {% macro script(this, kwargs) %}
+            var {{this.get_name()}} = (function(){
+                {{this._callback}}
+
+                // For each zoom up to leafZoom, the ids of the JSON blocks
+                // of the clusters by shard, each grouping them by tile of
+                // bucketZoom as [rows of [lat, lng, count, splitZoom],
+                // indices of single points].  The blocks of leafZoom hold
+                // the points, and their tiles as [start, end] of them, and
+                // `points` lists the index of the first point of each one.
+                var index = {{ this._index|json_literal }};
+                var shards = {};
+                var minZoom = {{this.min_zoom}};
+                var layer = L.layerGroup();
+
+                function clusterIcon(count) {
+                    var size = count < 10 ? 'small' : count < 100 ? 'medium' : 'large';
+                    return L.divIcon({
+                        html: '<div><span>' + count + '</span></div>',
+                        className: 'marker-cluster marker-cluster-' + size,
+                        iconSize: new L.Point(40, 40)
+                        });
+                }
+
+                function visibleTiles(map, bounds, zoom) {
+                    // Returns the [x, y] of the tiles of `zoom` in bounds.
+                    var last = Math.pow(2, zoom) - 1;
+                    var nw = map.project(bounds.getNorthWest(), zoom).divideBy(256).floor();
+                    var se = map.project(bounds.getSouthEast(), zoom).divideBy(256).floor();
+                    var tiles = [];
+                    for (var x = Math.max(nw.x, 0); x <= Math.min(se.x, last); x++) {
+                        for (var y = Math.max(nw.y, 0); y <= Math.min(se.y, last); y++) {
+                            tiles.push([x, y]);
+                        }
+                    }
+                    return tiles;
+                }
+
+                function parse(id) {
+                    // Parses the JSON block `id` once.
+                    if (!(id in shards)) {
+                        shards[id] = JSON.parse(document.getElementById(id).textContent);
+                    }
+                    return shards[id];
+                }
+
+                function point(i) {
+                    // Returns the [lat, lng] of the point of index `i`.
+                    var lo = 0, hi = index.points.length - 1;
+                    while (lo < hi) {
+                        var mid = Math.ceil((lo + hi) / 2);
+                        if (index.points[mid][0] <= i) { lo = mid; } else { hi = mid - 1; }
+                    }
+                    return parse(index.points[lo][1]).points[i - index.points[lo][0]];
+                }
+
+                function group(zoom, x, y) {
+                    // Returns the clusters and the points of a tile of the
+                    // bucketZoom of a level.
+                    var level = index.levels[zoom];
+                    var shift = Math.pow(2, level.bucketZoom - level.shardZoom);
+                    var id = level.shards[Math.floor(x / shift) + ':' + Math.floor(y / shift)];
+                    var key = x + ':' + y;
+                    if (!id) { return [[], []]; }
+                    var shard = parse(id);
+                    if (zoom === index.leafZoom) {
+                        var tile = shard.tiles[key];
+                        return tile ? [[], shard.points.slice(tile[0], tile[1])] : [[], []];
+                    }
+                    return shard[key] ? [shard[key][0], shard[key][1].map(point)] : [[], []];
+                }
+
+                function update() {
+                    var map = layer._map;
+                    var zoom = Math.round(map.getZoom());
+                    var bounds = map.getBounds().pad(0.25);
+                    var levelZoom = Math.min(Math.max(zoom, minZoom), index.leafZoom);
+                    var bucketZoom = index.levels[levelZoom].bucketZoom;
+                    layer.clearLayers();
+                    visibleTiles(map, bounds, bucketZoom).forEach(function(tile) {
+                        var clusters = group(levelZoom, tile[0], tile[1]);
+                        clusters[1].forEach(function(row) {
+                            if (bounds.contains([row[0], row[1]])) {
+                                layer.addLayer(callback(row));
+                            }
+                        });
+                        clusters[0].forEach(function(row) {
+                            if (!bounds.contains([row[0], row[1]])) { return; }
+                            var cluster = L.marker([row[0], row[1]],
+                                                   {icon: clusterIcon(row[2])});
+                            cluster.on('click', function(e) {
+                                map.setView(e.latlng, Math.max(row[3], zoom + 1));
+                                });
+                            layer.addLayer(cluster);
+                        });
+                    });
+                }
+
+                layer.on('add', function() {
+                    layer._map.on('moveend', update);
+                    update();
+                    });
+                layer.on('remove', function() {
+                    layer._map.off('moveend', update);
+                    });
+                return layer;
+            })();
+            {{this.get_name()}}.addTo({{this._parent.get_name()}});
+            {% endmacro %}""")  # noqa
+
+    def _add_shard(self, data):
+        """Embeds `data` in a new JSON block and returns its id."""
+        shard = JsonScript(data)
+        self._shards.append(shard)
+        return shard.get_name()
+
+    def render(self, **kwargs):
+        super(PrecomputedMarkerCluster, self).render(**kwargs)
+
+        figure = self.get_root()
+        assert isinstance(figure, Figure), ('You cannot render this Element '
+                                            'if it is not in a Figure.')
+        for shard in self._shards:
+            figure.html.add_child(shard, name=shard.get_name())
+
+    def _get_self_bounds(self):
+        """
+        Computes the bounds of the object itself (not including it's children)
+        in the form [[lat_min, lon_min], [lat_max, lon_max]].
+
+        """
+        locations = np.asarray(self._data)
+        return [locations.min(axis=0).tolist(), locations.max(axis=0).tolist()]
@@ -4,7 +4,7 @@ from __future__ import (absolute_import, division, print_function)
 
 from branca.element import Figure, JavascriptLink, MacroElement
 
-from jinja2 import Template
+from folium.utilities import Template
 
 
 class Terminator(MacroElement):
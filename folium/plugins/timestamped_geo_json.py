@@ -2,12 +2,134 @@
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
+import datetime
+import re
 
-from branca.element import CssLink, Figure, JavascriptLink, MacroElement
+from branca.element import CssLink, Element, Figure, JavascriptLink, MacroElement
 from branca.utilities import iter_points, none_max, none_min
 
-from jinja2 import Template
+from folium.map import JsonScript
+from folium.utilities import Template, json_dumps, json_loads, np
+
+from six import string_types
+
+
+_ISO_8601 = re.compile(r'^(\d{4})-(\d{2})-(\d{2})'
+                       r'(?:T(\d{2}):(\d{2})(?::(\d{2})(\.\d+)?)?'
+                       r'(Z|[+-]\d{2}:?\d{2}))?$')
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _timestamp(value):
+    """
+    Converts a time of the 'times' property, in ms since epoch or an ISO 8601
+    string, to ms since epoch.  ISO times must have an offset, or be dates,
+    to be read the same way in Python and in the browser.
+
+    """
+    if not isinstance(value, string_types):
+        return float(value)
+    match = _ISO_8601.match(value)
+    if match is None:
+        raise ValueError('Expected times in ms since epoch or ISO 8601 dates '
+                         'or times with an offset, got {!r}'.format(value))
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    date = datetime.datetime(int(year), int(month), int(day), int(hour or 0),
+                             int(minute or 0), int(second or 0))
+    ms = (date - _EPOCH).total_seconds() * 1000 + float(fraction or 0) * 1000
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        ms -= sign * (int(offset[1:3]) * 60 + int(offset[-2:])) * 60000
+    return ms
+
+
+def _isoformat(ms):
+    """Formats a time in ms since epoch as an ISO 8601 UTC time."""
+    date = _EPOCH + datetime.timedelta(milliseconds=ms)
+    return date.strftime('%Y-%m-%dT%H:%M:%S.{:03d}Z').format(
+        date.microsecond // 1000)
+
+
+def _trajectory_order(ids, times):
+    """Returns the order sorting rows by id and then by time."""
+    if times.dtype.kind in 'iu' and len(times):
+        # Sorting a single key made of the id's rank and the time is
+        # several times faster than sorting by two keys.
+        codes = np.unique(ids, return_inverse=True)[1].ravel().astype(np.int64)
+        offsets = times.astype(np.int64) - times.min()
+        bits = int(offsets.max()).bit_length()
+        if bits + int(codes.max()).bit_length() < 63:
+            return np.argsort((codes << bits) | offsets)
+    return np.lexsort((times, ids))
+
+
+_sharded_layer = u"""
+<script>
+    L.TimeDimension.Layer.FoliumShardedGeoJson = L.TimeDimension.Layer.GeoJson.extend({
+        // Only keeps in the base layer the shards of features that can be
+        // visible at the current time, parsing them from their JSON blocks,
+        // and prefetches the next shard.
+        initialize: function(layer, shards, options) {
+            L.TimeDimension.Layer.GeoJson.prototype.initialize.call(this, layer, options);
+            this._shards = shards;
+            this._shardLayers = {};
+            this._visibleShards = {};
+            this._loaded = true;
+        },
+        _setAvailableTimes: function() {},
+        _update: function() {
+            if (this._map) {
+                this._loadShards(this._timeDimension.getCurrentTime());
+            }
+            return L.TimeDimension.Layer.GeoJson.prototype._update.call(this);
+        },
+        _parseShard: function(k) {
+            if (!this._shardLayers[k]) {
+                var features = JSON.parse(
+                    document.getElementById(this._shards.ids[k]).textContent);
+                this._shardLayers[k] = L.geoJson(features).getLayers();
+            }
+            return this._shardLayers[k];
+        },
+        _loadShards: function(time) {
+            var shards = this._shards, minTime = -Infinity, next = null;
+            if (this._duration) {
+                var date = new Date(time);
+                L.TimeDimension.Util.subtractTimeDuration(date, this._duration, true);
+                minTime = date.getTime();
+            }
+            for (var k = 0; k < shards.ids.length; k++) {
+                var visible = shards.starts[k] <= time && shards.ends[k] >= minTime;
+                if (visible && !this._visibleShards[k]) {
+                    this._parseShard(k).forEach(this._baseLayer.addLayer, this._baseLayer);
+                    this._visibleShards[k] = true;
+                } else if (!visible && this._visibleShards[k]) {
+                    this._shardLayers[k].forEach(this._baseLayer.removeLayer, this._baseLayer);
+                    delete this._visibleShards[k];
+                }
+                if (next === null && shards.starts[k] > time) {
+                    next = k;
+                }
+            }
+            for (var key in this._shardLayers) {
+                if (!this._visibleShards[key] && +key !== next) {
+                    delete this._shardLayers[key];
+                }
+            }
+            this._nextShard = next;
+            if (next !== null) {
+                var self = this;
+                setTimeout(function() {
+                    if (self._nextShard === next) {
+                        self._parseShard(next);
+                    }
+                }, 0);
+            }
+        }
+    });
+</script>
+"""
 
 
 class TimestampedGeoJson(MacroElement):
@@ -43,6 +165,14 @@ class TimestampedGeoJson(MacroElement):
         Used to construct the array of available times starting
         from the first available time. Format: ISO8601 Duration
         ex: 'P1M' -> 1/month, 'P1D' -> 1/day, 'PT1H' -> 1/hour, and'PT1M' -> 1/minute
+    duration: str, default None
+        Period of time which the features will be shown on the map after their
+        time. Format: ISO8601 Duration. By default features stay on the map.
+    chunk_size: int, default None
+        If set, the features are sorted by time and embedded by shards of `chunk_size`
+        features in JSON blocks, only parsed when the animation reaches their time.
+        With a `duration`, the shards of features no longer shown are released.
+        The times must be in ms since epoch, or ISO 8601 strings with an offset.
 
     Examples
     --------
@@ -66,28 +196,59 @@ class TimestampedGeoJson(MacroElement):
 
     """
     def __init__(self, data, transition_time=200, loop=True, auto_play=True, add_last_point=True,
-                 period='P1D'):
+                 period='P1D', duration=None, chunk_size=None):
         super(TimestampedGeoJson, self).__init__()
-        self._name = 'TimestampedGeoJson'
 
+        self._geojson = None
+        self._literal = False
         if 'read' in dir(data):
             self.embed = True
             self.data = data.read()
         elif type(data) is dict:
             self.embed = True
-            self.data = json.dumps(data)
+            self._geojson = data
+            self._literal = True
+            self.data = json_dumps(data)
         else:
             self.embed = False
             self.data = data
+        self._setup(transition_time, loop, auto_play, add_last_point, period, duration)
+        if chunk_size is not None:
+            self._shard_features(chunk_size)
+
+    @classmethod
+    def _from_json(cls, text, transition_time=200, loop=True, auto_play=True, add_last_point=True,
+                   period='P1D', duration=None):
+        """
+        Creates a TimestampedGeoJson embedding the GeoJSON text `text`,
+        without parsing it.
+
+        """
+        self = cls.__new__(cls)
+        super(TimestampedGeoJson, self).__init__()
+        self._geojson = None
+        self._literal = True
+        self.embed = True
+        self.data = text
+        self._setup(transition_time, loop, auto_play, add_last_point, period, duration)
+        return self
+
+    def _setup(self, transition_time, loop, auto_play, add_last_point, period, duration):
+        """Sets the options shared by the constructors."""
+        self._name = 'TimestampedGeoJson'
         self.transition_time = int(transition_time)
         self.loop = bool(loop)
         self.auto_play = bool(auto_play)
         self.add_last_point = bool(add_last_point)
         self.period = period
+        self.duration = duration
+
+        self._bounds = None
+        self._shards = None
 
         self._template = Template("""
         {% macro script(this, kwargs) %}
-            {{this._parent.get_name()}}.timeDimension = L.timeDimension({period:"{{this.period}}"});
+            {{this._parent.get_name()}}.timeDimension = L.timeDimension({period:"{{this.period}}"{% if this._shards %}, timeInterval:"{{this._time_interval}}"{% endif %}});
             {{this._parent.get_name()}}.timeDimensionControl = L.control.timeDimension({
                 position: 'bottomleft',
                 autoPlay: {{'true' if this.auto_play else 'false'}},
@@ -97,15 +258,160 @@ class TimestampedGeoJson(MacroElement):
                     });
             {{this._parent.get_name()}}.addControl({{this._parent.get_name()}}.timeDimensionControl);
 
+            {% if this._shards %}
+            var {{this.get_name()}} = new L.TimeDimension.Layer.FoliumShardedGeoJson(
+                L.geoJson(null, {'style': function (feature) {
+                    return feature.properties.style
+                }}),
+                {{this._shard_index}},
+                {updateTimeDimension: false,addlastPoint: {{'true' if this.add_last_point else 'false'}}{% if this.duration %},duration:"{{this.duration}}"{% endif %}}
+                ).addTo({{this._parent.get_name()}});
+            {% else %}
             var {{this.get_name()}} = L.timeDimension.layer.geoJson(
-                L.geoJson({{this.data}}, {'style': function (feature) {
+                L.geoJson({% if this._literal %}{{this.data|json_literal}}{% else %}{{this.data}}{% endif %}, {'style': function (feature) {
                     return feature.properties.style
                 }}),
-                {updateTimeDimension: true,addlastPoint: {{'true' if this.add_last_point else 'false'}}}
+                {updateTimeDimension: true,addlastPoint: {{'true' if this.add_last_point else 'false'}}{% if this.duration %},duration:"{{this.duration}}"{% endif %}}
                 ).addTo({{this._parent.get_name()}});
+            {% endif %}
         {% endmacro %}
         """)  # noqa
 
+    @classmethod
+    def from_arrays(cls, ids, lats, lons, times, styles=None, chunk_size=None, **kwargs):
+        """
+        Creates a TimestampedGeoJson of trajectories from columns of points,
+        like the rows of a table of vehicle positions.
+
+        The rows are grouped by id and sorted by time with NumPy, and each
+        trajectory becomes a LineString feature, or a Point if it has only
+        one row, without building lists of points.  Requires NumPy.
+
+        Parameters
+        ----------
+        ids: array-like
+            The trajectory each row belongs to.
+        lats, lons: array-like
+            The latitude and longitude of each row.
+        times: array-like
+            The time of each row, in ms since epoch, as ISO 8601 strings or
+            as numpy.datetime64 values.
+        styles: dict of array-like, default None
+            Style options, like {'color': colors}, with a value for each row.
+            Each trajectory is styled with the values of its first row.
+        chunk_size: int, default None
+            As in TimestampedGeoJson.
+        **kwargs
+            Further parameters of TimestampedGeoJson.
+
+        Examples
+        --------
+        >>> TimestampedGeoJson.from_arrays(df['vehicle'], df['lat'], df['lon'],
+        ...                                df['time'], period='PT1M')
+
+        """
+        if np is None:
+            raise ImportError('The NumPy package is required '
+                              ' for this functionality')
+        ids, lats, lons, times = (np.asarray(column)
+                                  for column in (ids, lats, lons, times))
+        styles = dict((key, np.asarray(value))
+                      for key, value in (styles or {}).items())
+        if not (len(ids) == len(lats) == len(lons) == len(times) and
+                all(len(value) == len(ids) for value in styles.values())):
+            raise ValueError('All the columns must have the same length.')
+        if np.issubdtype(times.dtype, np.datetime64):
+            times = times.astype('datetime64[ms]').astype(np.int64)
+
+        order = _trajectory_order(ids, times)
+        ids, times = ids[order], times[order]
+        coordinates = np.column_stack([lons, lats]).astype(float)[order]
+        starts = np.concatenate([[0], np.flatnonzero(ids[1:] != ids[:-1]) + 1])
+        ends = np.append(starts[1:], len(ids))
+        first_ids = ids[starts].tolist()
+        first_styles = dict((key, value[order[starts]].tolist())
+                            for key, value in styles.items())
+
+        # The GeoJSON text is written directly from the arrays, without
+        # building the features as dicts.
+        features = []
+        for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+            if end - start > 1:
+                geometry = u'{"type":"LineString","coordinates":%s}' % json_dumps(coordinates[start:end])
+            else:
+                geometry = u'{"type":"Point","coordinates":%s}' % json_dumps(coordinates[start])
+            style = dict((key, value[i]) for key, value in first_styles.items())
+            features.append(
+                u'{"type":"Feature","geometry":%s,"properties":{"id":%s,"times":%s,"style":%s}}'
+                % (geometry, json_dumps(first_ids[i]), json_dumps(times[start:end]), json_dumps(style)))
+
+        self = cls._from_json(
+            u'{"type":"FeatureCollection","features":[%s]}' % u','.join(features),
+            **kwargs)
+        if chunk_size is not None:
+            if times.dtype.kind in 'iuf':
+                # Each trajectory is sorted by time.
+                firsts, lasts = times[starts].tolist(), times[ends - 1].tolist()
+            else:
+                spans = [[_timestamp(time) for time in times[start:end].tolist()]
+                         for start, end in zip(starts.tolist(), ends.tolist())]
+                firsts, lasts = [min(span) for span in spans], [max(span) for span in spans]
+            self._set_shards(zip(firsts, lasts, features), chunk_size)
+        if len(ids):
+            self._bounds = [[float(lats.min()), float(lons.min())],
+                            [float(lats.max()), float(lons.max())]]
+        return self
+
+    def _get_features(self):
+        """Returns the features of the embedded GeoJSON."""
+        if not self.embed:
+            raise ValueError('Cannot read the features of non-embedded GeoJSON.')
+        data = self._geojson if self._geojson is not None else json_loads(self.data)
+        if 'features' not in data.keys():
+            # Catch case when GeoJSON is just a single Feature or a geometry.
+            if not (isinstance(data, dict) and 'geometry' in data.keys()):
+                # Catch case when GeoJSON is just a geometry.
+                data = {'type': 'Feature', 'geometry': data}
+            data = {'type': 'FeatureCollection', 'features': [data]}
+        return data['features']
+
+    def _shard_features(self, chunk_size):
+        """
+        Sorts the features by time and splits them in shards of `chunk_size`
+        features, with the first and last times of the features of each.
+
+        """
+        features = []
+        for feature in self._get_features():
+            times = feature['properties']['times']
+            if np is not None and isinstance(times, np.ndarray) and times.dtype.kind in 'iuf':
+                times = [times.min(), times.max()]
+            times = [_timestamp(time) for time in times]
+            features.append((min(times), max(times), json_dumps(feature)))
+        self._set_shards(features, chunk_size)
+
+    def _set_shards(self, features, chunk_size):
+        """
+        Embeds by shards of `chunk_size` the features given as tuples of
+        their first time, last time and JSON text.
+
+        """
+        features = sorted(features, key=lambda feature: feature[0])
+        chunks = [features[i:i + chunk_size]
+                  for i in range(0, len(features), chunk_size)]
+        self._shards = [JsonScript(u'[%s]' % u','.join(text for _, _, text in chunk),
+                                   serialized=True)
+                        for chunk in chunks]
+        ends = [max(last for _, last, _ in chunk) for chunk in chunks]
+        self._shard_index = json_dumps({
+            'ids': [shard.get_name() for shard in self._shards],
+            'starts': [chunk[0][0] for chunk in chunks],
+            'ends': ends,
+        })
+        if features:
+            self._time_interval = '{}/{}'.format(_isoformat(features[0][0]),
+                                                 _isoformat(max(ends)))
+
     def render(self, **kwargs):
         super(TimestampedGeoJson, self).render()
 
@@ -137,25 +443,25 @@ class TimestampedGeoJson(MacroElement):
             CssLink("http://apps.socib.es/Leaflet.TimeDimension/dist/leaflet.timedimension.control.min.css"),  # noqa
             name='leaflet.timedimension_css')
 
+        if self._shards is not None:
+            figure.header.add_child(Element(_sharded_layer),
+                                    name='folium_sharded_geojson')
+            for shard in self._shards:
+                figure.html.add_child(shard, name=shard.get_name())
+
     def _get_self_bounds(self):
         """
         Computes the bounds of the object itself (not including it's children)
         in the form [[lat_min, lon_min], [lat_max, lon_max]].
 
         """
+        if self._bounds is not None:
+            return self._bounds
         if not self.embed:
             raise ValueError('Cannot compute bounds of non-embedded GeoJSON.')
 
-        data = json.loads(self.data)
-        if 'features' not in data.keys():
-            # Catch case when GeoJSON is just a single Feature or a geometry.
-            if not (isinstance(data, dict) and 'geometry' in data.keys()):
-                # Catch case when GeoJSON is just a geometry.
-                data = {'type': 'Feature', 'geometry': data}
-            data = {'type': 'FeatureCollection', 'features': [data]}
-
         bounds = [[None, None], [None, None]]
-        for feature in data['features']:
+        for feature in self._get_features():
             for point in iter_points(feature.get('geometry', {}).get('coordinates', {})):  # noqa
                 bounds = [
                     [
@@ -6,8 +6,7 @@ from branca.element import CssLink, Figure, JavascriptLink
 
 from folium.raster_layers import WmsTileLayer
 from folium.map import Layer
-
-from jinja2 import Template
+from folium.utilities import Template
 
 
 class TimestampedWmsTileLayers(Layer):
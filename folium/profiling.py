@@ -0,0 +1,659 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tools for measuring where the time, memory and output of a render go.
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import re
+import sys
+import types
+import warnings
+from collections import OrderedDict
+from timeit import default_timer
+
+from branca.element import Link
+
+from folium import utilities
+from folium.map import Layer
+
+from six import binary_type, text_type
+
+
+_SECTIONS = ('header', 'html', 'script')
+
+_KINDS = ('template', 'inline_data', 'data_uri', 'asset')
+
+_DATA_URI = re.compile(r'data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+')
+
+# Attributes referencing objects shared by many elements, such as the jinja
+# environments, which are not retained by any single element.
+_SHARED = ('_parent', '_env', 'environment', 'globals', '_environment')
+
+_CODE_ATTRS = ('co_code', 'co_consts', 'co_names', 'co_varnames',
+               'co_freevars', 'co_cellvars', 'co_name', 'co_lnotab',
+               'co_linetable', 'co_exceptiontable')
+
+_NOT_PAYLOADS = ('_children', '_parent', '_template', '_env', 'header',
+                 'html', 'script')
+
+
+def _payload_size(value):
+    """
+    Returns the size of a text, bytes or array attribute value, in bytes.
+    The size of lists and dicts is the size of their JSON, as measured
+    when the render serializes them.
+
+    """
+    if isinstance(value, text_type):
+        return len(value.encode('utf8'))
+    if isinstance(value, binary_type):
+        return len(value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return 0
+
+
+class RenderProfiler(object):
+    """
+    Context manager that profiles the rendering of an element tree.
+
+    Every element of the tree is instrumented when entering the context,
+    so that each call to `render` within the context (for instance through
+    `Map.save` or `Figure.render`) records, per element, the wall time,
+    the Python allocations and the bytes emitted in the figure's header,
+    html and script.  Elements added to the tree once in the context are
+    not profiled.
+
+    Parameters
+    ----------
+    element: branca.element.Element
+        Any element of the tree to profile. The whole tree of its root
+        is instrumented.
+    trace_memory: bool, default False
+        Whether to record Python allocations with `tracemalloc`.
+        This slows the render down noticeably.
+    budget: PayloadBudget, default None
+        If provided, the budget is checked as soon as the root is rendered,
+        so that an exceeded budget set to fail does so before
+        `save` writes the file.
+    min_payload_bytes: int, default 1024
+        Attributes of the elements larger than this are reported as
+        payloads. See `RenderReport.payloads`.
+
+    Examples
+    --------
+    >>> with RenderProfiler(m) as profiler:
+    ...     m.save('map.html')
+    >>> profiler.report.by_class()
+
+    """
+    def __init__(self, element, trace_memory=False, budget=None,
+                 min_payload_bytes=1024):
+        self.root = element.get_root()
+        self.trace_memory = trace_memory
+        self.budget = budget
+        self.min_payload_bytes = min_payload_bytes
+        self.report = None
+        self._elements = []
+        self._records = OrderedDict()
+        self._stack = []
+        self._patched = []
+        # Per element name, the sizes of the text attributes seen when
+        # rendering, and the ids and sizes of the objects it serialized.
+        self._texts = {}
+        self._serialized = {}
+
+    def __enter__(self):
+        if self.trace_memory:
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+            self._stop_tracing = not tracemalloc.is_tracing()
+            if self._stop_tracing:
+                tracemalloc.start()
+        self._instrument(self.root, parent=None)
+        for section in _SECTIONS:
+            container = getattr(self.root, section, None)
+            if container is not None:
+                self._patch(container, 'add_child',
+                            self._wrap_add_child(container, section))
+        self._wrap_json_dumps()
+        self.report = RenderReport(list(self._records.values()))
+        return self
+
+    def __exit__(self, *args):
+        for obj, attr, previous in reversed(self._patched):
+            if previous is None:
+                del obj.__dict__[attr]
+            else:
+                obj.__dict__[attr] = previous
+        self._patched = []
+        utilities.get_templates_env().policies['json.dumps_function'] = (
+            self._json_dumps)
+        if self.trace_memory and self._stop_tracing:
+            self._tracemalloc.stop()
+
+    def _patch(self, obj, attr, func):
+        self._patched.append((obj, attr, obj.__dict__.get(attr)))
+        obj.__dict__[attr] = func
+
+    def _instrument(self, element, parent):
+        record = {
+            'name': element.get_name(),
+            'class': type(element).__name__,
+            'parent': parent['name'] if parent is not None else None,
+            'path': (parent['path'] if parent is not None else []) +
+                    [type(element).__name__],
+            'calls': 0,
+            'time': 0.,
+            'self_time': 0.,
+            'memory': 0,
+            'self_memory': 0,
+            'bytes': OrderedDict((section, 0) for section in _SECTIONS),
+            'kinds': OrderedDict((kind, 0) for kind in _KINDS),
+            'payloads': OrderedDict(),
+            'layer': isinstance(element, Layer),
+            'layer_name': getattr(element, 'layer_name', None),
+        }
+        self._records[id(element)] = record
+        self._elements.append((element, record))
+        self._patch(element, 'render', self._wrap_render(element, record))
+        for child in element._children.values():
+            self._instrument(child, record)
+
+    def _wrap_json_dumps(self):
+        """
+        Replaces `json_dumps`, in the folium modules and as the `tojson`
+        filter of the templates, until the end of the profiled render, to
+        record the size of the JSON of the objects each element serializes.
+
+        """
+        json_dumps = self._json_dumps = utilities.json_dumps
+
+        def observed(obj, *args, **kwargs):
+            text = json_dumps(obj, *args, **kwargs)
+            if self._stack:
+                name = self._stack[-1][0]['name']
+                self._serialized.setdefault(name, []).append(
+                    (id(obj), len(text.encode('utf8'))))
+            return text
+
+        for name, module in list(sys.modules.items()):
+            if (name.split('.')[0] == 'folium' and module is not None and
+                    module.__dict__.get('json_dumps') is json_dumps):
+                self._patch(module, 'json_dumps', observed)
+        utilities.get_templates_env().policies['json.dumps_function'] = (
+            observed)
+
+    def _memory(self):
+        if self.trace_memory:
+            return self._tracemalloc.get_traced_memory()[0]
+        return 0
+
+    def _wrap_render(self, element, record):
+        render = element.render
+
+        def wrapped(**kwargs):
+            # Text prepared before the render, for instance by
+            # `utilities.prerender`, may be dropped by the render.
+            texts = self._texts.setdefault(record['name'], {})
+            for attr, value in vars(element).items():
+                if isinstance(value, (text_type, binary_type)):
+                    texts[attr] = max(texts.get(attr, 0), _payload_size(value))
+            frame = {'time': 0., 'memory': 0}
+            self._stack.append((record, frame))
+            memory = self._memory()
+            start = default_timer()
+            try:
+                out = render(**kwargs)
+            finally:
+                elapsed = default_timer() - start
+                allocated = self._memory() - memory
+                self._stack.pop()
+                record['calls'] += 1
+                record['time'] += elapsed
+                record['self_time'] += elapsed - frame['time']
+                record['memory'] += allocated
+                record['self_memory'] += allocated - frame['memory']
+                if self._stack:
+                    self._stack[-1][1]['time'] += elapsed
+                    self._stack[-1][1]['memory'] += allocated
+            if element is self.root and out is not None:
+                self.report.total_bytes = len(out.encode('utf8'))
+                self._account_payloads()
+                if self.budget is not None:
+                    self.budget.check(self.report)
+            return out
+        return wrapped
+
+    def _account_payloads(self):
+        """Measures the large attributes of each element and counts the
+        part of its output they account for as inline data.
+        """
+        for element, record in self._elements:
+            record['payloads'] = OrderedDict()
+            attributes = vars(element)
+            sizes = dict(self._texts.get(record['name'], {}))
+            for attr, value in attributes.items():
+                sizes[attr] = max(sizes.get(attr, 0), _payload_size(value))
+            # The JSON of objects that are not attributes, such as styled
+            # copies of the data, is counted as the element's data.
+            ids = dict((id(value), attr) for attr, value in attributes.items()
+                       if isinstance(value, (list, tuple, dict)))
+            derived = 0
+            for obj_id, size in self._serialized.get(record['name'], []):
+                if obj_id in ids:
+                    sizes[ids[obj_id]] = max(sizes[ids[obj_id]], size)
+                else:
+                    derived += size
+            label = 'data' if 'data' in attributes else 'json'
+            sizes[label] = max(sizes.get(label, 0), derived)
+
+            inline = 0
+            for attr, size in sizes.items():
+                value = attributes.get(attr)
+                if (attr in _NOT_PAYLOADS or callable(value) or
+                        size < self.min_payload_bytes):
+                    continue
+                if (isinstance(value, text_type) and
+                        value.startswith('data:')):
+                    kind = 'data_uri'
+                else:
+                    kind = 'inline_data'
+                    inline += size
+                record['payloads'][attr] = {'bytes': size, 'kind': kind}
+            inline = min(inline, record['kinds']['template'])
+            record['kinds']['template'] -= inline
+            record['kinds']['inline_data'] += inline
+
+    def _wrap_add_child(self, container, section):
+        add_child = container.add_child
+
+        def wrapped(child, name=None, index=None):
+            if self._stack and 'render' not in child.__dict__:
+                record = self._stack[-1][0]
+                self._patch(child, 'render',
+                            self._wrap_output(child, record, section))
+            return add_child(child, name=name, index=index)
+        return wrapped
+
+    def _wrap_output(self, child, record, section):
+        render = child.render
+
+        def wrapped(**kwargs):
+            out = render(**kwargs)
+            size = len(out.encode('utf8'))
+            record['bytes'][section] += size
+            if isinstance(child, Link):
+                record['kinds']['asset'] += size
+            else:
+                data_uri = sum(len(match) for match in _DATA_URI.findall(out))
+                record['kinds']['data_uri'] += data_uri
+                record['kinds']['template'] += size - data_uri
+            return out
+        return wrapped
+
+
+class RenderReport(object):
+    """
+    Results of a `RenderProfiler`.
+
+    `records` holds one dict per element, in tree order, with its name,
+    class, parent name and path of classes from the root, the number of
+    `render` calls, the inclusive and exclusive (`self_`) wall time in
+    seconds and Python allocations in bytes, the bytes it emitted in
+    each section of the figure (`bytes`) and by kind of content (`kinds`:
+    template, inline_data, data_uri and linked asset tags), and the size
+    of its large attributes (`payloads`).
+
+    """
+    def __init__(self, records):
+        self.records = records
+        self.total_bytes = None
+
+    def _children(self):
+        children = {}
+        for record in self.records:
+            children.setdefault(record['parent'], []).append(record)
+        return children
+
+    def subtree_bytes(self):
+        """Returns the bytes emitted by each element and its descendants,
+        keyed by element name.
+        """
+        children = self._children()
+        out = OrderedDict()
+
+        def total(record):
+            if record['name'] not in out:
+                out[record['name']] = (
+                    sum(record['bytes'].values()) +
+                    sum(total(child) for child in
+                        children.get(record['name'], [])))
+            return out[record['name']]
+
+        for record in self.records:
+            total(record)
+        return out
+
+    def by_element(self):
+        """Returns the records sorted by decreasing exclusive time."""
+        return sorted(self.records, key=lambda r: r['self_time'],
+                      reverse=True)
+
+    def by_class(self):
+        """Returns the exclusive metrics aggregated by element class,
+        sorted by decreasing time.
+        """
+        classes = OrderedDict()
+        for record in self.records:
+            agg = classes.setdefault(record['class'], {
+                'class': record['class'],
+                'count': 0,
+                'calls': 0,
+                'time': 0.,
+                'memory': 0,
+                'bytes': OrderedDict((section, 0) for section in _SECTIONS),
+            })
+            agg['count'] += 1
+            agg['calls'] += record['calls']
+            agg['time'] += record['self_time']
+            agg['memory'] += record['self_memory']
+            for section, size in record['bytes'].items():
+                agg['bytes'][section] += size
+        return sorted(classes.values(), key=lambda r: r['time'],
+                      reverse=True)
+
+    def payloads(self):
+        """
+        Returns the large attributes of all the elements, sorted by
+        decreasing size, as dicts with the element name and class,
+        a `label` such as 'HeatMap.data', the `kind` ('data_uri' or
+        'inline_data') and the size in `bytes`.
+
+        """
+        out = []
+        for record in self.records:
+            for attr, payload in record['payloads'].items():
+                out.append({
+                    'name': record['name'],
+                    'class': record['class'],
+                    'label': '{}.{}'.format(record['class'], attr),
+                    'kind': payload['kind'],
+                    'bytes': payload['bytes'],
+                })
+        return sorted(out, key=lambda r: r['bytes'], reverse=True)
+
+    def summary(self, n=10):
+        """Returns a text table of the `n` biggest payloads."""
+        lines = ['{:>12}  {:>6}  {}'.format('bytes', 'share', 'payload')]
+        for payload in self.payloads()[:n]:
+            share = (100. * payload['bytes'] / self.total_bytes if
+                     self.total_bytes else 0.)
+            lines.append('{:>12,}  {:>5.1f}%  {} ({})'.format(
+                payload['bytes'], share, payload['label'], payload['name']))
+        if self.total_bytes is not None:
+            lines.append('{:>12,}  {:>5.1f}%  total'.format(
+                self.total_bytes, 100.))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """Returns a JSON-serializable representation of the report."""
+        subtree = self.subtree_bytes()
+        elements = []
+        for record in self.records:
+            record = dict(record)
+            record['subtree_bytes'] = subtree[record['name']]
+            elements.append(record)
+        return {
+            'total_bytes': self.total_bytes,
+            'elements': elements,
+            'classes': self.by_class(),
+            'payloads': self.payloads(),
+        }
+
+    def to_folded(self, metric='time'):
+        """
+        Returns the report in the "folded stacks" format read by
+        flame graph tools (flamegraph.pl, speedscope, ...).
+
+        Parameters
+        ----------
+        metric: str, default 'time'
+            One of 'time' (exclusive time, in microseconds), 'memory'
+            (exclusive allocations, in bytes) or 'bytes' (emitted bytes).
+
+        """
+        stacks = OrderedDict()
+        for record in self.records:
+            if metric == 'time':
+                value = int(round(record['self_time'] * 1e6))
+            elif metric == 'memory':
+                value = record['self_memory']
+            elif metric == 'bytes':
+                value = sum(record['bytes'].values())
+            else:
+                raise ValueError('Unknown metric {!r}, expected one of '
+                                 "'time', 'memory' or 'bytes'.".format(metric))
+            key = ';'.join(record['path'])
+            stacks[key] = stacks.get(key, 0) + value
+        return '\n'.join('{} {}'.format(key, value) for
+                         key, value in stacks.items() if value > 0)
+
+
+class PayloadBudget(object):
+    """
+    Limits on the output size of a figure and of its layers.
+
+    Parameters
+    ----------
+    per_figure: int, default None
+        Maximum size of the whole rendered figure, in bytes.
+    per_layer: int or dict, default None
+        Maximum size of the output of each Layer and its children,
+        in bytes.  A dict maps layer names, element names or class names
+        to their own limit.
+    action: str, default 'warn'
+        What to do when a limit is exceeded: 'warn' to emit a
+        `UserWarning`, 'raise' to raise a `ValueError`.
+
+    Examples
+    --------
+    >>> budget = PayloadBudget(per_figure=20e6, per_layer={'HeatMap': 5e6})
+    >>> with RenderProfiler(m, budget=budget):
+    ...     m.save('map.html')
+
+    """
+    def __init__(self, per_figure=None, per_layer=None, action='warn'):
+        if action not in ('warn', 'raise'):
+            raise ValueError("action must be 'warn' or 'raise', "
+                             'got {!r}'.format(action))
+        self.per_figure = per_figure
+        self.per_layer = per_layer
+        self.action = action
+
+    def _layer_limit(self, record):
+        if not isinstance(self.per_layer, dict):
+            return self.per_layer
+        for key in (record['layer_name'], record['name'], record['class']):
+            if key in self.per_layer:
+                return self.per_layer[key]
+        return None
+
+    def violations(self, report):
+        """Returns the list of exceeded limits of a `RenderReport`."""
+        out = []
+        if (self.per_figure is not None and report.total_bytes is not None and
+                report.total_bytes > self.per_figure):
+            out.append({'scope': 'figure', 'name': None,
+                        'bytes': report.total_bytes,
+                        'limit': self.per_figure})
+        if self.per_layer is not None:
+            subtree = report.subtree_bytes()
+            for record in report.records:
+                limit = self._layer_limit(record) if record['layer'] else None
+                if limit is not None and subtree[record['name']] > limit:
+                    out.append({'scope': 'layer',
+                                'name': record['layer_name'],
+                                'bytes': subtree[record['name']],
+                                'limit': limit})
+        return out
+
+    def check(self, report):
+        """Warns or raises if any limit is exceeded by a `RenderReport`."""
+        violations = self.violations(report)
+        if not violations:
+            return violations
+        msg = 'Payload budget exceeded:\n' + '\n'.join(
+            '  {} {}: {:,} bytes > {:,} bytes'.format(
+                v['scope'], v['name'] or '', v['bytes'], int(v['limit']))
+            for v in violations) + '\n' + report.summary()
+        if self.action == 'raise':
+            raise ValueError(msg)
+        warnings.warn(msg, UserWarning, stacklevel=2)
+        return violations
+
+
+def profile_render(element, trace_memory=False, budget=None, **kwargs):
+    """
+    Renders the figure of `element` while profiling it.
+
+    Returns a tuple of the rendered HTML and the `RenderReport`.
+    See `RenderProfiler`.
+
+    """
+    with RenderProfiler(element, trace_memory=trace_memory,
+                        budget=budget) as profiler:
+        html = profiler.root.render(**kwargs)
+    return html, profiler.report
+
+
+def _sizeof(obj, seen):
+    """
+    Returns the size in bytes of `obj` and of everything it references
+    that is not in `seen` nor shared by all elements.
+
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        # Keeps a reference, as temporary objects could reuse the id.
+        seen[id(obj)] = obj
+        if isinstance(obj, (type, types.ModuleType)):
+            continue
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, types.FunctionType):
+            stack.extend([obj.__code__, obj.__defaults__, obj.__closure__,
+                          obj.__name__, getattr(obj, '__qualname__', None),
+                          getattr(obj, '__kwdefaults__', None)])
+        elif isinstance(obj, types.CodeType):
+            stack.extend(getattr(obj, attr, None) for attr in _CODE_ATTRS)
+        elif type(obj).__name__ == 'cell':
+            try:
+                stack.append(obj.cell_contents)
+            except ValueError:
+                pass
+        attributes = getattr(obj, '__dict__', None)
+        if isinstance(attributes, dict):
+            seen[id(attributes)] = attributes
+            size += sys.getsizeof(attributes)
+            for key, value in attributes.items():
+                if key not in _SHARED:
+                    stack.append(value)
+    return size
+
+
+def _element_sizeof(element, seen):
+    """Size of `element` itself, not including its children."""
+    size = sys.getsizeof(element) + sys.getsizeof(element.__dict__)
+    seen[id(element.__dict__)] = element.__dict__
+    for key, value in element.__dict__.items():
+        if key in _SHARED:
+            continue
+        if key == '_children':
+            seen[id(value)] = value
+            size += sys.getsizeof(value) + sum(_sizeof(name, seen)
+                                               for name in value)
+        else:
+            size += _sizeof(value, seen)
+    return size
+
+
+def retained_sizes(element):
+    """
+    Estimates the memory retained by each element of a tree.
+
+    Each element is charged for the objects it references, such as its
+    compiled template, options and data, excluding the other elements
+    and the objects shared by all the elements, such as jinja
+    environments.  Objects referenced by several elements are charged
+    to the first one, in depth-first order.
+
+    Parameters
+    ----------
+    element: branca.element.Element
+        Root of the tree to measure.
+
+    Returns
+    -------
+    A list of (element, size in bytes) tuples, in depth-first order.
+
+    """
+    seen = {}
+    elements = []
+    stack = [element]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen[id(current)] = current
+        elements.append(current)
+        stack.extend(reversed(list(current._children.values())))
+    return [(current, _element_sizeof(current, seen)) for current in elements]
+
+
+def estimate_retained_size(element, by_class=False):
+    """
+    Estimates the memory retained by an element tree, in bytes.
+
+    Useful to size worker limits and to catch regressions in the memory
+    cost of elements. See `retained_sizes`.
+
+    Parameters
+    ----------
+    element: branca.element.Element
+        Root of the tree to measure.
+    by_class: bool, default False
+        If True, returns an OrderedDict mapping each element class to
+        a dict of its `count`, total `bytes` and mean `per_element`
+        bytes, from the largest total to the smallest.
+
+    Examples
+    --------
+    >>> estimate_retained_size(m)
+    >>> estimate_retained_size(m, by_class=True)['Marker']['per_element']
+
+    """
+    sizes = retained_sizes(element)
+    if not by_class:
+        return sum(size for _, size in sizes)
+    classes = {}
+    for current, size in sizes:
+        entry = classes.setdefault(type(current).__name__,
+                                   {'count': 0, 'bytes': 0})
+        entry['count'] += 1
+        entry['bytes'] += size
+    for entry in classes.values():
+        entry['per_element'] = entry['bytes'] / entry['count']
+    return OrderedDict(sorted(classes.items(),
+                              key=lambda item: -item[1]['bytes']))
@@ -7,19 +7,98 @@ Wraps leaflet TileLayer, WmsTileLayer (TileLayer.WMS), ImageOverlay, and VideoOv
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
+import io
+import os
+from collections import OrderedDict
 
 from branca.element import Element, Figure
 
-from folium.map import Layer
-from folium.utilities import _parse_wms, image_to_url, mercator_transform
-
-from jinja2 import Environment, PackageLoader, Template
+from folium.map import Layer, get_shared_definitions
+from folium.utilities import (Template, _locations_tolist, _parse_wms,
+                              _validate_image, image_to_url, json_dumps,
+                              mercator_transform)
 
 from six import binary_type, text_type
 
 
-ENV = Environment(loader=PackageLoader('folium', 'templates'))
+_TILE_PROVIDERS = OrderedDict()
+
+
+def _normalize_tiles_name(name):
+    return ''.join(name.lower().strip().split())
+
+
+def _read_tile_template(path):
+    """Reads a template of folium/templates/tiles, as jinja2 would."""
+    with io.open(path, encoding='utf8') as f:
+        text = f.read()
+    return text[:-1] if text.endswith('\n') else text
+
+
+def get_tile_providers():
+    """
+    Returns the registry of tile providers, mapping normalized names to
+    dicts of their `tiles` URL, `attr`, `subdomains`, `min_zoom` and
+    `max_zoom`.
+
+    The built-in providers are read from folium/templates/tiles once,
+    on first use.
+
+    """
+    if not _TILE_PROVIDERS:
+        path = os.path.join(os.path.dirname(__file__), 'templates', 'tiles')
+        for name in sorted(os.listdir(path)):
+            tiles = os.path.join(path, name, 'tiles.txt')
+            attr = os.path.join(path, name, 'attr.txt')
+            if os.path.isfile(tiles) and os.path.isfile(attr):
+                _TILE_PROVIDERS[name] = {
+                    'tiles': _read_tile_template(tiles),
+                    'attr': _read_tile_template(attr),
+                    'subdomains': None,
+                    'min_zoom': None,
+                    'max_zoom': None,
+                }
+    return _TILE_PROVIDERS
+
+
+def register_tile_provider(name, tiles, attr, subdomains=None,
+                           min_zoom=None, max_zoom=None):
+    """
+    Registers a tile provider, so that TileLayer and Map accept its name
+    as `tiles`.
+
+    Parameters
+    ----------
+    name: str
+        Name of the provider. Case and whitespace are ignored.
+    tiles: str
+        Leaflet-style URL of the tiles, like
+        ``http://{s}.yourtiles.com/{z}/{x}/{y}.png``. The text
+        ``{{ API_key }}`` is replaced by the `API_key` passed to TileLayer,
+        which is then required.
+    attr: str
+        Attribution of the tiles.
+    subdomains: str or list of strings, default None
+        Subdomains of the tile service, used unless the TileLayer sets its own.
+    min_zoom: int, default None
+        Minimal zoom of the tiles, TileLayer `min_zoom` is raised to it.
+    max_zoom: int, default None
+        Maximal zoom of the tiles, TileLayer `max_zoom` is lowered to it.
+
+    Examples
+    --------
+    >>> register_tile_provider('My tiles', 'http://{s}.mytiles.org/{z}/{x}/{y}.png',
+    ...                        attr='My attribution', max_zoom=16)
+    >>> m = folium.Map(tiles='My tiles')
+
+    """
+    get_tile_providers()[_normalize_tiles_name(name)] = {
+        'tiles': tiles,
+        'attr': attr,
+        'subdomains': subdomains,
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+    }
 
 
 class TileLayer(Layer):
@@ -29,7 +108,8 @@ class TileLayer(Layer):
     Parameters
     ----------
     tiles: str, default 'OpenStreetMap'
-        Map tileset to use. Can choose from this list of built-in tiles:
+        Map tileset to use. Can choose from the providers registered with
+        `register_tile_provider` and this list of built-in tiles:
             - "OpenStreetMap"
             - "Mapbox Bright" (Limited levels of zoom for free tiles)
             - "Mapbox Control Room" (Limited levels of zoom for free tiles)
@@ -58,43 +138,38 @@ class TileLayer(Layer):
         Adds the layer as an optional overlay (True) or the base layer (False).
     control : bool, default True
         Whether the Layer will be included in LayerControls.
-    subdomains: list of strings, default ['abc']
-        Subdomains of the tile service.
+    subdomains: list of strings, default None
+        Subdomains of the tile service. Defaults to the subdomains of the
+        tile provider, or 'abc'.
 
     """
     def __init__(self, tiles='OpenStreetMap', min_zoom=1, max_zoom=18,
                  attr=None, API_key=None, detect_retina=False,
                  name=None, overlay=False,
-                 control=True, no_wrap=False, subdomains='abc'):
+                 control=True, no_wrap=False, subdomains=None):
         self.tile_name = (name if name is not None else
-                          ''.join(tiles.lower().strip().split()))
+                          _normalize_tiles_name(tiles))
         super(TileLayer, self).__init__(name=self.tile_name, overlay=overlay,
                                         control=control)
         self._name = 'TileLayer'
-        self._env = ENV
 
-        options = {
-            'minZoom': min_zoom,
-            'maxZoom': max_zoom,
-            'noWrap': no_wrap,
-            'attribution': attr,
-            'subdomains': subdomains,
-            'detectRetina': detect_retina,
-        }
-        self.options = json.dumps(options, sort_keys=True, indent=2)
-
-        self.tiles = ''.join(tiles.lower().strip().split())
-        if self.tiles in ('cloudmade', 'mapbox') and not API_key:
-            raise ValueError('You must pass an API key if using Cloudmade'
-                             ' or non-default Mapbox tiles.')
-        templates = list(self._env.list_templates(
-            filter_func=lambda x: x.startswith('tiles/')))
-        tile_template = 'tiles/'+self.tiles+'/tiles.txt'
-        attr_template = 'tiles/'+self.tiles+'/attr.txt'
-
-        if tile_template in templates and attr_template in templates:
-            self.tiles = self._env.get_template(tile_template).render(API_key=API_key)  # noqa
-            self.attr = self._env.get_template(attr_template).render()
+        self.tiles = _normalize_tiles_name(tiles)
+        provider = get_tile_providers().get(self.tiles)
+        if provider is not None:
+            if '{{ API_key }}' in provider['tiles']:
+                if not API_key:
+                    raise ValueError('You must pass an API key if using '
+                                     '{} tiles.'.format(tiles))
+                self.tiles = provider['tiles'].replace('{{ API_key }}', API_key)
+            else:
+                self.tiles = provider['tiles']
+            self.attr = provider['attr']
+            if subdomains is None:
+                subdomains = provider['subdomains']
+            if provider['min_zoom'] is not None:
+                min_zoom = max(min_zoom, provider['min_zoom'])
+            if provider['max_zoom'] is not None:
+                max_zoom = min(max_zoom, provider['max_zoom'])
         else:
             self.tiles = tiles
             if not attr:
@@ -104,6 +179,16 @@ class TileLayer(Layer):
                 attr = text_type(attr, 'utf8')
             self.attr = attr
 
+        options = {
+            'minZoom': min_zoom,
+            'maxZoom': max_zoom,
+            'noWrap': no_wrap,
+            'attribution': attr,
+            'subdomains': subdomains if subdomains is not None else 'abc',
+            'detectRetina': detect_retina,
+        }
+        self.options = json_dumps(options, sort_keys=True, indent=2)
+
         self._template = Template(u"""
         {% macro script(this, kwargs) %}
             var {{this.get_name()}} = L.tileLayer(
@@ -158,7 +243,7 @@ class WmsTileLayer(Layer):
         options = _parse_wms(**kwargs)
         options.update({'attribution': attr})
 
-        self.options = json.dumps(options, sort_keys=True, indent=2)
+        self.options = json_dumps(options, sort_keys=True, indent=2)
 
         self._template = Template(u"""
         {% macro script(this, kwargs) %}
@@ -234,26 +319,56 @@ class ImageOverlay(Layer):
                  bounds[1][0]],
                 origin=origin)
 
-        self.url = image_to_url(image, origin=origin, colormap=colormap)
+        if hasattr(image, 'shape'):
+            # Checked now, but only encoded when first needed, possibly by
+            # `utilities.prerender`.
+            _validate_image(image)
+            self._url = None
+            self._image = (image, origin, colormap)
+        else:
+            self.url = image_to_url(image, origin=origin, colormap=colormap)
 
-        self.bounds = json.loads(json.dumps(bounds))
-        self.options = json.dumps(options, sort_keys=True, indent=2)
+        self.bounds = _locations_tolist(bounds)
+        self.options = json_dumps(options, sort_keys=True, indent=2)
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
                 var {{this.get_name()}} = L.imageOverlay(
-                    '{{ this.url }}',
-                    {{ this.bounds }},
+                    {{ this._url_name }},
+                    {{ this.bounds|tojson }},
                     {{ this.options }}
                     ).addTo({{this._parent.get_name()}});
             {% endmacro %}
             """)
 
-    def render(self, **kwargs):
-        super(ImageOverlay, self).render()
+    @property
+    def url(self):
+        """The url of the image, encoded on first use for arrays."""
+        if self._url is None:
+            self.__dict__.update(self._prerender())
+        return self._url
+
+    @url.setter
+    def url(self, url):
+        self._url = url
+        self._image = None
+
+    def _prerender(self):
+        if self._url is not None:
+            return {}
+        image, origin, colormap = self._image
+        return {'_url': image_to_url(image, origin=origin, colormap=colormap),
+                '_image': None}
 
+    def render(self, **kwargs):
         figure = self.get_root()
         assert isinstance(figure, Figure), ('You cannot render this Element '
                                             'if it is not in a Figure.')
+
+        # Overlays of the same image share a single embedded copy.
+        self._url_name = get_shared_definitions(figure).add(
+            'image', json_dumps(self.url))
+        super(ImageOverlay, self).render()
+
         pixelated = """<style>
         .leaflet-image-layer {
         image-rendering: -webkit-optimize-contrast; /* old android/safari*/
@@ -298,20 +413,20 @@ class VideoOverlay(Layer):
 
         self.video_url = video_url
 
-        self.bounds = json.loads(json.dumps(bounds))
+        self.bounds = _locations_tolist(bounds)
         options = {
             'opacity': opacity,
             'attribution': attr,
             'loop': loop,
             'autoplay': autoplay,
         }
-        self.options = json.dumps(options)
+        self.options = json_dumps(options)
 
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
                 var {{this.get_name()}} = L.videoOverlay(
                     '{{ this.video_url }}',
-                    {{ this.bounds }},
+                    {{ this.bounds|tojson }},
                     {{ this.options }}
                     ).addTo({{this._parent.get_name()}});
             {% endmacro %}
@@ -1,20 +1,31 @@
 from __future__ import (absolute_import, division, print_function)
 
 import base64
+import hashlib
 import io
 import json
 import math
+import multiprocessing
 import os
 import struct
 import zlib
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
-from six import binary_type, text_type
+import jinja2
+
+from six import binary_type, integer_types, text_type
 
 try:
     import numpy as np
 except ImportError:
     np = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 try:
     from urllib.parse import uses_relative, uses_netloc, uses_params, urlparse
 except ImportError:
@@ -24,6 +35,512 @@ except ImportError:
 _VALID_URLS = set(uses_relative + uses_netloc + uses_params)
 _VALID_URLS.discard('')
 
+_TEMPLATES_ENV = None
+
+_INLINE_PREFIX = '__inline__/'
+
+_TEMPLATES_CACHE_SIZE = 1000
+
+
+class _LRUCache(object):
+    """Mapping keeping the `maxsize` most recently used items."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, key):
+        value = self._items.pop(key)
+        self._items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+class _InlineLoader(jinja2.BaseLoader):
+    """
+    Loads the sources of inline templates, named by their hash.  Only the
+    sources of the most recently added templates are kept, as many as the
+    compiled templates cached by the Environment.
+
+    """
+    def __init__(self):
+        self.sources = _LRUCache(_TEMPLATES_CACHE_SIZE)
+
+    def add(self, source):
+        name = _INLINE_PREFIX + hashlib.sha1(source.encode('utf8')).hexdigest()
+        self.sources[name] = source
+        return name
+
+    def get_source(self, environment, template):
+        if template not in self.sources:
+            raise jinja2.TemplateNotFound(template)
+        return self.sources[template], None, lambda: True
+
+
+def get_templates_env():
+    """
+    Returns the jinja2 Environment compiling folium's templates, both
+    the template files and the inline templates of the elements.
+
+    It is created on first use, to keep `import folium` fast.  Compiled
+    templates are kept in memory and, if `enable_bytecode_cache` was
+    called or the FOLIUM_BYTECODE_CACHE environment variable is set to
+    a directory, on disk.  The `tojson` filter of the templates uses
+    `json_dumps`, and the `json_literal` filter is `json_literal`.
+
+    """
+    global _TEMPLATES_ENV
+    if _TEMPLATES_ENV is None:
+        _TEMPLATES_ENV = jinja2.Environment(
+            loader=jinja2.ChoiceLoader([
+                _InlineLoader(),
+                jinja2.PackageLoader('folium', 'templates'),
+            ]),
+            cache_size=_TEMPLATES_CACHE_SIZE)
+        _TEMPLATES_ENV.template_class = Template
+        _TEMPLATES_ENV.policies['json.dumps_function'] = json_dumps
+        _TEMPLATES_ENV.filters['json_literal'] = json_literal
+        directory = os.environ.get('FOLIUM_BYTECODE_CACHE')
+        if directory:
+            enable_bytecode_cache(directory)
+    return _TEMPLATES_ENV
+
+
+def enable_bytecode_cache(directory=None):
+    """
+    Caches the compiled templates on disk, so that new processes load
+    them instead of compiling them again.
+
+    Parameters
+    ----------
+    directory: str, default None
+        Directory of the cache, created if needed. Defaults to a
+        directory in the system's temporary directory.
+
+    Returns
+    -------
+    The jinja2.FileSystemBytecodeCache in use.
+
+    """
+    if directory is not None and not os.path.isdir(directory):
+        os.makedirs(directory)
+    env = get_templates_env()
+    env.bytecode_cache = jinja2.FileSystemBytecodeCache(directory)
+    return env.bytecode_cache
+
+
+def disable_bytecode_cache():
+    """Stops caching the compiled templates on disk."""
+    get_templates_env().bytecode_cache = None
+
+
+class Template(jinja2.Template):
+    """
+    jinja2 Template compiled once per source.
+
+    Templates are compiled by the Environment of `get_templates_env`,
+    keyed by the hash of their source, and shared by all the elements
+    using the same source.
+
+    """
+    def __new__(cls, source, **kwargs):
+        if kwargs:
+            return super(Template, cls).__new__(cls, source, **kwargs)
+        env = get_templates_env()
+        return env.get_template(env.loader.loaders[0].add(source))
+
+
+_JSON_BACKEND = 'json'
+
+
+def set_json_backend(backend):
+    """
+    Sets the library used to serialize JSON, 'json' (the default) or
+    'orjson', which is faster.
+
+    Both write the same compact JSON, with non-finite floats as null.
+    Only floats in exponent notation may be formatted differently.
+
+    """
+    global _JSON_BACKEND
+    if backend not in ('orjson', 'json'):
+        raise ValueError('Unknown JSON backend {!r}, expected '
+                         "'orjson' or 'json'.".format(backend))
+    if backend == 'orjson' and orjson is None:
+        raise ImportError('The orjson package is required for this backend.')
+    _JSON_BACKEND = backend
+
+
+def _json_default(obj):
+    """Converts the objects the JSON libraries do not serialize."""
+    if hasattr(obj, 'tolist'):
+        # NumPy arrays and scalars, pandas Series and Index.
+        return obj.tolist()
+    if hasattr(obj, 'to_dict') and hasattr(obj, 'columns'):
+        return obj.to_dict(orient='list')
+    if hasattr(obj, '__geo_interface__'):
+        return obj.__geo_interface__
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError('Object of type {} is not JSON serializable'.format(
+        type(obj).__name__))
+
+
+def _finite(obj):
+    """Returns `obj` with its non-finite floats replaced by None."""
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return OrderedDict((key, _finite(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if obj is None or isinstance(obj, (bool, text_type, binary_type) + integer_types):
+        return obj
+    return _finite(_json_default(obj))
+
+
+def json_dumps(obj, sort_keys=False, indent=None):
+    """
+    Serializes `obj` to a compact JSON string with the current backend.
+
+    NumPy arrays and scalars, pandas objects, objects with a
+    `__geo_interface__` and dates are serialized too.  NaN and infinite
+    floats, which are not valid JSON, are written as null.
+
+    Parameters
+    ----------
+    obj: object
+        The object to serialize.
+    sort_keys: bool, default False
+        Whether to sort the keys of the dicts.
+    indent: int, default None
+        Indentation of the output. orjson only supports 2 and falls
+        back to the json module otherwise.
+
+    """
+    if _JSON_BACKEND == 'orjson' and indent in (None, 2):
+        # NumPy objects go through `_json_default`, as with the json module.
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        out = orjson.dumps(obj, default=_json_default,
+                           option=option).decode('utf8')
+    else:
+        kwargs = dict(sort_keys=sort_keys, indent=indent, default=_json_default,
+                      separators=(',', ':') if indent is None else (',', ': '))
+        try:
+            out = json.dumps(obj, allow_nan=False, **kwargs)
+        except ValueError as e:
+            if not str(e).startswith('Out of range float'):
+                raise
+            out = json.dumps(_finite(obj), allow_nan=False, **kwargs)
+    return out
+
+
+def json_loads(s):
+    """Deserializes the JSON string `s` with the current backend."""
+    if _JSON_BACKEND == 'orjson':
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def encode_typed_array(data, dtype='float32', precision=6):
+    """
+    Packs a 2D array of numbers as little-endian binary, encoded in base64,
+    to be decoded into typed arrays by `foliumDecodeTypedArray` in the
+    browser.  It is 3 to 4 times smaller than JSON and faster to parse.
+
+    Parameters
+    ----------
+    data: array-like of shape (n, columns)
+        The numbers to encode, like [[lat, lng, weight], ...].
+    dtype: {'float32', 'int32'}, default 'float32'
+        'float32' keeps about 7 significant digits, which is about 1 m
+        for coordinates.  'int32' quantizes the values to `precision`
+        decimals.
+    precision: int, default 6
+        Number of decimals kept by 'int32'.
+
+    Returns
+    -------
+    A dict with the base64 `data`, the `dtype`, the number of `columns`
+    and the `scale` the decoded values are divided by.
+
+    """
+    if np is None:
+        raise ImportError('The NumPy package is required '
+                          ' for this functionality')
+    values = np.asarray(data, dtype=float)
+    if values.ndim != 2:
+        raise ValueError('Expected a 2D array of numbers, got an array of '
+                         'shape {}.'.format(values.shape))
+    scale = 1
+    if dtype == 'float32':
+        encoded = values.astype('<f4')
+    elif dtype == 'int32':
+        scale = 10 ** precision
+        encoded = np.round(values * scale)
+        if encoded.size and np.abs(encoded).max() > np.iinfo(np.int32).max:
+            raise ValueError('Values are too large to be encoded as int32 '
+                             'with {} decimals.'.format(precision))
+        encoded = encoded.astype('<i4')
+    else:
+        raise ValueError("dtype must be 'float32' or 'int32', "
+                         'got {!r}'.format(dtype))
+    return {
+        'data': base64.b64encode(encoded.tobytes()).decode('ascii'),
+        'dtype': dtype,
+        'columns': values.shape[1],
+        'scale': scale,
+    }
+
+
+_JSON_PARSE_MIN_SIZE = 10000
+
+
+def set_json_parse_threshold(min_size):
+    """
+    Sets the minimum size, in characters, of the JSON embedded in the
+    scripts as `JSON.parse` calls by `json_literal`.  None disables it.
+
+    """
+    global _JSON_PARSE_MIN_SIZE
+    _JSON_PARSE_MIN_SIZE = None if min_size is None else int(min_size)
+
+
+def json_literal(text):
+    """
+    Returns JSON text to embed as a JavaScript expression in a script.
+
+    Browsers parse a large JSON string given to `JSON.parse` several times
+    faster than the same data as an object literal, so JSON of more than
+    10 kB, see `set_json_parse_threshold`, is returned as
+    `JSON.parse('...')`, escaped for a string literal in a <script>.
+    Smaller JSON is returned unchanged.  `text` must be written by
+    `json_dumps`, which never writes the NaN or Infinity that `JSON.parse`
+    rejects.
+
+    """
+    if _JSON_PARSE_MIN_SIZE is None or len(text) < _JSON_PARSE_MIN_SIZE:
+        return text
+    text = (text_type(text).replace('\\', '\\\\')
+            .replace("'", "\\'")
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+            .replace(u'\u2028', '\\u2028')
+            .replace(u'\u2029', '\\u2029')
+            .replace('</', '<\\/')
+            .replace('<!--', '<\\!--'))
+    return "JSON.parse('{}')".format(text)
+
+
+_COMPRESS_MIN_SIZE = 10000
+
+
+def compress_payload(text, compress=True):
+    """
+    Deflates a text payload and encodes it in base64, to be inflated by
+    `foliumInflate` in the browser with the native `DecompressionStream`.
+    GeoJSON and coordinates compress to 5 to 10 times smaller.
+
+    Parameters
+    ----------
+    text: str
+        The payload, usually JSON.
+    compress: bool or int, default True
+        If True, only payloads of more than 10 kB are compressed, the
+        smaller ones are not worth the decoding.  If an integer, the
+        minimum size in bytes of the payloads to compress.  If False,
+        nothing is compressed.
+
+    Returns
+    -------
+    The base64 encoded deflate stream, as a str, or None if the payload
+    is not compressed.
+
+    """
+    if compress is False or compress is None:
+        return None
+    min_size = _COMPRESS_MIN_SIZE if compress is True else int(compress)
+    if isinstance(text, text_type):
+        text = text.encode('utf-8')
+    if len(text) < min_size:
+        return None
+    return base64.b64encode(zlib.compress(text, 9)).decode('ascii')
+
+
+def _encode_polyline_values(values):
+    """Encodes integer deltas with the polyline algorithm's varints."""
+    if np is None or not isinstance(values, np.ndarray):
+        chunks = []
+        for value in values:
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        return ''.join(chunks)
+
+    values = np.asarray(values, dtype=np.int64)
+    values = np.where(values < 0, ~(values << 1), values << 1)
+    # Up to 7 chunks of 5 bits for values of 32 bits and a sign bit.
+    shifts = 5 * np.arange(7)
+    chunks = (values[:, None] >> shifts) & 0x1f
+    used = (values[:, None] >> shifts) > 0
+    used[:, 0] = True
+    last = used & ~np.roll(used, -1, axis=1)
+    last[:, -1] = used[:, -1]
+    chunks = chunks + 63 + np.where(last, 0, 0x20)
+    return chunks[used].astype(np.uint8).tobytes().decode('ascii')
+
+
+def encode_polyline(locations, precision=5):
+    """
+    Encodes a line with the polyline algorithm: the coordinates, rounded
+    to `precision` decimals, are stored as deltas from the previous point
+    in variable length chunks of printable characters.  This is several
+    times smaller than JSON for dense tracks.
+
+    Parameters
+    ----------
+    locations: list of points [lat, lng], or nested lists of them
+        The line to encode. Nested lists, like the rings of a polygon or
+        the lines of a multi-polyline, are encoded as lists of strings.
+    precision: int, default 5
+        Number of decimals kept.
+
+    Examples
+    --------
+    >>> encode_polyline([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+    '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+    """
+    if len(locations) and hasattr(locations[0][0], '__len__'):
+        return [encode_polyline(line, precision=precision)
+                for line in locations]
+    scale = 10 ** precision
+    # NumPy only pays off beyond a few dozen points.
+    if np is not None and len(locations) > 32:
+        points = np.round(np.asarray(locations, dtype=float).reshape(-1, 2) *
+                          scale).astype(np.int64)
+        deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), np.int64))
+        return _encode_polyline_values(deltas.ravel())
+    deltas = []
+    previous = (0, 0)
+    for lat, lng in locations:
+        point = (int(round(lat * scale)), int(round(lng * scale)))
+        deltas.extend((point[0] - previous[0], point[1] - previous[1]))
+        previous = point
+    return _encode_polyline_values(deltas)
+
+
+# The function applied by the workers, only set in forked processes.
+_FORKED_TASK = None
+
+
+def _set_forked_task(func):
+    global _FORKED_TASK
+    _FORKED_TASK = func
+
+
+def _run_forked_task(item):
+    return _FORKED_TASK(item)
+
+
+def parallel_map(func, items, workers=None, processes=True):
+    """
+    Returns `[func(item) for item in items]`, computed in parallel.
+
+    Processes are forked with `func`, so that neither `func` nor the data
+    it refers to are pickled, only the items and the results.  This allows
+    lambdas and large objects, and concurrent calls from several threads.
+    Where fork is not available,
+    or with `processes=False`, threads are used instead, which only help
+    when `func` releases the GIL.
+
+    Parameters
+    ----------
+    func: callable
+        The function to apply.
+    items: list
+        The arguments of `func`, small and picklable.
+    workers: int, default None
+        Number of processes or threads, the number of CPUs by default.
+    processes: bool, default True
+        Whether to use processes rather than threads.
+
+    """
+    if _FORKED_TASK is not None:
+        # Already in a forked process, whose workers cannot have children.
+        return [func(item) for item in items]
+    workers = workers or multiprocessing.cpu_count()
+    if processes and hasattr(os, 'fork'):
+        context = (multiprocessing.get_context('fork')
+                   if hasattr(multiprocessing, 'get_context') else
+                   multiprocessing)
+        pool = context.Pool(workers, initializer=_set_forked_task,
+                            initargs=(func,))
+        try:
+            return pool.map(_run_forked_task, items)
+        finally:
+            pool.terminate()
+            pool.join()
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def prerender(element, workers=None, processes=True):
+    """
+    Runs in parallel the `_prerender` methods of `element` and of its
+    descendants, the expensive parts of their rendering that do not depend
+    on the rest of the tree, like styling and serializing data or encoding
+    images.
+
+    Each `_prerender` returns a dict of attributes, which are set on its
+    element in the order of the tree.  The render that follows uses them,
+    and its output is identical to a serial render.
+
+    Parameters
+    ----------
+    element: branca.element.Element
+        The root of the elements to prerender.
+    workers: int, default None
+        Number of processes or threads, the number of CPUs by default.
+    processes: bool, default True
+        Whether to use processes rather than threads, see `parallel_map`.
+
+    """
+    elements = []
+    stack = [element]
+    while stack:
+        current = stack.pop()
+        if hasattr(current, '_prerender'):
+            elements.append(current)
+        stack.extend(reversed(list(current._children.values())))
+    if len(elements) < 2:
+        return
+    results = parallel_map(lambda i: elements[i]._prerender(),
+                           range(len(elements)), workers=workers,
+                           processes=processes)
+    for current, attributes in zip(elements, results):
+        current.__dict__.update(attributes)
+
 
 def _validate_location(location):
     """Validates and formats location values before setting."""
@@ -52,6 +569,8 @@ def _validate_coordinates(coordinates):
 
 def _locations_tolist(x):
     """Transforms recursively a list of iterables into a list of list."""
+    if np is not None and isinstance(x, np.ndarray):
+        return x.tolist()
     if hasattr(x, '__iter__'):
         return list(map(_locations_tolist, x))
     else:
@@ -69,6 +588,12 @@ def _flatten(container):
 
 def _isnan(values):
     """Check if there are NaNs values in the iterable."""
+    if np is not None and isinstance(values, np.ndarray):
+        return bool(np.isnan(values.astype(float)).any())
+    if (np is not None and isinstance(values, (list, tuple)) and
+            len(values) and isinstance(values[0], np.ndarray)):
+        # Lines of a multi-line given as arrays.
+        return any(_isnan(value) for value in values)
     return any(math.isnan(value) for value in _flatten(values))
 
 
@@ -122,8 +647,7 @@ def image_to_url(image, colormap=None, origin='upper'):
         b64encoded = base64.b64encode(img).decode('utf-8')
         url = 'data:image/png;base64,{}'.format(b64encoded)
     else:
-        # Round-trip to ensure a nice formatted json.
-        url = json.loads(json.dumps(image))
+        url = image
     return url.replace('\n', ' ')
 
 
@@ -135,6 +659,25 @@ def _is_url(url):
         return False
 
 
+def _validate_image(data):
+    """
+    Checks that `data` can be written as a PNG by `write_png` and returns
+    it as a NxMxP array, raising a ValueError otherwise.
+
+    """
+    if np is None:
+        raise ImportError('The NumPy package is required '
+                          ' for this functionality')
+
+    arr = np.atleast_3d(data)
+    if arr.ndim != 3 or arr.shape[2] not in [1, 3, 4]:
+        raise ValueError('Data must be NxM (mono), '
+                         'NxMx3 (RGB), or NxMx4 (RGBA)')
+    if arr.dtype.kind not in 'biuf':
+        raise ValueError('Data must be numeric, not {}'.format(arr.dtype))
+    return arr
+
+
 def write_png(data, origin='upper', colormap=None):
     """
     Transform an array of data into a PNG string.
@@ -175,14 +718,9 @@ def write_png(data, origin='upper', colormap=None):
         def colormap(x):
             return (x, x, x, 1)
 
-    arr = np.atleast_3d(data)
+    arr = _validate_image(data)
     height, width, nblayers = arr.shape
 
-    if nblayers not in [1, 3, 4]:
-            raise ValueError('Data must be NxM (mono), '
-                             'NxMx3 (RGB), or NxMx4 (RGBA)')
-    assert arr.shape == (height, width, nblayers)
-
     if nblayers == 1:
         arr = np.array(list(map(colormap, arr.ravel())))
         nblayers = arr.shape[1]
@@ -7,14 +7,11 @@ Wraps leaflet Polyline, Polygon, Rectangle, Circlem and CircleMarker
 
 from __future__ import (absolute_import, division, print_function)
 
-import json
-
 from branca.element import (CssLink, Element, Figure, JavascriptLink, MacroElement)  # noqa
 from branca.utilities import (_locations_tolist, _parse_size, image_to_url, iter_points, none_max, none_min)  # noqa
 
-from folium.map import Marker
-
-from jinja2 import Template
+from folium.map import Marker, add_polyline_decoder
+from folium.utilities import Template, encode_polyline, json_dumps
 
 
 def path_options(**kwargs):
@@ -125,7 +122,17 @@ def _parse_options(line=False, radius=False, **kwargs):
         extra_options.update({'radius': radius})
     options = path_options(**kwargs)
     options.update(extra_options)
-    return json.dumps(options, sort_keys=True, indent=2)
+    return json_dumps(options, sort_keys=True, indent=2)
+
+
+def _encode_locations(locations, encoding, precision):
+    """Returns the JSON of the encoded `locations`, or None."""
+    if encoding is None:
+        return None
+    if encoding != 'polyline':
+        raise ValueError("encoding must be None or 'polyline', "
+                         'got {!r}'.format(encoding))
+    return json_dumps(encode_polyline(locations, precision=precision))
 
 
 class PolyLine(Marker):
@@ -148,22 +155,31 @@ class PolyLine(Marker):
         and less means more accurate representation.
     no_clip: Bool, default False
         Disable polyline clipping.
+    encoding: {None, 'polyline'}, default None
+        With 'polyline' the locations are embedded with the encoded
+        polyline algorithm instead of JSON, which is several times smaller
+        for long lines. See `utilities.encode_polyline`.
+    precision: int, default 5
+        Number of decimals kept with the 'polyline' encoding.
 
 
     http://leafletjs.com/reference-1.2.0.html#polyline
 
     """
-    def __init__(self, locations, popup=None, tooltip=None, **kwargs):
+    def __init__(self, locations, popup=None, tooltip=None, encoding=None,
+                 precision=5, **kwargs):
         super(PolyLine, self).__init__(location=locations, popup=popup)
         self._name = 'PolyLine'
         self.tooltip = tooltip
+        self.precision = precision
+        self._encoded = _encode_locations(self.location, encoding, precision)
 
         self.options = _parse_options(line=True, **kwargs)
 
         self._template = Template(u"""
             {% macro script(this, kwargs) %}
                 var {{this.get_name()}} = L.polyline(
-                    {{this.location}},
+                    {% if this._encoded %}foliumDecodePolyline({{ this._encoded }}, {{ this.precision }}){% else %}{{this.location}}{% endif %},
                     {{ this.options }}
                     )
                     {% if this.tooltip %}.bindTooltip("{{this.tooltip.__str__()}}"){% endif %}
@@ -171,6 +187,11 @@ class PolyLine(Marker):
             {% endmacro %}
             """)  # noqa
 
+    def render(self, **kwargs):
+        super(PolyLine, self).render(**kwargs)
+        if self._encoded is not None:
+            add_polyline_decoder(self.get_root())
+
 
 class Polygon(Marker):
     """
@@ -188,15 +209,24 @@ class Polygon(Marker):
         Input text or visualization for object displayed when clicking.
     tooltip: string , default None
         Input text or visualization for object displayed when hovering.
+    encoding: {None, 'polyline'}, default None
+        With 'polyline' the locations are embedded with the encoded
+        polyline algorithm instead of JSON, which is several times smaller
+        for long lines. See `utilities.encode_polyline`.
+    precision: int, default 5
+        Number of decimals kept with the 'polyline' encoding.
 
 
     http://leafletjs.com/reference-1.2.0.html#polygon
 
     """
-    def __init__(self, locations, popup=None, tooltip=None, **kwargs):
+    def __init__(self, locations, popup=None, tooltip=None, encoding=None,
+                 precision=5, **kwargs):
         super(Polygon, self).__init__(locations, popup=popup)
         self._name = 'Polygon'
         self.tooltip = tooltip
+        self.precision = precision
+        self._encoded = _encode_locations(self.location, encoding, precision)
 
         self.options = _parse_options(line=True, **kwargs)
 
@@ -204,13 +234,18 @@ class Polygon(Marker):
             {% macro script(this, kwargs) %}
 
             var {{this.get_name()}} = L.polygon(
-                {{this.location}},
+                {% if this._encoded %}foliumDecodePolyline({{ this._encoded }}, {{ this.precision }}){% else %}{{this.location}}{% endif %},
                 {{ this.options }}
                 )
                 {% if this.tooltip %}.bindTooltip("{{this.tooltip.__str__()}}"){% endif %}
                 .addTo({{this._parent.get_name()}});
             {% endmacro %}
-            """)
+            """)  # noqa
+
+    def render(self, **kwargs):
+        super(Polygon, self).render(**kwargs)
+        if self._encoded is not None:
+            add_polyline_decoder(self.get_root())
 
 
 class Rectangle(Marker):
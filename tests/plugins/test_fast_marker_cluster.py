@@ -11,7 +11,7 @@ import folium
 
 from folium import plugins
 
-from jinja2 import Template
+from folium.utilities import Template
 
 import numpy as np
 
@@ -40,7 +40,7 @@ def test_fast_marker_cluster():
     tmpl = Template("""
         {% macro script(this, kwargs) %}
         (function() {
-            var data = {{this._data}};
+            var data = {{ this._data|tojson }};
             var map = {{this._parent.get_name()}};
             var cluster = L.markerClusterGroup();
             {{this._callback}}
@@ -7,14 +7,21 @@ Test HeatMap
 
 from __future__ import (absolute_import, division, print_function)
 
+import base64
+import json
+import zlib
+
 import folium
 
 from folium import plugins
+from folium.plugins.heat_map import _aggregate_points, _level_zooms
 
-from jinja2 import Template
+from folium.utilities import Template
 
 import numpy as np
 
+import pytest
+
 
 def test_heat_map():
     np.random.seed(3141592)
@@ -34,7 +41,7 @@ def test_heat_map():
     # We verify that the script part is correct.
     tmpl = Template("""
             var {{this.get_name()}} = L.heatLayer(
-                {{this.data}},
+                {{ this.data|tojson }},
                 {
                     minOpacity: {{this.min_opacity}},
                     maxZoom: {{this.max_zoom}},
@@ -51,3 +58,72 @@ def test_heat_map():
     bounds = m.get_bounds()
     assert bounds == [[46.218566840847025, 3.0302801394447734],
                       [50.75345011431167, 7.132453997672826]], bounds
+
+
+def test_heat_map_encoding():
+    data = np.random.normal(size=(100, 3)) + np.array([[48, 5, 0]])
+    m = folium.Map([48., 5.], zoom_start=6)
+    hm = plugins.HeatMap(data, encoding='int32', precision=5).add_to(m)
+    plugins.FastMarkerCluster(data[:, :2], encoding='float32').add_to(m)
+    out = m._parent.render()
+
+    assert out.count('function foliumDecodeTypedArray') == 1
+    assert 'foliumDecodeTypedArray({})'.format(hm._encoded) in out
+
+    encoded = json.loads(hm._encoded)
+    assert encoded['columns'] == 3
+    values = np.frombuffer(base64.b64decode(encoded['data']), dtype='<i4')
+    np.testing.assert_allclose(values.reshape(-1, 3) / encoded['scale'],
+                               data, atol=1e-5)
+
+    with pytest.raises(ValueError):
+        plugins.HeatMap(data * 1e5, encoding='int32')
+
+
+def test_heat_map_compress():
+    data = np.random.normal(size=(1000, 3)) + np.array([[48, 5, 0]])
+    m = folium.Map([48., 5.], zoom_start=6)
+    hm = plugins.HeatMap(data, compress=True).add_to(m)
+    encoded = plugins.HeatMap(data, encoding='int32', compress=1).add_to(m)
+    out = m._parent.render()
+
+    assert out.count('function foliumInflate') == 1
+    assert 'foliumInflate("{}")'.format(hm._compressed) in out
+    inflated = zlib.decompress(base64.b64decode(hm._compressed))
+    np.testing.assert_allclose(json.loads(inflated.decode('utf-8')), data)
+    inflated = zlib.decompress(base64.b64decode(encoded._compressed))
+    assert inflated.decode('utf-8') == encoded._encoded
+
+    assert plugins.HeatMap(data[:10], compress=True)._compressed is None
+
+
+def test_heat_map_aggregate():
+    data = np.random.normal(size=(10000, 3)) * [0.05, 0.05, 0] + [48, 5, 1]
+    m = folium.Map([48., 5.], zoom_start=10)
+    hm = plugins.HeatMap(data, aggregate=10, radius=20).add_to(m)
+    assert len(hm.data) < len(data)
+    np.testing.assert_allclose(hm.data[:, 2].sum(), data[:, 2].sum())
+
+    # Leaflet.heat bins the points by radius / 2 pixels, which gives the
+    # same result from the aggregated points as from the raw points.
+    drawn = _aggregate_points(data, 10, 10)
+    np.testing.assert_allclose(_aggregate_points(hm.data, 10, 10), drawn)
+
+    pyramid = plugins.HeatMap(data, aggregate=[6, 10], radius=20).add_to(m)
+    out = m._parent.render()
+    levels = json.loads(pyramid._levels)
+    assert sorted(levels) == ['10', '6']
+    assert len(levels['6']) < len(levels['10']) == len(hm.data)
+    assert "_map.on('zoomend', {}_update)".format(pyramid.get_name()) in out
+
+
+def test_heat_map_level_zooms():
+    # A level is shown at its zoom and finer zooms up to the next level.
+    assert _level_zooms([6, 10]) == [6] * 7 + [10] * 4
+    assert _level_zooms([3]) == [3] * 4
+
+    m = folium.Map([48., 5.], zoom_start=9)
+    data = np.random.normal(size=(100, 3)) * [0.05, 0.05, 0] + [48, 5, 1]
+    pyramid = plugins.HeatMap(data, aggregate=[6, 10]).add_to(m)
+    m._parent.render()
+    assert json.loads(pyramid._level_zooms)[9] == 10
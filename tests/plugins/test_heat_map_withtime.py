@@ -7,14 +7,19 @@ Test HeatMapWithTime
 
 from __future__ import (absolute_import, division, print_function)
 
+import json
+import re
+
 import folium
 
 from folium import plugins
 
-from jinja2 import Template
+from folium.utilities import Template, json_literal
 
 import numpy as np
 
+import pytest
+
 
 def test_heat_map_with_time():
     np.random.seed(3141592)
@@ -69,7 +74,7 @@ def test_heat_map_with_time():
                 })
                 .addTo({{this._parent.get_name()}});
 
-                var {{this.get_name()}} = new TDHeatmap({{this.data}},
+                var {{this.get_name()}} = new TDHeatmap({{ this.data|tojson }},
                 {heatmapOptions: {
                         radius: {{this.radius}},
                         minOpacity: {{this.min_opacity}},
@@ -83,3 +88,60 @@ def test_heat_map_with_time():
     """)
 
     assert tmpl.render(this=hm)
+
+
+def test_heat_map_with_time_indexed():
+    locations = np.random.normal(size=(100, 2)) + np.array([[48, 5]])
+    data = [np.column_stack([locations, np.random.rand(100)]).tolist()
+            for _ in range(10)]
+    data[5] = data[4]
+    data[6] = [point[:2] for point in data[6][:50]]
+    m = folium.Map([48., 5.], zoom_start=6)
+    hm = plugins.HeatMapWithTime(data, encoding='indexed').add_to(m)
+    out = m._parent.render()
+
+    indexed = json.loads(hm._indexed)
+    assert '{},'.format(json_literal(hm._indexed)) in out
+    assert len(indexed['locations']) == 100
+    assert indexed['frames'][5] == [None, None]
+    # Points without weights get the default weight in the browser.
+    assert indexed['frames'][6][1] == []
+    # Frames are decoded from the locations and the previous frames.
+    indices = weights = None
+    for frame, (frame_indices, frame_weights) in zip(data, indexed['frames']):
+        indices = frame_indices if frame_indices is not None else indices
+        weights = frame_weights if frame_weights is not None else weights
+        decoded = [indexed['locations'][i] + weights[j:j + 1]
+                   for j, i in enumerate(indices)]
+        assert sorted(decoded) == sorted(frame)
+
+    assert hm.get_bounds() == [locations.min(axis=0).tolist(),
+                               locations.max(axis=0).tolist()]
+    with pytest.raises(ValueError):
+        plugins.HeatMapWithTime(data, encoding='delta')
+
+
+def test_heat_map_with_time_chunks():
+    locations = np.random.normal(size=(10, 2)) + np.array([[48, 5]])
+    data = [np.column_stack([locations, np.ones(10)]).tolist()
+            for _ in range(7)]
+    m = folium.Map([48., 5.], zoom_start=6)
+    raw = plugins.HeatMapWithTime(data, chunk_size=3).add_to(m)
+    hm = plugins.HeatMapWithTime(data, encoding='indexed', chunk_size=3)
+    m.add_child(hm)
+    out = m._parent.render()
+
+    for layer in (raw, hm):
+        index = json.loads(layer._indexed)
+        assert index['shardSize'] == 3
+        shards = [json.loads(re.search(
+            '<script type="application/json" id="{}">(.*?)</script>'.format(name),
+            out).group(1)) for name in index['shards']]
+        assert [len(shard) for shard in shards] == [3, 3, 1]
+        if layer is raw:
+            assert sum(shards, []) == data
+        else:
+            # Identical frames refer to the previous one, but within a shard.
+            assert [frame[0] is None for frame in sum(shards, [])] == [
+                False, True, True, False, True, True, False]
+            assert len(index['locations']) == 10
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test PrecomputedMarkerCluster
+-----------------------------
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import json
+
+import folium
+
+from folium import plugins
+from folium.plugins.precomputed_marker_cluster import cluster_hierarchy
+from folium.utilities import json_literal
+
+import numpy as np
+
+
+def test_cluster_hierarchy():
+    n = 1000
+    np.random.seed(seed=26082009)
+    data = np.column_stack([
+        np.random.uniform(low=35, high=60, size=n),   # Random latitudes.
+        np.random.uniform(low=-12, high=30, size=n),  # Random longitudes.
+    ])
+    levels = cluster_hierarchy(data, min_zoom=2, max_zoom=10, radius=60)
+
+    assert sorted(levels.keys()) == list(range(2, 11))
+    sizes = [len(levels[zoom]) for zoom in range(2, 11)]
+    # Clusters nest, so there are fewer of them when zooming out.
+    assert sizes == sorted(sizes)
+    for level in levels.values():
+        assert level[:, 2].sum() == n
+        assert (level[:, 0] >= 35).all() and (level[:, 0] <= 60).all()
+        assert (level[:, 1] >= -12).all() and (level[:, 1] <= 30).all()
+
+
+def test_precomputed_marker_cluster():
+    n = 100
+    np.random.seed(seed=26082009)
+    data = np.column_stack([
+        np.random.uniform(low=35, high=60, size=n),
+        np.random.uniform(low=-12, high=30, size=n),
+    ])
+    m = folium.Map([45., 3.], zoom_start=4)
+    mc = plugins.PrecomputedMarkerCluster(data, min_zoom=1, max_zoom=8)
+    m.add_child(mc)
+    out = m._parent.render()
+
+    # The cluster icons are styled with the markercluster css.
+    assert 'MarkerCluster.Default.css' in out
+    index = json.loads(mc._index)
+    assert json_literal(mc._index) in out
+    shards = {shard.get_name(): json.loads(shard.data)
+              for shard in mc._shards}
+    for shard in mc._shards:
+        assert '<script type="application/json" id="{}">'.format(
+            shard.get_name()) in out
+
+    # The individual markers, each embedded once.
+    leaf_zoom = index['leafZoom']
+    assert 1 < leaf_zoom <= 9
+    assert sorted(index['levels'].keys(), key=int) == [
+        str(z) for z in range(1, leaf_zoom + 1)]
+    points = []
+    for start, name in index['points']:
+        assert start == len(points)
+        points.extend(shards[name]['points'])
+    np.testing.assert_allclose(sorted(points), sorted(data.round(6).tolist()))
+
+    for zoom, level in index['levels'].items():
+        zoom = int(zoom)
+        assert level['bucketZoom'] == max(zoom - 3, 0)
+        size = 2 ** level['bucketZoom']
+        clusters, singles = [], []
+        for name in level['shards'].values():
+            if zoom == leaf_zoom:
+                groups = {key: [[], shards[name]['points'][start:end]]
+                          for key, (start, end)
+                          in shards[name]['tiles'].items()}
+            else:
+                groups = {key: [rows, [points[i] for i in indices]]
+                          for key, (rows, indices) in shards[name].items()}
+            for key, group in groups.items():
+                x, y = map(int, key.split(':'))
+                assert all(x * 360. / size - 180 <= row[1] <=
+                           (x + 1) * 360. / size - 180
+                           for row in group[0] + group[1])
+                clusters.extend(group[0])
+                singles.extend(group[1])
+        assert sum(row[2] for row in clusters) + len(singles) == n
+        # Clusters of several points split at a higher zoom.
+        assert all(row[2] > 1 and zoom < row[3] <= leaf_zoom
+                   for row in clusters)
+        if zoom == leaf_zoom:
+            assert not clusters
+        else:
+            # Before the individual markers, there are fewer clusters
+            # than points.
+            assert len(clusters) + len(singles) < 0.8 * n
+
+    bounds = m.get_bounds()
+    np.testing.assert_allclose(bounds, [data.min(axis=0), data.max(axis=0)])
@@ -8,14 +8,18 @@ Test TimestampedGeoJson
 
 from __future__ import (absolute_import, division, print_function)
 
+import json
+import re
+
 import folium
 
 from folium import plugins
-
-from jinja2 import Template
+from folium.utilities import Template
 
 import numpy as np
 
+import pytest
+
 
 def test_timestamped_geo_json():
     coordinates = [[[[lon-8*np.sin(theta), -47+6*np.cos(theta)] for
@@ -133,7 +137,7 @@ def test_timestamped_geo_json():
         {{this._parent.get_name()}}.addControl({{this._parent.get_name()}}.timeDimensionControl);
 
         var {{this.get_name()}} = L.timeDimension.layer.geoJson(
-            L.geoJson({{this.data}}, {'style': function (feature) {
+            L.geoJson({{ this.data|json_literal }}, {'style': function (feature) {
                 return feature.properties.style
             }}),
             {updateTimeDimension: true,addlastPoint: {{'true' if this.add_last_point else 'false'}}}
@@ -144,3 +148,86 @@ def test_timestamped_geo_json():
 
     bounds = m.get_bounds()
     assert bounds == [[-53.0, -158.0], [50.0, 158.0]], bounds
+
+
+def test_timestamped_geo_json_chunks():
+    hour = 3600000
+    features = [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [i, i]},
+            'properties': {'times': [(19 - i) * hour]},
+        }
+        for i in range(20)
+    ]
+    features.append({
+        'type': 'Feature',
+        'geometry': {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]},
+        'properties': {'times': ['1970-01-01T02:00:00Z',
+                                 '1970-01-01T13:30:00+01:30']},
+    })
+    data = {'type': 'FeatureCollection', 'features': features}
+    m = folium.Map()
+    tgj = plugins.TimestampedGeoJson(data, duration='PT2H', chunk_size=8)
+    m.add_child(tgj)
+    out = m._parent.render()
+
+    index = json.loads(tgj._shard_index)
+    assert index['starts'] == [0, 7 * hour, 15 * hour]
+    assert index['ends'] == [12 * hour, 14 * hour, 19 * hour]
+    assert tgj._time_interval == ('1970-01-01T00:00:00.000Z/'
+                                  '1970-01-01T19:00:00.000Z')
+    shards = [json.loads(re.search(
+        '<script type="application/json" id="{}">(.*?)</script>'.format(name),
+        out).group(1)) for name in index['ids']]
+    assert [len(shard) for shard in shards] == [8, 8, 5]
+    assert shards[0][3]['geometry']['type'] == 'LineString'
+    assert out.count('L.TimeDimension.Layer.FoliumShardedGeoJson = ') == 1
+    assert 'duration:"PT2H"' in out
+
+    features[0]['properties']['times'] = ['2017-06-02T00:00:00']
+    with pytest.raises(ValueError):
+        plugins.TimestampedGeoJson(data, chunk_size=8)
+
+
+def test_timestamped_geo_json_from_arrays():
+    ids = np.array(['b', 'a', 'b', 'c', 'a', 'b'])
+    lats = np.array([1., 2., 3., 4., 5., 6.])
+    lons = -lats
+    times = np.array([30, 20, 10, 40, 10, 20]) * 1000
+    colors = np.array(['red', 'blue', 'green', 'black', 'white', 'gray'])
+    m = folium.Map()
+    tgj = plugins.TimestampedGeoJson.from_arrays(
+        ids, lats, lons, times, styles={'color': colors}, period='PT1S')
+    m.add_child(tgj)
+    m._parent.render()
+
+    features = json.loads(tgj.data)['features']
+    assert [feature['properties']['id'] for feature in features] == ['a', 'b', 'c']
+    assert features[0]['geometry'] == {
+        'type': 'LineString', 'coordinates': [[-5., 5.], [-2., 2.]]}
+    assert features[0]['properties']['times'] == [10000, 20000]
+    assert features[0]['properties']['style'] == {'color': 'white'}
+    assert features[1]['properties']['times'] == [10000, 20000, 30000]
+    assert features[2]['geometry'] == {'type': 'Point', 'coordinates': [-4., 4.]}
+    assert tgj.get_bounds() == [[1., -6.], [6., -1.]]
+
+    dates = (times // 1000).astype('datetime64[s]')
+    same = plugins.TimestampedGeoJson.from_arrays(ids, lats, lons, dates)
+    assert json.loads(same.data)['features'][1]['properties']['times'] == [
+        10000, 20000, 30000]
+    with pytest.raises(ValueError):
+        plugins.TimestampedGeoJson.from_arrays(ids, lats[:3], lons, times)
+
+    # The GeoJSON is only kept as text.
+    assert tgj._geojson is None
+    chunked = plugins.TimestampedGeoJson.from_arrays(
+        ids, lats, lons, times, styles={'color': colors}, chunk_size=2,
+        period='PT1S')
+    assert chunked._geojson is None
+    index = json.loads(chunked._shard_index)
+    assert index['starts'] == [10000, 40000]
+    assert index['ends'] == [30000, 40000]
+    assert json.loads(chunked._shards[0].data) == features[:2]
+    assert chunked.period == 'PT1S'
+    assert chunked._template is not None
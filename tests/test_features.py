@@ -8,14 +8,23 @@ Folium Features Tests
 
 from __future__ import (absolute_import, division, print_function)
 
+import base64
+import json
 import os
+import zlib
 
 from branca.element import Element
 from branca.six import text_type
 
-from folium import Map, Popup
+from folium import Map, Popup, features
 import folium
 
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
 tmpl = """
 <!DOCTYPE html>
 <head>
@@ -92,6 +101,40 @@ def test_divicon():
     assert div.html == html
 
 
+# Shared icon definitions.
+def test_shared_icons():
+    m = Map()
+    icon_url = 'data:image/png;base64,iVBORw0KGgo='
+    for lon in (-120, 0, 120):
+        folium.Marker([45, lon], icon=folium.Icon(color='red')).add_to(m)
+        folium.Marker([45, lon],
+                      icon=folium.CustomIcon(icon_url, icon_size=(20, 20))
+                      ).add_to(m)
+    out = m._parent.render()
+
+    assert out.count('L.AwesomeMarkers.icon(') == 1
+    assert out.count('L.icon(') == 1
+    assert out.count(icon_url) == 1
+
+
+def test_custom_icon_cached_url(monkeypatch):
+    calls = []
+
+    def image_to_url(image):
+        calls.append(image)
+        return 'data:image/png;base64,{}'.format(len(calls))
+
+    monkeypatch.setattr(features, 'image_to_url', image_to_url)
+    image = np.zeros((4, 4, 3))
+    icons = [folium.CustomIcon(image.copy()) for _ in range(3)]
+    assert len(calls) == 1
+    assert len(set(icon.icon_url for icon in icons)) == 1
+
+    image[0, 0] = 1
+    assert folium.CustomIcon(image).icon_url != icons[0].icon_url
+    assert len(calls) == 2
+
+
 # ColorLine.
 def test_color_line():
     m = Map([22.5, 22.5], zoom_start=3)
@@ -104,3 +147,223 @@ def test_color_line():
         opacity=1)
     m.add_child(color_line)
     m._repr_html_()
+
+
+def test_color_line_runs(monkeypatch):
+    positions = np.array([[0, 0], [0, 1], [0, 2], [1, 2], [2, 2], [2, 3]])
+    colors = np.array([0., 0.1, 1., 0.9, 0.])
+    color_line = folium.ColorLine(positions, colors,
+                                  colormap=['blue', 'red'], nb_steps=2)
+    lines = {child.options: child.location
+             for child in color_line._children.values()}
+
+    # Consecutive segments of the same color are merged.
+    assert sorted(lines.values()) == [
+        [[[0, 0], [0, 1], [0, 2]], [[2, 2], [2, 3]]],
+        [[[0, 2], [1, 2], [2, 2]]],
+    ]
+
+    monkeypatch.setattr(features, 'np', None)
+    expected = folium.ColorLine(positions.tolist(), colors.tolist(),
+                                colormap=['blue', 'red'], nb_steps=2)
+    assert {child.options: child.location
+            for child in expected._children.values()} == lines
+
+
+# Compressed GeoJson.
+def test_geojson_compress():
+    data = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'name': str(i)},
+         'geometry': {'type': 'Point', 'coordinates': [i % 180, i % 90]}}
+        for i in range(1000)]}
+    m = Map()
+    small = folium.GeoJson(data, compress=10 ** 7).add_to(m)
+    geojson = folium.GeoJson(data, compress=True,
+                             style_function=lambda x: {'color': 'red'}
+                             ).add_to(m)
+    out = m._parent.render()
+
+    assert small._compressed is None
+    assert out.count('function foliumInflate') == 1
+    assert 'foliumInflate("{}")'.format(geojson._compressed) in out
+    assert len(geojson._compressed) < len(geojson.style_data()) / 5
+    inflated = zlib.decompress(base64.b64decode(geojson._compressed))
+    assert json.loads(inflated.decode('utf-8')) == json.loads(geojson.style_data())  # noqa
+
+
+# GeoJson styled in parallel.
+def test_geojson_workers():
+    def make_data():
+        return {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {'value': i},
+             'geometry': {'type': 'Point', 'coordinates': [i % 180, i % 90]}}
+            for i in range(5000)]}
+
+    def style_function(feature):
+        return {'weight': feature['properties']['value'] % 5}
+
+    serial = folium.GeoJson(make_data(), style_function=style_function)
+    parallel = folium.GeoJson(make_data(), style_function=style_function,
+                              workers=2)
+    assert parallel.style_data() == serial.style_data()
+
+
+def test_geojson_vectorized():
+    def make_data():
+        return {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature',
+             'properties': {'value': i, 'name': 'f{}'.format(i % 3)}
+             if i % 4 else {'name': 'empty'},
+             'geometry': {'type': 'Point', 'coordinates': [i % 180, i % 90]}}
+            for i in range(100)]}
+
+    def style_function(feature):
+        value = feature['properties'].get('value', 0)
+        return {'fillColor': 'red' if value > 50 else 'blue',
+                'weight': value % 5, 'opacity': 0.5}
+
+    def vectorized_style(columns):
+        value = np.nan_to_num(columns['value'])
+        return {'fillColor': np.where(value > 50, 'red', 'blue'),
+                'weight': value.astype(int) % 5, 'opacity': 0.5}
+
+    def vectorized_highlight(columns):
+        return {'weight': np.where(columns['name'] == 'f1', 3, 1)}
+
+    expected = folium.GeoJson(make_data(), style_function=style_function)
+    geojson = folium.GeoJson(make_data(), style_function=vectorized_style,
+                             vectorized=True)
+    assert geojson.style_data() == expected.style_data()
+
+    geojson = folium.GeoJson(make_data(), style_function=vectorized_style,
+                             highlight_function=vectorized_highlight,
+                             vectorized=True)
+    features = json.loads(geojson.style_data())['features']
+    assert [feature['properties']['highlight']['weight']
+            for feature in features[:6]] == [1, 3, 1, 1, 1, 1]
+
+    with pytest.raises(ValueError):
+        folium.GeoJson(make_data(), vectorized=True,
+                       style_function=lambda x: {'weight': [1, 2]}).style_data()
+
+
+def test_geojson_vectorized_objects():
+    data = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature',
+         'properties': dict({'neighbours': list(range(i)), 'kind': None},
+                            **({'label': 'l{}'.format(i % 2)} if i % 3 else {})),
+         'geometry': {'type': 'Point', 'coordinates': [i, i]}}
+        for i in range(6)]}
+
+    def style_function(columns):
+        # Ragged lists are only built into a column if they are accessed.
+        assert 'neighbours' not in columns
+        assert columns['label'].dtype == object
+        return {'color': columns['label'], 'dashArray': columns['kind'],
+                'weight': [[1]] * 3 + [[1, 2]] * 3}
+
+    geojson = folium.GeoJson(data, style_function=style_function,
+                             vectorized=True)
+    output = json.loads(geojson.style_data())['features']
+    assert [feature['properties']['style'] for feature in output] == [
+        {'color': label, 'dashArray': None, 'weight': weight}
+        for label, weight in zip([None, 'l1', 'l0', None, 'l0', 'l1'],
+                                 [[1]] * 3 + [[1, 2]] * 3)]
+
+    with pytest.raises(KeyError):
+        features._PropertyColumns([{'a': 1}])['b']
+
+
+def test_geojson_properties():
+    def make_data():
+        return {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'id': i,
+             'properties': {'value': i, 'name': 'f{}'.format(i), 'extra': 'x'},
+             'geometry': {'type': 'Point', 'coordinates': [i % 180, i % 90]}}
+            for i in range(3000)]}
+
+    def style_function(feature):
+        return {'weight': feature['properties']['extra'] == 'x'}
+
+    geojson = folium.GeoJson(make_data(), style_function=style_function,
+                             properties=['name'])
+    features = json.loads(geojson.style_data())['features']
+    assert features[1]['properties'] == {
+        'name': 'f1', 'style': {'weight': True}, 'highlight': {}}
+    assert features[1]['id'] == 1
+    assert geojson.data['features'][1]['properties']['extra'] == 'x'
+
+    parallel = folium.GeoJson(make_data(), style_function=style_function,
+                              properties=['name'], workers=2)
+    assert parallel.style_data() == geojson.style_data()
+
+    m = Map()
+    m.choropleth(make_data(), data=pd.Series([1., 2.], index=['f1', 'f2']),
+                 key_on='feature.properties.name', fill_color='YlGn')
+    geojson = [child for child in m._children.values()
+               if isinstance(child, folium.GeoJson)][0]
+    features = json.loads(geojson.style_data())['features']
+    assert sorted(features[1]['properties']) == ['highlight', 'name', 'style']
+
+
+def test_geojson_choropleth():
+    data = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'id': key, 'properties': {'name': key},
+         'geometry': geometry}
+        for key, geometry in [
+            ('a', {'type': 'Point', 'coordinates': [0, 0]}),
+            ('b', None),
+            ('c', {'type': 'Point', 'coordinates': [1, 1]})]]}
+    values = pd.DataFrame({'u': [1., 3.], 'v': [5., None]}, index=['a', 'c'])
+
+    m = Map()
+    choropleth = features.GeoJsonChoropleth(
+        data, values, key_on='feature.id', thresholds={'u': [0, 2, 4]},
+        fill_color='YlGn').add_to(m)
+    assert [scale['name'] for scale in choropleth.scales] == ['u', 'v']
+    assert choropleth.scales[0]['thresholds'] == [0, 2, 4]
+    assert choropleth.scales[0]['colors'] == ['#f7fcb9', '#addd8e', '#31a354']
+    assert len(choropleth.scales[1]['thresholds']) == 7
+
+    encoded = json.loads(choropleth._values)
+    decoded = np.frombuffer(base64.b64decode(encoded['data']), dtype='<f4')
+    np.testing.assert_array_equal(decoded.reshape(-1, encoded['columns']),
+                                  [[1., 5.], [3., np.nan]])
+    # The features are styled in the browser, without style properties.
+    output = json.loads(choropleth.style_data())['features']
+    assert [feature['properties'] for feature in output] == [{}, {}, {}]
+    assert data['features'][0]['properties'] == {'name': 'a'}
+
+    out = m._parent.render()
+    assert 'function {}_show(variable)'.format(choropleth.get_name()) in out
+    assert 'folium-choropleth-variable' in out
+    assert 'function foliumDecodeTypedArray' in out
+
+    with pytest.raises(ValueError):
+        features.GeoJsonChoropleth(data, {'u': [1, 2, 3]})
+
+    m = Map()
+    m.choropleth(data, data=values.reset_index(), columns=['index', 'u'],
+                 key_on='feature.properties.name', fill_color='YlGn',
+                 client_side=True)
+    choropleth, legend = list(m._children.values())[1:]
+    assert isinstance(choropleth, features.GeoJsonChoropleth)
+    assert 'folium-choropleth-variable' not in m._parent.render()
+    assert legend.index == choropleth.scales[0]['thresholds']
+
+    # Mappings are bound to the features by key_on.
+    series = values['u']
+    for mapping in (series, {'a': 1., 'c': 3.}):
+        m = Map()
+        m.choropleth(data, data=mapping, key_on='feature.id',
+                     fill_color='YlGn', client_side=True)
+        choropleth = list(m._children.values())[1]
+        encoded = json.loads(choropleth._values)
+        np.testing.assert_array_equal(
+            np.frombuffer(base64.b64decode(encoded['data']), dtype='<f4'),
+            [1., 3.])
+        with pytest.raises(ValueError):
+            Map().choropleth(data, data=mapping, fill_color='YlGn',
+                             client_side=True)
+    with pytest.raises(ValueError):
+        features.GeoJsonChoropleth(data, {'u': {'a': 1., 'c': 3.}})
@@ -10,6 +10,8 @@ from __future__ import (absolute_import, division, print_function)
 
 import json
 import os
+import subprocess
+import sys
 
 import branca.element
 
@@ -19,6 +21,8 @@ from folium.features import TopoJson
 import jinja2
 from jinja2 import Environment, PackageLoader
 
+import numpy as np
+
 import pandas as pd
 
 import pytest
@@ -345,3 +349,50 @@ class TestFolium(object):
         self.m._parent.render()
         bounds = self.m.get_bounds()
         assert bounds == [[18.948267, -178.123152], [71.351633, 173.304726]], bounds  # noqa
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='Lazy imports require Python 3.7')
+def test_lazy_import():
+    code = ('import sys, folium; '
+            'assert "requests" not in sys.modules; '
+            'assert "folium.features" not in sys.modules; '
+            'import folium.features, folium.plugins.heat_map; '
+            'assert folium.utilities._TEMPLATES_ENV is None; '
+            'm = folium.Map(); '
+            'assert "requests" not in sys.modules; '
+            'assert folium.plugins.HeatMap.__module__ == '
+            '"folium.plugins.heat_map"')
+    subprocess.check_call([sys.executable, '-c', code],
+                          cwd=os.path.dirname(rootpath))
+    assert 'Marker' in dir(folium)
+    with pytest.raises(AttributeError):
+        folium.NotAnAttribute
+
+
+def test_star_import():
+    namespace = {}
+    exec('from folium import *', namespace)
+    assert set(folium.__all__) <= set(namespace)
+    assert namespace['GeoJsonChoropleth'] is folium.features.GeoJsonChoropleth
+
+
+
+def test_render_workers():
+    m = folium.Map()
+    for i in range(3):
+        data = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {'value': j},
+             'geometry': {'type': 'Point', 'coordinates': [i, j % 90]}}
+            for j in range(100)]}
+        folium.GeoJson(data, style_function=lambda x: {'weight': 2}).add_to(m)
+    folium.plugins.HeatMap([[45, 0], [46, 1]]).add_to(m)
+    image = folium.raster_layers.ImageOverlay(np.eye(2),
+                                              [[0, 0], [1, 1]]).add_to(m)
+    out = m._parent.render()
+
+    # Prerendered in forked processes, or in threads.
+    assert m._parent.render(workers=2) == out
+    folium.utilities.prerender(m, workers=2, processes=False)
+    assert image.__dict__['_url'] is not None
+    assert m._parent.render() == out
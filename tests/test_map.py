@@ -8,8 +8,11 @@ Folium map Tests
 
 from __future__ import (absolute_import, division, print_function)
 
+import folium
 from folium.map import Popup
 
+import pytest
+
 
 tmpl = u"""
         <div id="{id}"
@@ -52,3 +55,41 @@ def test_popup_unicode():
         'text': u'Ça c&#39;est chouette',
     }
     assert ''.join(popup.html.render().split()) == ''.join(tmpl(**kw).split())
+
+
+def test_popup_lazy():
+    m = folium.Map()
+    for lon in (-120, 0, 120):
+        folium.Marker([45, lon], popup=Popup('Same </script> text.', lazy=True)).add_to(m)  # noqa
+    folium.Marker([0, 0], popup=Popup("Let's escape", parse_html=True, lazy=True)).add_to(m)  # noqa
+    out = m._parent.render()
+
+    # Identical contents are only stored once.
+    store = m._parent.script._children['popup_store']
+    assert store.contents == ['Same </script> text.', 'Let&#39;s escape']
+    assert 'Same <\\/script> text.' in out
+    assert 'L.popup(' not in out
+    assert out.count('{}.get(0)'.format(store.get_name())) == 3
+    assert out.count('{}.get(1)'.format(store.get_name())) == 1
+
+    # Lazy popups do not build sub-elements.
+    popup = Popup('Some text.', lazy=True)
+    assert 'html' not in popup.__dict__
+
+
+def test_popup_lazy_fields():
+    m = folium.Map()
+    for i, name in enumerate(['a', 'b<c>', 'a']):
+        popup = Popup('<b>{name}</b>: {value:.1f}', lazy=True, parse_html=True,
+                      fields={'name': name, 'value': i % 2})
+        folium.Marker([45, i], popup=popup).add_to(m)
+    m._parent.render()
+
+    store = m._parent.script._children['popup_store']
+    assert store.templates == [['<b>', '</b>: ', '']]
+    assert store.contents == [[0, ['a', '0.0']], [0, ['b&lt;c&gt;', '1.0']]]
+
+    with pytest.raises(ValueError):
+        store.add_fields('{missing}', {})
+    with pytest.raises(ValueError):
+        Popup('{name}', fields={'name': 'a'})
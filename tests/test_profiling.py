@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+Folium Profiling Tests
+----------------------
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import io
+import json
+import os
+
+import folium
+from folium import plugins, utilities
+from folium.profiling import (PayloadBudget, RenderProfiler,
+                              estimate_retained_size, profile_render)
+from folium.utilities import json_dumps
+
+import numpy as np
+
+import pytest
+
+
+rootpath = os.path.abspath(os.path.dirname(__file__))
+
+
+def _make_map():
+    m = folium.Map([43, -100], zoom_start=4)
+    with open(os.path.join(rootpath, 'us-counties.json')) as f:
+        folium.GeoJson(json.load(f)).add_to(m)
+    for lon in (-120, -100, -80):
+        folium.Marker([45, lon], popup='{}'.format(lon)).add_to(m)
+    return m
+
+
+def test_profile_render():
+    m = _make_map()
+    html, report = profile_render(m, trace_memory=True)
+
+    assert report.total_bytes == len(html.encode('utf8'))
+    classes = {record['class']: record for record in report.by_class()}
+    assert classes['Marker']['count'] == 3
+    assert classes['Popup']['count'] == 3
+    # The GeoJson data is the bulk of the output.
+    geojson = classes['GeoJson']
+    assert geojson['bytes']['script'] > 0.9 * report.total_bytes
+    assert geojson['memory'] > 0
+    assert max(classes.values(), key=lambda r: r['time'])['class'] == 'GeoJson'
+
+    subtree = report.subtree_bytes()
+    assert subtree[m.get_name()] >= geojson['bytes']['script']
+
+    folded = report.to_folded(metric='bytes').splitlines()
+    assert any(line.startswith('Figure;Map;GeoJson ') for line in folded)
+    json.dumps(report.to_dict())
+
+
+def test_render_profiler_restores_elements():
+    m = _make_map()
+    with RenderProfiler(m) as profiler:
+        out = m._parent.render()
+    assert all(record['calls'] == 1 for record in profiler.report.records)
+    assert 'render' not in m.__dict__
+    assert 'add_child' not in m._parent.script.__dict__
+    assert m._parent.render() == out
+
+
+def test_payload_accounting():
+    m = _make_map()
+    data = np.random.normal(size=(1000, 2)) + np.array([[45, 0]])
+    folium.raster_layers.ImageOverlay(
+        np.random.uniform(size=(20, 20)), [[40, -10], [50, 10]]).add_to(m)
+    plugins.HeatMap(data.tolist(), name='heat').add_to(m)
+    html, report = profile_render(m)
+
+    payloads = report.payloads()
+    labels = [payload['label'] for payload in payloads]
+    assert labels[:2] == ['GeoJson.data', 'HeatMap.data']
+    assert 'ImageOverlay._url' in labels
+    assert 'GeoJson.data' in report.summary()
+
+    classes = {record['class']: record for record in report.by_class()}
+    kinds = {record['class']: record['kinds'] for record in report.records}
+    assert kinds['GeoJson']['inline_data'] > kinds['GeoJson']['template']
+    assert kinds['ImageOverlay']['data_uri'] > 0
+    assert kinds['Map']['asset'] > 0
+    assert sum(kinds['HeatMap'].values()) == sum(classes['HeatMap']['bytes'].values())  # noqa
+
+
+def test_payload_sizes_measured_at_render(monkeypatch):
+    m = _make_map()
+    heat_map = plugins.HeatMap(np.random.uniform(size=(100, 2)).tolist(),
+                               name='heat').add_to(m)
+    calls = []
+    dumps = json.dumps
+
+    def counted(obj, *args, **kwargs):
+        calls.append(obj)
+        return dumps(obj, *args, **kwargs)
+
+    monkeypatch.setattr(json, 'dumps', counted)
+    m._parent.render()
+    rendered = len(calls)
+    del calls[:]
+    html, report = profile_render(m)
+
+    # The payloads are not serialized again to be measured.
+    assert len(calls) == rendered
+    # And json_dumps is only wrapped during the profiled render.
+    assert utilities.json_dumps is json_dumps
+    assert utilities.get_templates_env().policies[
+        'json.dumps_function'] is json_dumps
+    sizes = dict((payload['label'], payload['bytes'])
+                 for payload in report.payloads())
+    assert sizes['HeatMap.data'] == len(
+        json_dumps(heat_map.data, sort_keys=True))
+
+    # Text prepared before the render and dropped by it is still measured.
+    html, report = profile_render(m, workers=2)
+    labels = [payload['label'] for payload in report.payloads()]
+    assert labels[:2] == ['GeoJson._styled', 'HeatMap._json']
+
+
+def test_payload_budget():
+    m = _make_map()
+    heat_map = plugins.HeatMap([[45, 0]] * 1000, name='heat').add_to(m)
+
+    budget = PayloadBudget(per_layer={'heat': 1000})
+    with pytest.warns(UserWarning, match='layer heat'):
+        html, report = profile_render(m, budget=budget)
+    assert budget.violations(report) == [{
+        'scope': 'layer', 'name': 'heat', 'limit': 1000,
+        'bytes': report.subtree_bytes()[heat_map.get_name()]}]
+
+    budget = PayloadBudget(per_figure=1000, action='raise')
+    with pytest.raises(ValueError):
+        with RenderProfiler(m, budget=budget):
+            m.save(io.BytesIO(), close_file=False)
+
+    assert PayloadBudget(per_figure=1e9, per_layer=1e9).check(report) == []
+
+
+def test_estimate_retained_size():
+    m = _make_map()
+    total = estimate_retained_size(m)
+    classes = estimate_retained_size(m, by_class=True)
+    assert sum(entry['bytes'] for entry in classes.values()) == total
+    assert classes['Marker']['count'] == 3
+    # The GeoJson data is retained by the GeoJson element.
+    assert list(classes)[0] == 'GeoJson'
+
+    # Adding elements grows the estimate, shared objects are not counted twice.
+    folium.Marker([45, 0], popup='0').add_to(m)
+    assert estimate_retained_size(m) > total
+    assert estimate_retained_size(m._parent) > estimate_retained_size(m)
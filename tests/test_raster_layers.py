@@ -8,9 +8,13 @@ Test ImageOverlay
 
 from __future__ import (absolute_import, division, print_function)
 
+import json
+
 import folium
 
-from jinja2 import Template
+from folium.utilities import Template
+
+import pytest
 
 
 def test_tile_layer():
@@ -106,12 +110,56 @@ def test_image_overlay():
     # Verify the script part is okay.
     tmpl = Template("""
                 var {{this.get_name()}} = L.imageOverlay(
-                    '{{ this.url }}',
-                    {{ this.bounds }},
+                    {{ this._url_name }},
+                    {{ this.bounds|tojson }},
                     {{ this.options }}
                     ).addTo({{this._parent.get_name()}});
     """)
     assert tmpl.render(this=io) in out
+    assert 'var {} = "{}";'.format(io._url_name, url) in out
 
     bounds = m.get_bounds()
     assert bounds == [[0, -180], [90, 180]], bounds
+
+
+def test_image_overlay_validation():
+    """Invalid images are reported by the constructor, not at render."""
+    np = pytest.importorskip('numpy')
+    bounds = [[0, -180], [90, 180]]
+
+    with pytest.raises(ValueError):
+        folium.raster_layers.ImageOverlay(np.zeros((2, 2, 5)), bounds)
+    with pytest.raises(ValueError):
+        folium.raster_layers.ImageOverlay(np.array([['a', 'b']]), bounds)
+    with pytest.raises(IOError):
+        folium.raster_layers.ImageOverlay('does-not-exist.png', bounds)
+
+    # Arrays are only encoded at render and then dropped.
+    m = folium.Map()
+    io = folium.raster_layers.ImageOverlay(np.ones((2, 3, 4)), bounds)
+    io.add_to(m)
+    assert io._image is not None
+    m._repr_html_()
+    assert io._image is None
+    assert io.url.startswith('data:image/png;base64,')
+
+
+def test_register_tile_provider():
+    url = 'http://{s}.registered.org/{{ API_key }}/{z}/{x}/{y}.png'
+    folium.raster_layers.register_tile_provider(
+        'Registered Tiles', url, attr='Registered attribution',
+        subdomains='xyz', max_zoom=12)
+    assert 'openstreetmap' in folium.raster_layers.get_tile_providers()
+
+    with pytest.raises(ValueError):
+        folium.raster_layers.TileLayer('registered tiles')
+
+    layer = folium.raster_layers.TileLayer('Registered Tiles', API_key='key')
+    assert layer.tiles == 'http://{s}.registered.org/key/{z}/{x}/{y}.png'
+    assert layer.attr == 'Registered attribution'
+    options = json.loads(layer.options)
+    assert options['subdomains'] == 'xyz'
+    assert options['maxZoom'] == 12
+    assert options['minZoom'] == 1
+
+    del folium.raster_layers.get_tile_providers()['registeredtiles']
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+Folium Utilities Tests
+----------------------
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import re
+import subprocess
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+from folium import utilities
+from folium.utilities import (Template, disable_bytecode_cache,
+                              enable_bytecode_cache, get_templates_env,
+                              json_dumps, json_loads, set_json_backend)
+
+import jinja2
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+
+rootpath = os.path.abspath(os.path.dirname(__file__))
+
+
+def test_template_shared():
+    source = u'{% macro script(this) %}var {{ this }};{% endmacro %}'
+    template = Template(source)
+    assert Template(source) is template
+    assert isinstance(template, jinja2.Template)
+    assert template.module.script('x') == jinja2.Template(source).module.script('x')  # noqa
+    assert get_templates_env().get_template('tiles/openstreetmap/tiles.txt')
+
+
+def test_template_sources_bounded():
+    loader = get_templates_env().loader.loaders[0]
+    first = Template(u'first {{ x }}')
+    for i in range(utilities._TEMPLATES_CACHE_SIZE):
+        Template(u'{{ x }} %d' % i)
+    assert len(loader.sources) == utilities._TEMPLATES_CACHE_SIZE
+    assert first.render(x=1) == 'first 1'
+    assert Template(u'first {{ x }}').render(x=2) == 'first 2'
+
+
+def test_bytecode_cache(tmpdir):
+    directory = str(tmpdir.join('cache'))
+    try:
+        enable_bytecode_cache(directory)
+        Template(u'{{ "test_bytecode_cache" }}')
+        assert os.listdir(directory)
+    finally:
+        disable_bytecode_cache()
+
+    # New processes load the templates compiled by the previous ones.
+    code = ('import folium, os, sys; '
+            'folium.Map()._parent.render(); '
+            'print(len(os.listdir(sys.argv[1])))')
+    env = dict(os.environ, FOLIUM_BYTECODE_CACHE=directory)
+    counts = [
+        subprocess.check_output([sys.executable, '-c', code, directory],
+                                cwd=os.path.dirname(rootpath), env=env)
+        for _ in range(2)
+    ]
+    assert int(counts[0]) > 1
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson'])
+def test_json_dumps(backend):
+    if backend == 'orjson':
+        pytest.importorskip('orjson')
+    previous = utilities._JSON_BACKEND
+    set_json_backend(backend)
+    try:
+        data = {
+            'array': np.array([[1.5, 2.], [3., 4.]]),
+            'scalar': np.float32(0.5),
+            'integer': np.int64(3),
+            'series': pd.Series([1, 2]),
+            'list': [(1, 2)],
+        }
+        expected = {
+            'array': [[1.5, 2.], [3., 4.]],
+            'scalar': 0.5,
+            'integer': 3,
+            'series': [1, 2],
+            'list': [[1, 2]],
+        }
+        assert json_loads(json_dumps(data, sort_keys=True)) == expected
+        assert json_loads(json_dumps(data, indent=2)) == expected
+        out = Template(u'{{ data|tojson }}').render(data=data)
+        assert json_loads(out) == expected
+        with pytest.raises(TypeError):
+            json_dumps(object())
+    finally:
+        set_json_backend(previous)
+
+    with pytest.raises(ValueError):
+        set_json_backend('pickle')
+
+
+def test_json_dumps_backends_identical():
+    pytest.importorskip('orjson')
+    data = {
+        'floats': [0.1, 1.5, 1 / 3., -0.0, 123456.789, 1e15, 100.],
+        'non_finite': [float('nan'), float('inf'), -float('inf')],
+        'array': np.array([[0.5, np.nan], [np.inf, 2.]]),
+        'float32': np.float32(0.1),
+        'float64': np.float64(np.nan),
+        'series': pd.Series([1., None]),
+        1: 'key',
+    }
+    previous = utilities._JSON_BACKEND
+    outputs = {}
+    try:
+        for backend in ('json', 'orjson'):
+            set_json_backend(backend)
+            outputs[backend] = (json_dumps(data), json_dumps(data, indent=2))
+    finally:
+        set_json_backend(previous)
+    assert outputs['json'] == outputs['orjson']
+    assert outputs['json'][0].startswith(
+        '{"floats":[0.1,1.5,0.3333333333333333,-0.0,123456.789,'
+        '1000000000000000.0,100.0],"non_finite":[null,null,null],'
+        '"array":[[0.5,null],[null,2.0]],"float32":0.10000000149011612,'
+        '"float64":null,')
+    assert utilities._JSON_BACKEND == 'json'
+
+
+def test_encode_polyline(monkeypatch):
+    locations = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    assert utilities.encode_polyline(locations) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert utilities.encode_polyline([locations, locations[:1]]) == [
+        '_p~iF~ps|U_ulLnnqC_mqNvxq`@', '_p~iF~ps|U']
+
+    track = np.cumsum(np.random.normal(scale=0.01, size=(1000, 2)), axis=0)
+    encoded = utilities.encode_polyline(track, precision=6)
+    monkeypatch.setattr(utilities, 'np', None)
+    assert utilities.encode_polyline(track.tolist(), precision=6) == encoded
+
+
+@pytest.mark.parametrize('processes', [True, False])
+def test_parallel_map(processes):
+    data = list(range(1000))
+    out = utilities.parallel_map(lambda i: sum(data[i::4]), range(4),
+                                 workers=2, processes=processes)
+    assert out == [sum(data[i::4]) for i in range(4)]
+
+
+@pytest.mark.parametrize('processes', [True, False])
+def test_parallel_map_concurrent(processes):
+    def call(offset):
+        def task(i):
+            time.sleep(0.05)
+            return offset, i * offset, os.getpid()
+        return utilities.parallel_map(task, range(4), workers=2,
+                                      processes=processes)
+
+    # The calls overlap, each with its own function and workers.
+    pool = ThreadPool(4)
+    try:
+        results = pool.map(call, range(1, 9))
+    finally:
+        pool.close()
+        pool.join()
+    assert [[row[:2] for row in result] for result in results] == [
+        [(offset, i * offset) for i in range(4)] for offset in range(1, 9)]
+    if processes:
+        assert all(row[2] != os.getpid()
+                   for result in results for row in result)
+    assert utilities._FORKED_TASK is None
+
+
+def test_json_literal():
+    data = {'name': u"it's </script><!--  \n", 'values': list(range(3000))}
+    text = json_dumps(data)
+    literal = utilities.json_literal(text)
+    assert literal.startswith("JSON.parse('") and literal.endswith("')")
+    assert '</' not in literal and '<!--' not in literal
+    assert utilities.json_literal(text[:100]) == text[:100]
+
+    # The string literal evaluates to the JSON text, as in JavaScript.
+    escapes = {'n': '\n', 'r': '\r', 'u2028': u'\u2028', 'u2029': u'\u2029'}
+    code = re.sub(r'\\(u2028|u2029|.)',
+                  lambda match: escapes.get(match.group(1), match.group(1)),
+                  literal[len("JSON.parse('"):-len("')")])
+    assert json_loads(code) == data
+
+    # Non-finite values are written as null, and strings are not searched.
+    data['values'][0] = float('nan')
+    data['name'] = 'NaN and Infinity'
+    text = json_dumps(data)
+    assert text.startswith('{"name":"NaN and Infinity","values":[null,1,')
+    assert utilities.json_literal(text).startswith("JSON.parse('")
+
+    previous = utilities._JSON_PARSE_MIN_SIZE
+    try:
+        utilities.set_json_parse_threshold(None)
+        assert utilities.json_literal(text) == text
+        utilities.set_json_parse_threshold(10)
+        assert utilities.json_literal('[1, 2, 3, 4]').startswith('JSON.parse(')
+    finally:
+        utilities.set_json_parse_threshold(previous)
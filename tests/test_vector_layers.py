@@ -394,3 +394,18 @@ def test_mulyipolyline():
     assert multipolyline.get_bounds() == get_bounds(locations)
     assert json.dumps(multipolyline.to_dict()) == multipolyline.to_json()
     assert multipolyline.options == json.dumps(expected_options, sort_keys=True, indent=2)  # noqa
+
+
+def test_polyline_encoding():
+    m = Map()
+    locations = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    polyline = PolyLine(locations, encoding='polyline').add_to(m)
+    polygon = Polygon([locations, locations[::-1]], encoding='polyline',
+                      precision=6).add_to(m)
+    out = m._parent.render()
+
+    assert out.count('function foliumDecodePolyline') == 1
+    assert 'foliumDecodePolyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@", 5)' in out
+    assert 'foliumDecodePolyline({}, 6)'.format(polygon._encoded) in out
+    assert len(json.loads(polygon._encoded)) == 2
+    assert polyline.get_bounds() == get_bounds(locations)